@@ -32,11 +32,173 @@ CCFINDERSWPARSER = (
     project_root / "lib/ccfindersw-parser/target/release/ccfindersw-parser"
 )
 
+"""
+    CCFinderSW の出力（-ccfsw set 形式のテキスト）の変換：
+        builtin: src/modules/ccfsw_reader.py で出力を 1 行ずつ読みながら，クローンセットの JSON（インデントなし）を
+                 直接書き出す．出力のテキストは残さない．#clone_sets を最後まで読めなかった出力はエラーにする．
+        ccfindersw-parser: 従来どおり外部の ccfindersw-parser（CCFINDERSWPARSER）で変換する．
+"""
+CCFINDERSW_OUTPUT_PARSER = "ccfindersw-parser"
+# builtin の場合，True なら出力先に名前付きパイプ（FIFO）を置き，CCFinderSW が書き出す内容をディスクに置かずに読み取る．
+# False の場合は出力のテキストを書き終えてから読み取り，読み取り後に削除する．
+CCFINDERSW_OUTPUT_FIFO = False
+
 # CCFinderSWのJava実行設定
 # 例: "16G", "8G", "1024M"
 CCFINDERSW_JAVA_XMX = "20G"
 CCFINDERSW_JAVA_XSS = "512m"
 
+"""
+    シャード分割検出：
+        auto: CCFinderSW がヒープ不足で終了した場合だけ，サービスのコードベースごと・コードベースの組ごとに
+              分けて検出し直し，結果を 1 つの clones_json にまとめる．以降の同じプロジェクト・言語のコミットは最初から分割する．
+        always: 常に分割して検出する．
+        never: 分割しない（ヒープ不足の場合はそのプロジェクトの収集が失敗する）．
+"""
+CLONE_DETECTION_SHARDING = "auto"
+# 分割検出で 1 シャードあたりに使う CCFinderSW のヒープ
+CCFINDERSW_SHARD_JAVA_XMX = "8G"
+
+# prepare-jvm で作成する CCFinderSW 用の AppCDS アーカイブ．
+CCFINDERSW_CDS_ARCHIVE = project_root / "dest/jvm/ccfindersw.jsa"
+# True の場合，CCFINDERSW_CDS_ARCHIVE が存在すれば CCFinderSW の起動時に指定する．
+CCFINDERSW_USE_CDS_ARCHIVE = False
+
+# CCFinderSW を常駐ワーカー（JVM を起動したまま使い回す）で実行するか．
+# False の場合は従来どおりジョブごとに JVM を起動する．ワーカーで失敗したジョブは再実行せずにエラーにする．
+CCFINDERSW_USE_WORKER = False
+# ワーカーのクラス（lib/ccfindersw-worker/CCFinderSWWorker.java）のコンパイル先．初回の起動時に javac でコンパイルする．
+CCFINDERSW_WORKER_CLASSES = project_root / "dest/jvm/worker"
+# ワーカーを再起動するまでに処理するジョブ数
+CCFINDERSW_WORKER_MAX_JOBS = 50
+# ジョブ終了時に GC した後のヒープ使用率（使用量 / -Xmx）がこの値を超えたらワーカーを再起動する
+CCFINDERSW_WORKER_HEAP_RECYCLE_RATIO = 0.7
+
+"""
+    クローン検出器：
+        ccfindersw: コミットごとに CCFinderSW でプロジェクト全体を検出する．
+        incremental: git の blob SHA をキーにトークン列・フィンガープリントをキャッシュし，
+                     変更されたファイルだけを再トークン化して Type-1/2 クローンを検出する（チェックアウト不要）．
+                     CCFinderSW とは別の検出器で結果は一致しないので，dest/clones_json_incremental に保存する．
+        マニフェストに記録した検出器が設定と異なる検出結果は，collect で検出し直す．
+"""
+CLONE_DETECTOR = "ccfindersw"
+
+# incremental 検出器でクローンとみなす最小トークン数（CCFinderSW の -t に相当）
+INCREMENTAL_DETECTOR_MIN_TOKENS = 50
+
+"""
+    クローン検出の入力：
+        snapshot: 対象言語の拡張子を持つファイルだけを git のオブジェクトから SNAPSHOT_ROOT に展開して検出する．
+                  dest/projects の作業ツリーや HEAD は変更しないので，他の処理と同時に読み出せる．
+        checkout: 従来どおり dest/projects をコミットごとにチェックアウトして検出する（jobs > 1 の場合は git worktree）．
+"""
+CLONE_DETECTION_SOURCE = "checkout"
+
+"""
+    クローン検出の範囲：
+        repository: リポジトリ全体を検出対象にする．
+        services: 対象言語のサービスのコンテキスト（データセットの project["languages"][言語] のキー）配下だけを
+                  スナップショットに展開して検出する．file_path はリポジトリルート基準のまま．
+                  CCFinderSW の場合は CLONE_DETECTION_SOURCE の設定にかかわらずスナップショットを使う．
+"""
+DETECTION_SCOPE = "repository"
+
+# スナップショットに展開する際，内容が同一のファイル（blob SHA と拡張子が同じもの）は 1 つだけを CCFinderSW に渡し，
+# 代表ファイルのクローン片と，重複ファイル同士のファイル全体のクローンセットを書き戻す．
+# 有効にすると CCFinderSW は CLONE_DETECTION_SOURCE の設定にかかわらずスナップショットから検出する（incremental 検出器では使わない）．
+DEDUPLICATE_IDENTICAL_FILES = False
+
+# スナップショットの展開先．tmpfs（/dev/shm）があればそちらを使う．
+SNAPSHOT_ROOT = (
+    Path("/dev/shm/msccatools/snapshots")
+    if Path("/dev/shm").is_dir()
+    else project_root / "dest/temp/snapshots"
+)
+
+"""
+    collect の実行方法：
+        COLLECT_PIPELINE: True の場合，コミットごとのクローン検出（CCFinderSW と出力の解析）と
+                          隣り合うコミット間の差分（find_moving_lines）を asyncio で重ねて実行する．
+                          コミット N の差分を取っている間にコミット N+1 の検出を進める．
+                          CLONE_DETECTION_SOURCE = "checkout" では作業ツリーを切り替えるため使わない．
+        COLLECT_PIPELINE_QUEUE_SIZE: 検出済みで差分を待っているコミットの最大数．
+                                     差分が追いつかない場合，これを超えて検出を先に進めない．
+"""
+COLLECT_PIPELINE = False
+COLLECT_PIPELINE_QUEUE_SIZE = 2
+
+# analyze-cc で (言語, コミットの組) を並列に処理するプロセス数（1 なら 1 つのプロセスで順に処理する）．
+# run-all-steps の --analyze-workers で上書きできる．
+ANALYZE_CC_WORKERS = 1
+
+# analyze-cc で，差分に現れないファイル（親の行 = 子の行）のクローン片を行対応をたどらずに
+# (開始行, 終了行) の一致と入れ子だけで親と対応付ける．結果は False の場合と同じ．
+ANALYZE_UNTOUCHED_FILES_FAST_PATH = False
+
+"""
+    analyze-cc の出力（dest/modified_clones/<name>/<親>-<子>/<lang>.json）の形式：
+        compact: 子クローンセットの clone_id とフラグメント数，フラグメントごとの親の (clone_id, index) と
+                 modified のフラグメントの位置だけを整数の配列で持つ（インデントなし）．
+        full: フラグメントごとに type と親・子のフラグメント（パスと行）を全て持つ（indent=4）．従来の形式．
+        analyze-modification はどちらも読める．既存の full のファイルは convert-modified-clones で compact にできる．
+"""
+MODIFIED_CLONES_FORMAT = "full"
+
+# run-all-steps で analyze-cc と analyze-modification をまとめて実行する（コミットの組ごとのクローン差分を
+# dest/modified_clones に書き出さず，そのまま変更履歴の集計に渡す）．False でも --fuse で有効にでき，
+# --no-fuse で打ち消せる．--from-step analyze-modification の場合は常に dest/modified_clones を読む．
+ANALYZE_FUSED = False
+
+"""
+    clones_json の解析結果のキャッシュ：
+        1 つのプロセスの中で collect，analyze-cc，analyze-modification が共有し，
+        同じ clones_json を（子としても親としても）1 度だけ解析する．FileMapper やファイルごとのクローン片の索引も保持する．
+        SNAPSHOT_CACHE_MAX_BYTES: キャッシュの推定メモリ使用量の上限（バイト）．0 で無効．
+                                  ANALYZE_CC_WORKERS が 2 以上の場合はワーカープロセスごとの上限．
+        SNAPSHOT_CACHE_SIZE_FACTOR: clones_json のファイルサイズに掛けてメモリ使用量を見積もる係数．
+"""
+SNAPSHOT_CACHE_MAX_BYTES = 2 * 1024**3
+SNAPSHOT_CACHE_SIZE_FACTOR = 5
+
+"""
+    クローン検出結果の保存形式：
+        json: dest/clones_json/<name>/<sha>/<lang>.json を書き出す．
+        columnar: 検出後に <lang>.json を，フラグメントの列を int32 の配列にした <lang>.npy と，
+                  file_data などを持つ <lang>.meta.json に置き換える．analyze-cc などは .npy をメモリマップで開き，
+                  列のまま解析する．どちらの設定でも，<lang>.json があればそれを，なければ列指向の形式を読む．
+                  既存の結果は migrate-clone-snapshots で変換できる．
+"""
+CLONE_SNAPSHOT_FORMAT = "json"
+
+"""
+    言語判定器：
+        github-linguist: github-linguist コマンド（Ruby）で判定する．
+        builtin: lib/linguist に抜き出した github-linguist のデータ（languages.yml，ヒューリスティクス，
+                 ベンダリング・ドキュメント・生成ファイルの判定）を使う Python 実装で判定する．
+                 サブプロセスを起動しない．結果の形式は github-linguist --json --breakdown と同じ．
+                 check-language-classifier で記録済みの github-linguist の結果と比較できる．
+"""
+LANGUAGE_CLASSIFIER = "github-linguist"
+
+# 言語判定の結果を dest/linguist_cache にキャッシュする（HEAD のルートツリーの SHA ごとの結果と，
+# (.gitattributes, blob SHA, パス) ごとの判定結果）．キャッシュにないツリーでは判定したことのないファイルだけを判定し直す．
+LINGUIST_CACHE = False
+
+"""
+    中間成果物（dest/temp/ccfswtxt，dest/moving_lines，dest/modified_clones）の保持：
+        ARTIFACT_COMPRESSION: CSV がまだ揃っていないプロジェクトの moving_lines / modified_clones を圧縮する形式．
+                              "zstd"（zstandard が入っていなければ警告を表示して gzip），"gzip"，None（圧縮しない）．
+                              圧縮したファイルは読み込み時に逐次展開される．
+        ARTIFACT_GC_AUTO: run-all-steps で各プロジェクトの処理が全て成功した後に gc を実行する（--gc でも指定できる）．
+                          全言語の CSV が揃い，いずれも入力より新しいプロジェクトの中間成果物は削除される．
+        ARTIFACT_DISK_QUOTA: 中間成果物の合計サイズの上限（"200G" など．None は無制限）．
+                             超えた場合は圧縮と削除を行い，それでも超える場合は run-all-steps を停止する．
+"""
+ARTIFACT_COMPRESSION = None
+ARTIFACT_GC_AUTO = False
+ARTIFACT_DISK_QUOTA = None
+
 # 対象のプログラミング言語
 TARGET_PROGRAMING_LANGUAGES = (
     "Java",
@@ -0,0 +1,41 @@
+package sample;
+
+import java.util.ArrayList;
+import java.util.List;
+
+public class Inventory {
+    private final List<String> names = new ArrayList<>();
+    private final List<Integer> counts = new ArrayList<>();
+
+    public int totalOf(String prefix) {
+        int total = 0;
+        for (int i = 0; i < names.size(); i++) {
+            String name = names.get(i);
+            if (name != null && name.startsWith(prefix)) {
+                int count = counts.get(i);
+                if (count > 0) {
+                    total += count;
+                } else {
+                    total -= 1;
+                }
+            }
+        }
+        return total;
+    }
+
+    public int totalOfSuffix(String suffix) {
+        int total = 0;
+        for (int i = 0; i < names.size(); i++) {
+            String name = names.get(i);
+            if (name != null && name.endsWith(suffix)) {
+                int count = counts.get(i);
+                if (count > 0) {
+                    total += count;
+                } else {
+                    total -= 1;
+                }
+            }
+        }
+        return total;
+    }
+}
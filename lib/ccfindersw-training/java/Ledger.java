@@ -0,0 +1,25 @@
+package sample;
+
+import java.util.ArrayList;
+import java.util.List;
+
+public class Ledger {
+    private final List<String> accounts = new ArrayList<>();
+    private final List<Integer> amounts = new ArrayList<>();
+
+    public int balanceOf(String prefix) {
+        int balance = 0;
+        for (int j = 0; j < accounts.size(); j++) {
+            String account = accounts.get(j);
+            if (account != null && account.startsWith(prefix)) {
+                int amount = amounts.get(j);
+                if (amount > 0) {
+                    balance += amount;
+                } else {
+                    balance -= 1;
+                }
+            }
+        }
+        return balance;
+    }
+}
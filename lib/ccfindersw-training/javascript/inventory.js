@@ -0,0 +1,33 @@
+function totalOf(names, counts, prefix) {
+  let total = 0;
+  for (let i = 0; i < names.length; i++) {
+    const name = names[i];
+    if (name !== null && name.startsWith(prefix)) {
+      const count = counts[i];
+      if (count > 0) {
+        total += count;
+      } else {
+        total -= 1;
+      }
+    }
+  }
+  return total;
+}
+
+function totalOfSuffix(names, counts, suffix) {
+  let total = 0;
+  for (let i = 0; i < names.length; i++) {
+    const name = names[i];
+    if (name !== null && name.endsWith(suffix)) {
+      const count = counts[i];
+      if (count > 0) {
+        total += count;
+      } else {
+        total -= 1;
+      }
+    }
+  }
+  return total;
+}
+
+module.exports = { totalOf, totalOfSuffix };
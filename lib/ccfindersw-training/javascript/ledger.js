@@ -0,0 +1,17 @@
+function balanceOf(accounts, amounts, prefix) {
+  let balance = 0;
+  for (let j = 0; j < accounts.length; j++) {
+    const account = accounts[j];
+    if (account !== null && account.startsWith(prefix)) {
+      const amount = amounts[j];
+      if (amount > 0) {
+        balance += amount;
+      } else {
+        balance -= 1;
+      }
+    }
+  }
+  return balance;
+}
+
+module.exports = { balanceOf };
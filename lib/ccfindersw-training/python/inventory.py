@@ -0,0 +1,24 @@
+def total_of(names, counts, prefix):
+    total = 0
+    for i in range(len(names)):
+        name = names[i]
+        if name is not None and name.startswith(prefix):
+            count = counts[i]
+            if count > 0:
+                total += count
+            else:
+                total -= 1
+    return total
+
+
+def total_of_suffix(names, counts, suffix):
+    total = 0
+    for i in range(len(names)):
+        name = names[i]
+        if name is not None and name.endswith(suffix):
+            count = counts[i]
+            if count > 0:
+                total += count
+            else:
+                total -= 1
+    return total
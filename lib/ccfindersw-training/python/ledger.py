@@ -0,0 +1,11 @@
+def balance_of(accounts, amounts, prefix):
+    balance = 0
+    for j in range(len(accounts)):
+        account = accounts[j]
+        if account is not None and account.startswith(prefix):
+            amount = amounts[j]
+            if amount > 0:
+                balance += amount
+            else:
+                balance -= 1
+    return balance
@@ -0,0 +1,57 @@
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryMXBean;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * CCFinderSW を 1 つの JVM 上で繰り返し実行する常駐ワーカー。
+ *
+ * 標準入力から 1 行 1 ジョブ（CCFinderSW の引数をタブ区切り）で受け取り、
+ * 結果を標準出力に 1 行で返す。
+ *   OK\t<GC 後の使用ヒープ(byte)>\t<最大ヒープ(byte)>
+ *   ERR\t<メッセージ>
+ * CCFinderSW 自身の標準出力は標準エラーに付け替え、プロトコルと混ざらないようにする。
+ *
+ * 起動例:
+ *   javac -cp CCFinderSW-1.0.jar -d dest/jvm/worker CCFinderSWWorker.java
+ *   java -Xmx20G -cp CCFinderSW-1.0.jar:dest/jvm/worker CCFinderSWWorker
+ */
+public class CCFinderSWWorker {
+    public static void main(String[] args) throws Exception {
+        Method launcher = Class.forName("ccfindersw.CCFSWLauncher").getMethod("main", String[].class);
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        MemoryMXBean memory = ManagementFactory.getMemoryMXBean();
+        protocol.println("READY");
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] jobArgs = line.split("\t", -1);
+            try {
+                launcher.invoke(null, (Object) jobArgs);
+                System.out.flush();
+                // ジョブのゴミが残ったままの使用量では再起動の判定にならないので、GC 後に残っている量を返す
+                memory.gc();
+                long used = memory.getHeapMemoryUsage().getUsed();
+                protocol.println("OK\t" + used + "\t" + Runtime.getRuntime().maxMemory());
+            } catch (InvocationTargetException e) {
+                protocol.println("ERR\t" + oneLine(e.getCause()));
+            } catch (Throwable t) {
+                protocol.println("ERR\t" + oneLine(t));
+            }
+        }
+    }
+
+    private static String oneLine(Throwable t) {
+        return String.valueOf(t).replace('\n', ' ').replace('\r', ' ').replace('\t', ' ');
+    }
+}
@@ -38,6 +38,42 @@ def main() -> int:
         help="src/commands/pipeline/refresh_service_map.py を実行",
     )
     subparsers.add_parser("check-run-all-steps", help="run-all-steps の進捗を確認")
+    subparsers.add_parser(
+        "prepare-jvm",
+        help="CCFinderSW 用の AppCDS アーカイブを作成し、起動時間のベンチマークを表示",
+    )
+    subparsers.add_parser(
+        "verify-incremental-detection",
+        help="インクリメンタル検出の結果を同じツリーに対する CCFinderSW の結果と比較",
+    )
+    subparsers.add_parser(
+        "convert-moving-lines",
+        help="dest/moving_lines の旧形式（行番号の列挙）のファイルを区間形式に変換",
+    )
+    subparsers.add_parser(
+        "convert-modified-clones",
+        help="dest/modified_clones の全フラグメントを列挙する形式のファイルを、対応と変更だけを整数の配列で持つ形式に変換",
+    )
+    subparsers.add_parser(
+        "check-language-classifier",
+        help="Python 実装の言語判定器の結果を記録済みの github-linguist の結果（dest/github_linguist）と比較",
+    )
+    subparsers.add_parser(
+        "verify-corresponded-lines",
+        help="analyze_cc の配列ベースの行対応・クローン対応付けが以前の実装と同じ結果になるか記録済みのコミットの組で確認",
+    )
+    subparsers.add_parser(
+        "benchmark-fragment-index",
+        help="クローン片の対応付けで親フラグメントを区間索引から引く場合と線形走査の場合を合成データで比較",
+    )
+    subparsers.add_parser(
+        "migrate-clone-snapshots",
+        help="dest/clones_json の既存の検出結果を列指向の形式（.npy と .meta.json）に置き換え",
+    )
+    subparsers.add_parser(
+        "gc",
+        help="中間成果物（ccfswtxt / moving_lines / modified_clones）を CSV の生成状況に応じて削除・圧縮",
+    )
     subparsers.add_parser("summarize-csv", help="src/commands/csv_analysis/generate_report.py を実行")
     subparsers.add_parser("csv-boxplot", help="src/commands/csv_analysis/generate_figure.py を実行")
 
@@ -53,6 +89,24 @@ def main() -> int:
         return run_script("pipeline/refresh_service_map.py", unknown)
     if args.command == "check-run-all-steps":
         return run_script("misc/check_progress.py", unknown)
+    if args.command == "prepare-jvm":
+        return run_script("misc/prepare_jvm.py", unknown)
+    if args.command == "verify-incremental-detection":
+        return run_script("misc/verify_incremental_detection.py", unknown)
+    if args.command == "convert-moving-lines":
+        return run_script("misc/convert_moving_lines.py", unknown)
+    if args.command == "convert-modified-clones":
+        return run_script("misc/convert_modified_clones.py", unknown)
+    if args.command == "check-language-classifier":
+        return run_script("misc/check_language_classifier.py", unknown)
+    if args.command == "verify-corresponded-lines":
+        return run_script("misc/verify_corresponded_lines.py", unknown)
+    if args.command == "benchmark-fragment-index":
+        return run_script("misc/benchmark_fragment_index.py", unknown)
+    if args.command == "migrate-clone-snapshots":
+        return run_script("misc/migrate_clone_snapshots.py", unknown)
+    if args.command == "gc":
+        return run_script("misc/gc_artifacts.py", unknown)
     if args.command == "summarize-csv":
         return run_script("csv_analysis/generate_report.py", unknown)
     if args.command == "csv-boxplot":
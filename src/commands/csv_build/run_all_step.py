@@ -18,7 +18,9 @@ sys.path.append(str(project_root / "src"))
 import modules.collect_datas
 import modules.analyze_cc
 import modules.analyze_modification
-from config import SELECTED_DATASET
+import modules.artifact_gc as artifact_gc
+import modules.clone_store as clone_store
+from config import ANALYZE_FUSED, ARTIFACT_DISK_QUOTA, ARTIFACT_GC_AUTO, SELECTED_DATASET
 
 STEP_ORDER = ("collect", "analyze-cc", "analyze-modification")
 
@@ -70,6 +72,51 @@ def _parse_args() -> argparse.Namespace:
         default="collect",
         help="Step to start from for each project.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of git worktrees used to run clone detection in parallel (default: 1).",
+    )
+    parser.add_argument(
+        "--analyze-workers",
+        type=int,
+        default=None,
+        help="Number of processes used by analyze-cc for commit pairs (default: config.ANALYZE_CC_WORKERS).",
+    )
+    parser.add_argument(
+        "--fuse",
+        action="store_true",
+        help=(
+            "Run analyze-cc and analyze-modification together without writing dest/modified_clones "
+            "(default: config.ANALYZE_FUSED; --from-step analyze-modification always runs it separately)."
+        ),
+    )
+    parser.add_argument(
+        "--no-fuse",
+        action="store_true",
+        help="Run analyze-cc and analyze-modification as separate steps, even if config.ANALYZE_FUSED is set.",
+    )
+    parser.add_argument(
+        "--dump-modified-clones",
+        action="store_true",
+        help="In the fused mode, also write dest/modified_clones for debugging.",
+    )
+    parser.add_argument(
+        "--gc",
+        action="store_true",
+        help="Apply the artifact retention policy after each project that finished without errors (default: config.ARTIFACT_GC_AUTO).",
+    )
+    parser.add_argument(
+        "--no-gc",
+        action="store_true",
+        help="Do not apply the artifact retention policy after each project, even if config.ARTIFACT_GC_AUTO is set.",
+    )
+    parser.add_argument(
+        "--quota",
+        default=ARTIFACT_DISK_QUOTA,
+        help="Disk quota for intermediate artifacts, e.g. 200G (default: config.ARTIFACT_DISK_QUOTA).",
+    )
     return parser.parse_args()
 
 
@@ -96,16 +143,43 @@ def _resolve_start_index(args: argparse.Namespace, dataset: list[dict]) -> int:
     return args.start_index
 
 
-def _run_project(project: dict, from_step: str) -> None:
+def _run_project(
+    project: dict,
+    from_step: str,
+    jobs: int = 1,
+    gc: bool = False,
+    analyze_workers: int | None = None,
+    fuse: bool = False,
+    dump_modified_clones: bool = False,
+) -> None:
     start_at = STEP_ORDER.index(from_step)
-    for step in STEP_ORDER[start_at:]:
-        if step == "collect":
-            modules.collect_datas.collect_datas_of_repo(project)
-        elif step == "analyze-cc":
-            modules.analyze_cc.analyze_repo(project)
-        elif step == "analyze-modification":
-            modules.analyze_modification.analyze_repo(project)
-
+    succeeded = False
+    try:
+        for step in STEP_ORDER[start_at:]:
+            if step == "collect":
+                if not modules.collect_datas.collect_datas_of_repo(project, jobs=jobs):
+                    # 続きのステップは従来どおり実行するが，成果物は揃っていないので gc は行わない
+                    gc = False
+            elif step == "analyze-cc" and fuse:
+                # クローン差分を modified_clones に書き出さず，そのまま変更履歴の集計に渡す
+                modules.analyze_modification.analyze_repo_fused(project, workers=analyze_workers, dump=dump_modified_clones)
+                break
+            elif step == "analyze-cc":
+                modules.analyze_cc.analyze_repo(project, workers=analyze_workers)
+            elif step == "analyze-modification":
+                modules.analyze_modification.analyze_repo(project)
+        succeeded = True
+    finally:
+        # clones_json の解析結果は次のプロジェクトでは使わない
+        print(clone_store.snapshot_cache().report())
+        clone_store.snapshot_cache().clear()
+    # 全てのステップが成功した場合だけ gc を行う（CSV が揃っていれば中間成果物を削除し，揃っていなければ圧縮して残す）
+    if gc and succeeded:
+        stats = artifact_gc.collect_garbage(project)
+        print(
+            f"gc: removed {stats.removed_files} files, compressed {stats.compressed_files} files, "
+            f"freed {stats.freed_bytes / 1024 / 1024:.1f} MiB"
+        )
 
 if __name__ == "__main__":
     args = _parse_args()
@@ -126,8 +200,25 @@ if __name__ == "__main__":
         if args.only_index < 0 or args.only_index >= len(dataset):
             raise SystemExit(f"only-index out of range: {args.only_index}")
         dataset = [dataset[args.only_index]]
+    if args.jobs <= 0:
+        raise SystemExit("--jobs must be 1 or greater.")
+    if args.analyze_workers is not None and args.analyze_workers <= 0:
+        raise SystemExit("--analyze-workers must be 1 or greater.")
     start_index = _resolve_start_index(args, dataset)
     if start_index < 0 or start_index >= len(dataset):
         raise SystemExit(f"start index out of range: {start_index}")
+    quota = artifact_gc.parse_size(args.quota)
     for project in dataset[start_index:]:
-        _run_project(project, args.from_step)
+        try:
+            artifact_gc.enforce_quota(dataset, quota)
+        except artifact_gc.ArtifactQuotaExceededError as e:
+            raise SystemExit(str(e))
+        _run_project(
+            project,
+            args.from_step,
+            args.jobs,
+            gc=(ARTIFACT_GC_AUTO or args.gc) and not args.no_gc,
+            analyze_workers=args.analyze_workers,
+            fuse=(ANALYZE_FUSED or args.fuse) and not args.no_fuse,
+            dump_modified_clones=args.dump_modified_clones,
+        )
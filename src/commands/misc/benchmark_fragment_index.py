@@ -0,0 +1,150 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from modules.util import FileMapper  # noqa: E402
+from modules.clone_columns import CloneColumns  # noqa: E402
+import modules.analyze_cc as analyze_cc  # noqa: E402
+import modules.moving_lines as moving_lines  # noqa: E402
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Microbenchmark for correspond_code_fragments on a synthetic generated file: "
+            "parent fragment lookup through the interval index versus a linear scan."
+        )
+    )
+    parser.add_argument("--fragments", type=int, default=10000, help="Number of clone fragments in the file (default: 10000).")
+    parser.add_argument("--max-length", type=int, default=40, help="Maximum fragment length in lines (default: 40).")
+    parser.add_argument("--hunks", type=int, default=200, help="Number of inserted/deleted/modified ranges (default: 200).")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per variant (default: 3).")
+    parser.add_argument(
+        "--linear-sample",
+        type=int,
+        default=500,
+        help="Number of child fragments timed with the linear scan; its full time is extrapolated (default: 500, -1 for all).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    return parser.parse_args()
+
+
+def _synthetic_pair(fragments: int, max_length: int, hunk_count: int, seed: int):
+    """1 つの大きな生成ファイルについて、親・子のクローンセットと変更行を作る。"""
+    rng = random.Random(seed)
+    path = "generated/Client.java"
+    parent_loc = fragments * max_length // 4 + max_length
+    starts = sorted(rng.randint(1, parent_loc - max_length) for _ in range(fragments))
+    parent_fragments = [(start, start + rng.randint(4, max_length - 1)) for start in starts]
+
+    deleted = moving_lines.normalize_ranges([rng.randint(1, parent_loc), rng.randint(1, 5)] for _ in range(hunk_count))
+    deleted = moving_lines.clip(deleted, 1, parent_loc)
+    # 削除行を除いた親の行を、子では挿入行をはさみながら順に並べる
+    child_of_parent = {}
+    inserted = []
+    child_line = 0
+    deleted_lines = {line for start, length in deleted for line in range(start, start + length)}
+    insert_at = set(rng.sample(range(1, parent_loc), hunk_count))
+    for parent_line in range(1, parent_loc + 1):
+        if parent_line in insert_at:
+            length = rng.randint(1, 5)
+            inserted.append([child_line + 1, length])
+            child_line += length
+        if parent_line in deleted_lines:
+            continue
+        child_line += 1
+        child_of_parent[parent_line] = child_line
+    child_loc = child_line
+    modified = moving_lines.normalize_ranges([rng.randint(1, child_loc), rng.randint(1, 3)] for _ in range(hunk_count))
+
+    parent_sets = []
+    child_sets = []
+    for clone_id in range(0, len(parent_fragments) // 2):
+        pair = parent_fragments[clone_id * 2:clone_id * 2 + 2]
+        parent_sets.append({
+            "clone_id": clone_id,
+            "fragments": [{"file_id": 0, "start_line": s, "start_col": 0, "end_line": e, "end_col": 0} for s, e in pair],
+        })
+        child_pair = []
+        for s, e in pair:
+            mapped = [child_of_parent[line] for line in range(s, e + 1) if line in child_of_parent]
+            if mapped:
+                child_pair.append({"file_id": 0, "start_line": mapped[0], "start_col": 0, "end_line": mapped[-1], "end_col": 0})
+        if child_pair:
+            child_sets.append({"clone_id": clone_id, "fragments": child_pair})
+
+    hunks = [{"child_path": path, "parent_path": path, "inserted": inserted, "deleted": deleted, "modified": modified}]
+    child_filemap = FileMapper([{"file_id": 0, "file_path": path, "loc": child_loc}], "")
+    parent_filemap = FileMapper([{"file_id": 0, "file_path": path, "loc": parent_loc}], "")
+    return hunks, child_sets, parent_sets, child_filemap, parent_filemap
+
+
+def main() -> int:
+    args = _parse_args()
+    hunks, child_sets, parent_sets, child_filemap, parent_filemap = _synthetic_pair(
+        args.fragments, args.max_length, args.hunks, args.seed
+    )
+    corresponded_lines = analyze_cc.CorrespondedLines(hunks, child_filemap, parent_filemap)
+    print(
+        f"synthetic file: {sum(len(s['fragments']) for s in parent_sets)} parent fragments, "
+        f"{sum(len(s['fragments']) for s in child_sets)} child fragments"
+    )
+
+    # 線形走査は全件だと時間がかかりすぎるため、先頭から linear_sample 個の子フラグメントだけで計測する
+    sample_sets = child_sets
+    if args.linear_sample >= 0:
+        sample_sets = []
+        remaining = args.linear_sample
+        for clone_set in child_sets:
+            if remaining <= 0:
+                break
+            sample_sets.append({"clone_id": clone_set["clone_id"], "fragments": clone_set["fragments"][:remaining]})
+            remaining -= len(sample_sets[-1]["fragments"])
+    total = sum(len(s["fragments"]) for s in child_sets)
+    sampled = sum(len(s["fragments"]) for s in sample_sets)
+
+    parent_fragments = CloneColumns.from_clone_sets(parent_sets)
+
+    def best_time(clone_sets, use_index):
+        child_fragments = CloneColumns.from_clone_sets(clone_sets)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = analyze_cc.correspond_code_fragments(
+                corresponded_lines, child_fragments, parent_fragments, child_filemap, parent_filemap, use_index=use_index
+            )
+            timings.append(time.perf_counter() - started)
+        return min(timings), result
+
+    index_time, index_result = best_time(child_sets, True)
+    sample_index_time, sample_index_result = best_time(sample_sets, True)
+    sample_linear_time, sample_linear_result = best_time(sample_sets, False)
+    estimated_linear_time = sample_linear_time * total / max(sampled, 1)
+    print(f"index: {index_time:.3f}s for {total} child fragments ({sample_index_time:.3f}s for the {sampled} sampled)")
+    print(
+        f"linear: {sample_linear_time:.3f}s for {sampled} sampled child fragments "
+        f"(~{estimated_linear_time:.1f}s estimated for all, x{estimated_linear_time / max(index_time, 1e-9):.0f})"
+    )
+
+    matched = sum(1 for fragments in index_result.values() for mapped in fragments.values() if mapped is not None)
+    same = sample_index_result == sample_linear_result
+    print(f"matched fragments: {matched}/{total}, sampled results identical: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from config import SELECTED_DATASET, TARGET_PROGRAMING_LANGUAGES  # noqa: E402
+import modules.language_classifier as language_classifier  # noqa: E402
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the builtin language classifier with the github-linguist results recorded in "
+            "dest/github_linguist (files per target language)."
+        )
+    )
+    parser.add_argument(
+        "--dataset",
+        default=SELECTED_DATASET,
+        help="Dataset JSON path (default: config.SELECTED_DATASET).",
+    )
+    parser.add_argument(
+        "--only-url",
+        default=None,
+        help="Check only the project that matches this URL.",
+    )
+    parser.add_argument(
+        "--commit",
+        default="HEAD",
+        help="Commit to classify; it must be the commit the recorded result was made for (default: HEAD).",
+    )
+    parser.add_argument(
+        "--show",
+        type=int,
+        default=5,
+        help="Number of differing files to print per language (default: 5).",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    with open(args.dataset, "r") as f:
+        dataset = json.load(f)
+    if args.only_url:
+        dataset = [project for project in dataset if project.get("URL") == args.only_url]
+
+    mismatched_projects = 0
+    for project in dataset:
+        url = project["URL"]
+        name = url.split("/")[-2] + "." + url.split("/")[-1]
+        workdir = project_root / "dest/projects" / name
+        recorded_path = project_root / "dest/github_linguist" / f"{name}.json"
+        if not workdir.exists() or not recorded_path.exists():
+            print(f"[skip] {name}: repository or recorded github-linguist result not found")
+            continue
+        with open(recorded_path, "r") as f:
+            recorded = json.load(f)
+        started = time.perf_counter()
+        classified = language_classifier.classify_repository(workdir, args.commit)
+        elapsed = time.perf_counter() - started
+
+        mismatched = False
+        for language in TARGET_PROGRAMING_LANGUAGES:
+            expected = set(recorded.get(language, {}).get("files", []))
+            actual = set(classified.get(language, {}).get("files", []))
+            if not expected and not actual:
+                continue
+            missing = sorted(expected - actual)
+            extra = sorted(actual - expected)
+            status = "OK" if not missing and not extra else "MISMATCH"
+            print(f"{name} {language}: files={len(expected)} missing={len(missing)} extra={len(extra)} {status}")
+            for path in missing[: args.show]:
+                print(f"  - {path}")
+            for path in extra[: args.show]:
+                print(f"  + {path}")
+            mismatched = mismatched or status != "OK"
+        if mismatched:
+            mismatched_projects += 1
+        print(f"{name}: classified in {elapsed:.2f}s")
+    print(f"mismatched projects: {mismatched_projects}")
+    return 1 if mismatched_projects else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
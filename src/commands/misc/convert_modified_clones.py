@@ -0,0 +1,54 @@
+import argparse
+import sys
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+import modules.modified_clones as modified_clones  # noqa: E402
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert dest/modified_clones files from the full per-fragment format to the compact format."
+    )
+    parser.add_argument(
+        "--dir",
+        type=Path,
+        default=project_root / "dest/modified_clones",
+        help="Directory to convert (default: dest/modified_clones).",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    converted = 0
+    skipped = 0
+    size_before = 0
+    size_after = 0
+    for path in sorted(args.dir.rglob("*.json")):
+        before = path.stat().st_size
+        if modified_clones.convert_file(path):
+            converted += 1
+            size_before += before
+            size_after += path.stat().st_size
+        else:
+            skipped += 1
+    print(f"converted: {converted} files, already converted: {skipped} files")
+    if converted:
+        print(f"size: {size_before / 1024 / 1024:.1f} MiB -> {size_after / 1024 / 1024:.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from config import ARTIFACT_DISK_QUOTA, SELECTED_DATASET  # noqa: E402
+import modules.artifact_gc as artifact_gc  # noqa: E402
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Apply the retention policy to intermediate artifacts (dest/temp/ccfswtxt, dest/moving_lines, "
+            "dest/modified_clones): delete them for projects whose CSVs are complete and compress the rest. "
+            "The token cache of the incremental detector (dest/token_cache) is deleted once every project in the "
+            "dataset is complete; outdated cache versions are always deleted."
+        )
+    )
+    parser.add_argument(
+        "--dataset",
+        default=SELECTED_DATASET,
+        help="Dataset JSON path (default: config.SELECTED_DATASET).",
+    )
+    parser.add_argument(
+        "--only-url",
+        default=None,
+        help="Collect garbage only for the project that matches this URL.",
+    )
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="Only delete artifacts; do not compress artifacts that are still needed.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show what would be deleted or compressed without changing anything.",
+    )
+    parser.add_argument(
+        "--token-cache",
+        action="store_true",
+        help="Also delete the current token cache of the incremental detector even if some projects are incomplete.",
+    )
+    parser.add_argument(
+        "--quota",
+        default=ARTIFACT_DISK_QUOTA,
+        help="Fail if the artifacts still exceed this size after gc, e.g. 200G (default: config.ARTIFACT_DISK_QUOTA).",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    with open(args.dataset, "r") as f:
+        dataset = json.load(f)
+    if args.only_url:
+        dataset = [project for project in dataset if project.get("URL") == args.only_url]
+        if not dataset:
+            raise SystemExit(f"URL not found in dataset: {args.only_url}")
+
+    before = artifact_gc.disk_usage()
+    total = artifact_gc.GCStats()
+    for project in dataset:
+        stats = artifact_gc.collect_garbage(project, compress=not args.no_compress, dry_run=args.dry_run)
+        if stats.removed_files or stats.compressed_files:
+            state = "complete" if artifact_gc.is_complete(project) else "incomplete"
+            print(
+                f"{artifact_gc.project_name(project)} ({state}): removed={stats.removed_files} "
+                f"compressed={stats.compressed_files} freed={stats.freed_bytes / 1024**2:.1f} MiB"
+            )
+        total.add(stats)
+    if not args.only_url:
+        stats = artifact_gc.collect_token_cache(dataset, dry_run=args.dry_run, force=args.token_cache)
+        if stats.removed_files:
+            print(f"token cache: removed={stats.removed_files} freed={stats.freed_bytes / 1024**2:.1f} MiB")
+        total.add(stats)
+    after = before - total.freed_bytes if args.dry_run else artifact_gc.disk_usage()
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(
+        f"{prefix}removed {total.removed_files} files, compressed {total.compressed_files} files, "
+        f"freed {total.freed_bytes / 1024**2:.1f} MiB ({before / 1024**2:.1f} MiB -> {after / 1024**2:.1f} MiB)"
+    )
+    quota = artifact_gc.parse_size(args.quota)
+    if quota is not None and after > quota:
+        print(f"artifacts still exceed the quota ({after / 1024**2:.1f} MiB > {quota / 1024**2:.1f} MiB)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from modules.clone_columns import decode_clone_sets  # noqa: E402
+import modules.clone_store as clone_store  # noqa: E402
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Convert existing dest/clones_json/<name>/<sha>/<lang>.json files to the columnar format "
+            "(<lang>.npy and <lang>.meta.json) that analyze-cc and the other steps load through a memory map. "
+            "Each JSON file is removed once it has been converted."
+        )
+    )
+    parser.add_argument(
+        "--only-name",
+        default=None,
+        help="Convert only this project (directory name under dest/clones_json, e.g. owner.repo).",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check that every converted file loads with the same clone sets as its JSON file and compare load times.",
+    )
+    return parser.parse_args()
+
+
+def _load_json(json_path: Path, elapsed: dict) -> dict:
+    started = time.perf_counter()
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    elapsed["json"] += time.perf_counter() - started
+    return data
+
+
+def _verify(json_path: Path, data: dict, elapsed: dict) -> bool:
+    """変換した結果を読み込み、変換前の clones_json（data）と内容が同じか調べる。"""
+    started = time.perf_counter()
+    snapshot = clone_store.load_snapshot(json_path.parent.parent.name, json_path.parent.name, json_path.stem)
+    elapsed["columnar"] += time.perf_counter() - started
+    clone_store.snapshot_cache().clear()
+    return snapshot.file_data == data["file_data"] and decode_clone_sets(snapshot.fragments) == data["clone_sets"]
+
+
+def main() -> int:
+    args = _parse_args()
+    root = clone_store.CLONES_JSON_ROOT
+    project_dirs = sorted(path for path in root.iterdir() if path.is_dir()) if root.exists() else []
+    if args.only_name:
+        project_dirs = [path for path in project_dirs if path.name == args.only_name]
+
+    converted = 0
+    linked = 0
+    failed = 0
+    size_json = 0
+    size_columnar = 0
+    elapsed = {"json": 0.0, "columnar": 0.0}
+    for project_dir in project_dirs:
+        # reuse_snapshot でハードリンクされた結果は 1 度だけ変換し、変換結果もハードリンクする
+        converted_inodes: dict[tuple[int, int], Path] = {}
+        for json_path in sorted(project_dir.glob("*/*.json")):
+            if json_path.name == "manifest.json" or json_path.name.endswith(".meta.json"):
+                continue
+            name, commit_hash, language = project_dir.name, json_path.parent.name, json_path.stem
+            stat = json_path.stat()
+            inode = (stat.st_dev, stat.st_ino)
+            # 変換すると clones_json は削除されるので、比べる内容は先に読んでおく
+            data = _load_json(json_path, elapsed) if args.verify else None
+            if inode in converted_inodes:
+                clone_store.link_snapshot(converted_inodes[inode], json_path)
+                linked += 1
+            else:
+                clone_store.write_columnar(name, commit_hash, language)
+                converted += 1
+                size_json += stat.st_size
+                size_columnar += sum(path.stat().st_size for path in clone_store.columnar_paths(json_path))
+            converted_inodes[inode] = json_path
+            if args.verify and not _verify(json_path, data, elapsed):
+                failed += 1
+                print(f"[MISMATCH] {json_path.relative_to(root)}")
+    print(f"converted: {converted} files, hardlinked: {linked} files")
+    if converted:
+        print(f"size: {size_json / 1024 / 1024:.1f} MiB (json) -> {size_columnar / 1024 / 1024:.1f} MiB (columnar)")
+    if args.verify:
+        print(f"verified: {failed} mismatched, load time json {elapsed['json']:.2f}s, columnar {elapsed['columnar']:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from config import CCFINDERSW_CDS_ARCHIVE, CCFINDERSW_JAR  # noqa: E402
+from modules.ccfindersw import build_ccfindersw_args, java_options  # noqa: E402
+
+TRAINING_SAMPLE = project_root / "lib/ccfindersw-training"
+# (言語, サンプルディレクトリ, 拡張子) ANTLR 経由の言語も 1 つ含めてクラスを網羅する
+TRAINING_RUNS = (
+    ("Java", "java", ("java",)),
+    ("Python", "python", ("py",)),
+    ("JavaScript", "javascript", ("js",)),
+)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Create an AppCDS archive for CCFinderSW.")
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        default=3,
+        help="Number of timed runs per language with and without the archive (0 to skip).",
+    )
+    return parser.parse_args()
+
+
+def _ccfindersw_cmd(extra_options: list[str], language: str, sample_dir: str, exts: tuple[str], out_dir: Path, use_cds_archive: bool) -> list[str]:
+    args = build_ccfindersw_args(TRAINING_SAMPLE / sample_dir, language, exts, out_dir / language)
+    return ["java", *java_options(use_cds_archive=use_cds_archive), *extra_options, "-jar", str(CCFINDERSW_JAR), *args]
+
+
+def _record_class_list(work_dir: Path) -> Path:
+    """サンプルに対して CCFinderSW を試走させ、ロードされたクラスの一覧を作る。"""
+    class_list = work_dir / "ccfindersw.classlist"
+    seen: set[str] = set()
+    lines: list[str] = []
+    for language, sample_dir, exts in TRAINING_RUNS:
+        print(f"training run: {language}")
+        run_list = work_dir / f"{sample_dir}.classlist"
+        cmd = _ccfindersw_cmd([f"-XX:DumpLoadedClassList={run_list}"], language, sample_dir, exts, work_dir, use_cds_archive=False)
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        with open(run_list, "r") as f:
+            for line in f:
+                if line not in seen:
+                    seen.add(line)
+                    lines.append(line)
+    with open(class_list, "w") as f:
+        f.writelines(lines)
+    print(f"classes: {len(lines)}")
+    return class_list
+
+
+def _dump_archive(class_list: Path) -> None:
+    CCFINDERSW_CDS_ARCHIVE.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "java",
+        *java_options(use_cds_archive=False),
+        "-Xshare:dump",
+        f"-XX:SharedClassListFile={class_list}",
+        f"-XX:SharedArchiveFile={CCFINDERSW_CDS_ARCHIVE}",
+        "-cp",
+        str(CCFINDERSW_JAR),
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    print(f"archive: {CCFINDERSW_CDS_ARCHIVE}")
+
+
+def _benchmark(work_dir: Path, repeat: int) -> None:
+    """アーカイブの有無で CCFinderSW 1 回あたりの実行時間を比較する。"""
+    print(f"benchmark ({repeat} runs per language)")
+    print("| language | without archive (s) | with archive (s) | saved (s) |")
+    print("| --- | --- | --- | --- |")
+    saved_total = []
+    for language, sample_dir, exts in TRAINING_RUNS:
+        elapsed: dict[bool, list[float]] = {False: [], True: []}
+        for _ in range(repeat):
+            for use_cds_archive in (False, True):
+                cmd = _ccfindersw_cmd([], language, sample_dir, exts, work_dir, use_cds_archive)
+                started = time.perf_counter()
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+                elapsed[use_cds_archive].append(time.perf_counter() - started)
+        without_archive = statistics.median(elapsed[False])
+        with_archive = statistics.median(elapsed[True])
+        saved_total.append(without_archive - with_archive)
+        print(f"| {language} | {without_archive:.3f} | {with_archive:.3f} | {without_archive - with_archive:.3f} |")
+    print(f"average saved per invocation: {statistics.mean(saved_total):.3f}s")
+
+
+def main() -> int:
+    args = _parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(temp_dir)
+        class_list = _record_class_list(work_dir)
+        _dump_archive(class_list)
+        if args.benchmark > 0:
+            _benchmark(work_dir, args.benchmark)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
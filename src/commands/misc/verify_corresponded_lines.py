@@ -0,0 +1,199 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from config import SELECTED_DATASET  # noqa: E402
+from modules.clone_columns import decode_clone_sets  # noqa: E402
+import modules.analyze_cc as analyze_cc  # noqa: E402
+import modules.artifact_store as artifact_store  # noqa: E402
+import modules.clone_store as clone_store  # noqa: E402
+import modules.moving_lines as moving_lines  # noqa: E402
+
+# 比較に使う以前の実装（git の履歴から読み込む）
+BASELINE_SOURCE = "src/modules/analyze_cc.py"
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Check that the array-backed CorrespondedLines and clone correspondence in analyze_cc give the same "
+            "results as the original line-by-line implementation on recorded commit pairs. The original "
+            "src/modules/analyze_cc.py is loaded from git history and fed the hunks expanded to line lists."
+        )
+    )
+    parser.add_argument(
+        "--dataset",
+        default=SELECTED_DATASET,
+        help="Dataset JSON path (default: config.SELECTED_DATASET).",
+    )
+    parser.add_argument(
+        "--only-url",
+        default=None,
+        help="Check only the project that matches this URL.",
+    )
+    parser.add_argument(
+        "--max-pairs",
+        type=int,
+        default=20,
+        help="Maximum number of commit pairs to check per project and language (default: 20, -1 for all).",
+    )
+    parser.add_argument(
+        "--baseline-rev",
+        default=None,
+        help="Git revision of the original analyze_cc implementation (default: the root commit of this repository).",
+    )
+    return parser.parse_args()
+
+
+def load_baseline(rev: str | None) -> types.ModuleType:
+    """rev の時点の src/modules/analyze_cc.py をモジュールとして読み込む。"""
+    if rev is None:
+        rev = subprocess.run(
+            ["git", "rev-list", "--max-parents=0", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.split()[-1]
+    source = subprocess.run(
+        ["git", "show", f"{rev}:{BASELINE_SOURCE}"], cwd=project_root, capture_output=True, text=True, check=True
+    ).stdout
+    module = types.ModuleType("analyze_cc_baseline")
+    module.__file__ = str(project_root / BASELINE_SOURCE)
+    exec(compile(source, f"{rev}:{BASELINE_SOURCE}", "exec"), module.__dict__)
+    return module
+
+
+def to_legacy_hunks(hunks: list[dict]) -> list[dict]:
+    """区間形式の hunk を、以前の実装が読む行番号の列挙（inserted_lines など）に戻す。"""
+    return [
+        {
+            "child_path": hunk["child_path"],
+            "parent_path": hunk["parent_path"],
+            **{
+                f"{category}_lines": [line for start, length in hunk[category] for line in range(start, start + length)]
+                for category in moving_lines.CATEGORIES
+            },
+        }
+        for hunk in hunks
+    ]
+
+
+def _query_mismatches(expected, actual: analyze_cc.CorrespondedLines, hunks: list[dict]) -> list[str]:
+    """行単位の問い合わせの結果を比べ、異なるものを返す。expected は以前の実装の CorrespondedLines。"""
+    mismatches = []
+    for child_path, lines in expected.corresponded_lines.items():
+        last = max(lines, default=0)
+        for line in range(0, last + 2):
+            if expected.get_parent_line(child_path, line) != actual.get_parent_line(child_path, line):
+                mismatches.append(f"get_parent_line({child_path}, {line})")
+        if expected.get_fragment_loc_of_parent(child_path, 1, last) != actual.get_fragment_loc_of_parent(child_path, 1, last):
+            mismatches.append(f"get_fragment_loc_of_parent({child_path}, 1, {last})")
+    for hunk in hunks:
+        for key, category, name in (
+            ("parent_path", "deleted", "is_line_deleted"),
+            ("child_path", "inserted", "is_line_added"),
+            ("child_path", "modified", "is_line_modified"),
+        ):
+            for start, length in hunk[category]:
+                for line in range(start - 1, start + length + 1):
+                    if getattr(expected, name)(hunk[key], line) != getattr(actual, name)(hunk[key], line):
+                        mismatches.append(f"{name}({hunk[key]}, {line})")
+    return mismatches
+
+
+def _check_pair(
+    baseline: types.ModuleType, name: str, language: str, commit_hash: str, prev_hash: str, elapsed: dict
+) -> list[str] | None:
+    line_diff_file = project_root / "dest/moving_lines" / name / f"{commit_hash}-{prev_hash}.json"
+    if (
+        not artifact_store.exists(line_diff_file)
+        or not clone_store.snapshot_exists(name, prev_hash, language)
+        or not clone_store.snapshot_exists(name, commit_hash, language)
+    ):
+        return None
+    hunks = moving_lines.load(line_diff_file)
+    child = clone_store.load_snapshot(name, prev_hash, language)
+    parent = clone_store.load_snapshot(name, commit_hash, language)
+    child_filemap = child.filemap
+    parent_filemap = parent.filemap
+
+    # 以前の実装は clones_json と同じ形の clone_sets を、現在の実装は列のまま受け取る
+    inputs = (
+        ("baseline", baseline, to_legacy_hunks(hunks), decode_clone_sets(child.fragments), decode_clone_sets(parent.fragments)),
+        ("indexed", analyze_cc, hunks, child.fragments, parent.fragments),
+    )
+    results = {}
+    for label, module, module_hunks, child_clones, parent_clones in inputs:
+        started = time.perf_counter()
+        corresponded_lines = module.CorrespondedLines(module_hunks, child_filemap, parent_filemap)
+        fragments = module.correspond_code_fragments(corresponded_lines, child_clones, parent_clones, child_filemap, parent_filemap)
+        modified_clones = module.correspond_clonesets(
+            fragments, corresponded_lines, child_clones, parent_clones, child_filemap, parent_filemap
+        )
+        elapsed[label] += time.perf_counter() - started
+        results[label] = (corresponded_lines, fragments, modified_clones)
+
+    mismatches = _query_mismatches(results["baseline"][0], results["indexed"][0], hunks)
+    if results["baseline"][1] != results["indexed"][1]:
+        mismatches.append("correspond_code_fragments")
+    if results["baseline"][2] != results["indexed"][2]:
+        mismatches.append("correspond_clonesets")
+    return mismatches
+
+
+def main() -> int:
+    args = _parse_args()
+    with open(args.dataset, "r") as f:
+        dataset = json.load(f)
+    if args.only_url:
+        dataset = [project for project in dataset if project.get("URL") == args.only_url]
+
+    baseline = load_baseline(args.baseline_rev)
+    checked = 0
+    failed = 0
+    elapsed = {"baseline": 0.0, "indexed": 0.0}
+    for project in dataset:
+        url = project["URL"]
+        name = url.split("/")[-2] + "." + url.split("/")[-1]
+        analyzed_commits_path = project_root / "dest/analyzed_commits" / f"{name}.json"
+        if not analyzed_commits_path.exists():
+            continue
+        with open(analyzed_commits_path, "r") as f:
+            analyzed_commit_hashes = json.load(f)
+        for language in project["languages"]:
+            pairs = 0
+            for prev_hash, commit_hash in zip(analyzed_commit_hashes, analyzed_commit_hashes[1:]):
+                if args.max_pairs >= 0 and pairs >= args.max_pairs:
+                    break
+                mismatches = _check_pair(baseline, name, language, commit_hash, prev_hash, elapsed)
+                if mismatches is None:
+                    continue
+                pairs += 1
+                checked += 1
+                if mismatches:
+                    failed += 1
+                    print(f"[MISMATCH] {name} {language} {commit_hash}-{prev_hash}: {len(mismatches)} differences")
+                    for mismatch in mismatches[:5]:
+                        print(f"  {mismatch}")
+            if pairs:
+                print(f"{name} {language}: checked {pairs} pairs")
+    print(f"checked {checked} pairs, {failed} mismatched")
+    print(f"elapsed: baseline {elapsed['baseline']:.2f}s, indexed {elapsed['indexed']:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
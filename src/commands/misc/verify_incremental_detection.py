@@ -0,0 +1,171 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+from itertools import combinations
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from config import SELECTED_DATASET  # noqa: E402
+from modules.github_linguist import get_exts  # noqa: E402
+import modules.ccfindersw as ccfindersw  # noqa: E402
+import modules.incremental_detector as incremental_detector  # noqa: E402
+import modules.snapshot as snapshot  # noqa: E402
+from modules.detection_scope import service_prefixes  # noqa: E402
+
+# クローンペア: ((file_path, 開始行, 終了行), (file_path, 開始行, 終了行))（file_path の順に並べる）
+ClonePair = tuple[tuple[str, int, int], tuple[str, int, int]]
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the clones found by the incremental detector with CCFinderSW run on the same tree. "
+            "Clone pairs are compared by file and line range; a pair counts as found when both of its "
+            "fragments overlap a pair reported by the other detector."
+        )
+    )
+    parser.add_argument(
+        "--dataset",
+        default=SELECTED_DATASET,
+        help="Dataset JSON path (default: config.SELECTED_DATASET).",
+    )
+    parser.add_argument(
+        "--only-url",
+        default=None,
+        help="Check only the project that matches this URL.",
+    )
+    parser.add_argument(
+        "--max-commits",
+        type=int,
+        default=5,
+        help="Number of analyzed commits to check per project, newest first (default: 5).",
+    )
+    parser.add_argument(
+        "--min-recall",
+        type=float,
+        default=0.9,
+        help="Minimum share of CCFinderSW clone pairs that the incremental detector must also find (default: 0.9).",
+    )
+    parser.add_argument(
+        "--min-precision",
+        type=float,
+        default=0.9,
+        help="Minimum share of incremental clone pairs that CCFinderSW must also find (default: 0.9).",
+    )
+    parser.add_argument(
+        "--check-cache",
+        action="store_true",
+        help="Also check that the incremental detector gives the same result with and without the token cache.",
+    )
+    return parser.parse_args()
+
+
+def clone_pairs(result: dict) -> set[ClonePair]:
+    """clones_json の形式の検出結果から、行単位のクローンペアを作る。"""
+    file_paths = {file_data["file_id"]: str(file_data["file_path"]) for file_data in result["file_data"]}
+    pairs = set()
+    for clone_set in result["clone_sets"]:
+        fragments = sorted(
+            (file_paths[fragment["file_id"]], fragment["start_line"], fragment["end_line"]) for fragment in clone_set["fragments"]
+        )
+        pairs.update(combinations(fragments, 2))
+    return pairs
+
+
+def _overlaps(a: tuple[str, int, int], b: tuple[str, int, int]) -> bool:
+    return a[1] <= b[2] and b[1] <= a[2]
+
+
+def found_pairs(pairs: set[ClonePair], reference: set[ClonePair]) -> int:
+    """pairs のうち、両方のフラグメントが reference のいずれかのペアと行範囲で重なるものの数。"""
+    by_files: dict[tuple[str, str], list[ClonePair]] = {}
+    for pair in reference:
+        by_files.setdefault((pair[0][0], pair[1][0]), []).append(pair)
+    found = 0
+    for pair in pairs:
+        candidates = by_files.get((pair[0][0], pair[1][0]), ())
+        if any(_overlaps(pair[0], other[0]) and _overlaps(pair[1], other[1]) for other in candidates):
+            found += 1
+    return found
+
+
+def _ratio(found: int, total: int) -> float:
+    return found / total if total else 1.0
+
+
+def detect_with_ccfindersw(workdir: Path, name: str, commit_hash: str, language: str, exts: tuple[str], prefixes) -> dict:
+    """コミットの対象言語のファイルをスナップショットに展開し、CCFinderSW で検出した結果を返す（file_path は workdir 基準）。"""
+    with snapshot.materialize(workdir, name, commit_hash, {language: exts}, {language: prefixes}) as (snapshot_dir, _duplicates):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_dest = Path(temp_dir) / f"{language}.json"
+            ccfindersw.detect_to_json(snapshot_dir, language, exts, Path(temp_dir) / language, json_dest, path_base=workdir)
+            with open(json_dest, "r") as f:
+                return json.load(f)
+
+
+def main() -> int:
+    args = _parse_args()
+    with open(args.dataset, "r") as f:
+        dataset = json.load(f)
+    if args.only_url:
+        dataset = [project for project in dataset if project.get("URL") == args.only_url]
+
+    mismatches = 0
+    for project in dataset:
+        url = project["URL"]
+        name = url.split("/")[-2] + "." + url.split("/")[-1]
+        workdir = project_root / "dest/projects" / name
+        analyzed_commits_path = project_root / "dest/analyzed_commits" / f"{name}.json"
+        if not workdir.exists() or not analyzed_commits_path.exists():
+            print(f"[skip] {name}: repository or analyzed commits not found")
+            continue
+        with open(analyzed_commits_path, "r") as f:
+            analyzed_commit_hashes = json.load(f)[: args.max_commits]
+        exts = get_exts(workdir)
+        for language in project["languages"]:
+            language_exts = exts.get(language, ())
+            prefixes = service_prefixes(project, language)
+            for commit_hash in analyzed_commit_hashes:
+                started = time.perf_counter()
+                incremental = incremental_detector.detect(workdir, commit_hash, language, language_exts, prefixes=prefixes)
+                incremental_elapsed = time.perf_counter() - started
+                started = time.perf_counter()
+                reference = detect_with_ccfindersw(workdir, name, commit_hash, language, language_exts, prefixes)
+                ccfindersw_elapsed = time.perf_counter() - started
+                incremental_pairs = clone_pairs(incremental)
+                reference_pairs = clone_pairs(reference)
+                recall = _ratio(found_pairs(reference_pairs, incremental_pairs), len(reference_pairs))
+                precision = _ratio(found_pairs(incremental_pairs, reference_pairs), len(incremental_pairs))
+                equal = recall >= args.min_recall and precision >= args.min_precision
+                if args.check_cache:
+                    equal = equal and incremental == incremental_detector.detect(
+                        workdir, commit_hash, language, language_exts, use_cache=False, prefixes=prefixes
+                    )
+                if not equal:
+                    mismatches += 1
+                print(
+                    f"{name} {language} {commit_hash[:10]} "
+                    f"files={len(incremental['file_data'])} pairs: ccfindersw={len(reference_pairs)} incremental={len(incremental_pairs)} "
+                    f"recall={recall:.3f} precision={precision:.3f} "
+                    f"incremental={incremental_elapsed:.2f}s ccfindersw={ccfindersw_elapsed:.2f}s "
+                    f"{'OK' if equal else 'MISMATCH'}"
+                )
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,12 @@
 import json
 import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterator
 
 import git
+import numpy as np
 
 def _find_repo_root(start: Path) -> Path:
     for parent in [start] + list(start.parents):
@@ -15,68 +19,147 @@ project_root = _find_repo_root(Path(__file__).resolve())
 sys.path.append(str(project_root))
 sys.path.append(str(project_root / "src"))
 from modules.util import FileMapper
+from modules.clone_columns import CloneColumns
+import modules.clone_store as clone_store
+import modules.moving_lines as moving_lines
+import modules.modified_clones as modified_clones
+import modules.artifact_store as artifact_store
+import modules.artifact_gc as artifact_gc
+from config import ANALYZE_CC_WORKERS, ANALYZE_UNTOUCHED_FILES_FAST_PATH, MODIFIED_CLONES_FORMAT
+
+
+NO_PARENT = -1
+
+
+class _LineFlags:
+    """1 ファイル分の行フラグ（添字が行番号のビットセット）とその累積和。"""
+
+    def __init__(self, ranges: list[list[int]]):
+        size = max((start + length for start, length in ranges), default=0)
+        self.flags = np.zeros(size, dtype=np.bool_)
+        for start, length in ranges:
+            self.flags[max(start, 0):start + length] = True
+        # prefix[i] は 0..i 行目のうちフラグが立っている行数
+        self.prefix = np.cumsum(self.flags, dtype=np.int32)
+
+    def any(self, first: int, last: int) -> bool:
+        first = max(first, 0)
+        last = min(last, len(self.flags) - 1)
+        if first > last:
+            return False
+        return int(self.prefix[last]) - (int(self.prefix[first - 1]) if first > 0 else 0) > 0
+
+    def at(self, lines: np.ndarray) -> np.ndarray:
+        inside = (lines >= 0) & (lines < len(self.flags))
+        result = np.zeros(len(lines), dtype=np.bool_)
+        result[inside] = self.flags[lines[inside]]
+        return result
+
+
+def _line_flags(hunks: list[dict], path_key: str, category: str) -> dict[str, _LineFlags]:
+    ranges_by_path: dict[str, list[list[int]]] = {}
+    for hunk in hunks:
+        if hunk.get(category):
+            ranges_by_path.setdefault(hunk.get(path_key), []).extend(hunk[category])
+    return {path: _LineFlags(ranges) for path, ranges in ranges_by_path.items()}
 
 
 class CorrespondedLines:
-    """行対応を提供するヘルパー。"""
+    """行対応を提供するヘルパー。
+
+    hunks は modules.moving_lines.load の形式（inserted / deleted / modified が [開始行, 行数] の区間）。
+    child のパスごとに、行番号を添字とする int32 の配列で対応する parent の行（対応なしは NO_PARENT）と、
+    対応する行数の累積和を持つ。追加・削除・変更行はパスごとのビットセットと累積和で持ち、
+    「[s, e] に変更があるか」「[s, e] のうち parent に対応する行数」を O(1) で求める。
+    """
 
     def __init__(self, hunks: list[dict], child_filemap: FileMapper, parent_filemap: FileMapper):
         self.corresponded_lines = self._correspond_lines(hunks, child_filemap, parent_filemap)
+        self.parent_lines: dict[str, np.ndarray] = {}
+        self.mapped_prefix: dict[str, np.ndarray] = {}
+        for child_path, segments in self.corresponded_lines.items():
+            # 区間は child の 1 行目からファイルの最終行までを覆っている
+            loc = segments[-1][1] if segments else 0
+            parent_lines = np.full(loc + 1, NO_PARENT, dtype=np.int32)
+            for start, end, parent_start in segments:
+                if parent_start is not None:
+                    parent_lines[start:end + 1] = np.arange(parent_start, parent_start + end - start + 1, dtype=np.int32)
+            self.parent_lines[child_path] = parent_lines
+            self.mapped_prefix[child_path] = np.cumsum(parent_lines != NO_PARENT, dtype=np.int32)
+        # 差分に現れるパス。それ以外のファイルでは parent の行 = child の行で、追加・削除・変更行もない
+        self.touched_paths = {hunk.get(key) for hunk in hunks for key in ("child_path", "parent_path")}
+        self.deleted = _line_flags(hunks, "parent_path", "deleted")
+        self.inserted = _line_flags(hunks, "child_path", "inserted")
+        self.modified = _line_flags(hunks, "child_path", "modified")
         self.hunks = hunks
-    
+
     def get_parent_line(self, child_path: str, child_line: int):
-        if child_path not in self.corresponded_lines.keys():
-            return child_line
-        if child_line not in self.corresponded_lines[child_path].keys():
+        parent_lines = self.parent_lines.get(child_path)
+        if parent_lines is None or not 1 <= child_line < len(parent_lines):
             return child_line
-        return self.corresponded_lines[child_path][child_line]
-    
+        parent_line = int(parent_lines[child_line])
+        return None if parent_line == NO_PARENT else parent_line
+
+    def get_parent_lines(self, child_path: str, child_start_line: int, child_end_line: int) -> np.ndarray:
+        """child の [開始行, 終了行] の各行に対応する parent の行（対応なしは NO_PARENT）の配列。"""
+        result = np.arange(child_start_line, child_end_line + 1, dtype=np.int32)
+        parent_lines = self.parent_lines.get(child_path)
+        if parent_lines is None:
+            return result
+        first = max(child_start_line, 1)
+        last = min(child_end_line, len(parent_lines) - 1)
+        if first <= last:
+            result[first - child_start_line:last - child_start_line + 1] = parent_lines[first:last + 1]
+        return result
+
+    def is_path_touched(self, path: str) -> bool:
+        return path in self.touched_paths
+
     def is_file_having_moved_lines(self, child_path):
-        if child_path not in self.corresponded_lines.keys():
-            return False
-        if len(self.corresponded_lines[child_path].keys()) == 0:
-            return False
-        return True
-    
+        return len(self.corresponded_lines.get(child_path, ())) > 0
+
     def is_line_deleted(self, parent_path: str, parent_line: int):
-        for diff in self.hunks:
-            if diff["parent_path"] != parent_path:
-                continue
-            if parent_line in diff["deleted_lines"]:
-                return True
-        return False
-    
+        return self.any_deleted(parent_path, parent_line, parent_line)
+
     def is_line_added(self, child_path: str, child_line: int):
-        for diff in self.hunks:
-            if diff["child_path"] != child_path:
-                continue
-            if child_line in diff["inserted_lines"]:
-                return True
-        return False
-    
+        return self.any_added(child_path, child_line, child_line)
+
     def is_line_modified(self, path: str, line: int):
-        for diff in self.hunks:
-            if diff["child_path"] != path:
-                continue
-            if line in diff["modified_lines"]:
-                return True
-        return False
-    
+        return self.any_modified(path, line, line)
+
+    def any_deleted(self, parent_path: str, start_line: int, end_line: int) -> bool:
+        flags = self.deleted.get(parent_path)
+        return flags is not None and flags.any(start_line, end_line)
+
+    def any_added(self, child_path: str, start_line: int, end_line: int) -> bool:
+        flags = self.inserted.get(child_path)
+        return flags is not None and flags.any(start_line, end_line)
+
+    def any_modified(self, child_path: str, start_line: int, end_line: int) -> bool:
+        flags = self.modified.get(child_path)
+        return flags is not None and flags.any(start_line, end_line)
+
+    def deleted_at(self, parent_path: str, parent_lines: np.ndarray) -> np.ndarray:
+        """parent の各行が削除されたかどうかの配列。"""
+        flags = self.deleted.get(parent_path)
+        if flags is None:
+            return np.zeros(len(parent_lines), dtype=np.bool_)
+        return flags.at(parent_lines)
+
     def get_fragment_loc_of_parent(self, child_path: str, child_start_line: int, child_end_line: int):
-        if child_path not in self.corresponded_lines.keys():
+        mapped_prefix = self.mapped_prefix.get(child_path)
+        if mapped_prefix is None:
             return child_end_line - child_start_line + 1
-        loc = 0
-        for l in range(child_start_line, child_end_line+1):
-            if l not in self.corresponded_lines[child_path].keys():
-                continue
-            if self.corresponded_lines[child_path][l] is not None:
-                loc += 1
-        return loc
+        first = max(child_start_line, 1)
+        last = min(child_end_line, len(mapped_prefix) - 1)
+        if first > last:
+            return 0
+        return int(mapped_prefix[last] - mapped_prefix[first - 1])
 
     def _correspond_lines(self, hunks: list[dict], child_filemap: FileMapper, parent_filemap: FileMapper):
         result = {}
         # 1) ファイル単位に hunk 情報を集約（重複・隣接・順序に依存しないため）
-        by_file: dict[tuple[str, str], dict[str, set[int]]] = {}
+        by_file: dict[tuple[str, str], dict[str, list[list[int]]]] = {}
         for h in hunks:
             cpath = h.get("child_path")
             ppath = h.get("parent_path")
@@ -85,15 +168,12 @@ class CorrespondedLines:
             # リネームは考慮しないので child==parent のものだけ
             if cpath != ppath:
                 continue
-
-            ins = set(int(x) for x in h.get("inserted_lines", []) if isinstance(x, int) or str(x).isdigit())
-            dele = set(int(x) for x in h.get("deleted_lines", []) if isinstance(x, int) or str(x).isdigit())
             key = (cpath, ppath)
-            agg = by_file.setdefault(key, {"inserted": set(), "deleted": set()})
-            agg["inserted"].update(ins)
-            agg["deleted"].update(dele)
+            agg = by_file.setdefault(key, {"inserted": [], "deleted": []})
+            agg["inserted"].extend(h.get("inserted", []))
+            agg["deleted"].extend(h.get("deleted", []))
 
-        # 2) 各ファイルについて二本ポインタで child→parent 対応を構築
+        # 2) 各ファイルについて、child の挿入行以外の区間と parent の削除行以外の区間を先頭から順に対応付ける
         for (child_path, parent_path), diff in by_file.items():
             child_file_loc = child_filemap.get_file_loc(child_path)
             if child_file_loc == -1:
@@ -102,145 +182,198 @@ class CorrespondedLines:
             if parent_file_loc == -1:
                 continue
 
-            inserted = {x for x in diff["inserted"] if 1 <= x <= child_file_loc}
-            deleted = {x for x in diff["deleted"] if 1 <= x <= parent_file_loc}
-
-            lines: dict[int, int | None] = {}
-            i, j = 1, 1  # i: child 行, j: parent 行 (どちらも1始まり)
-
-            while i <= child_file_loc:
-                # child 側にのみ存在する行（挿入行）は None を割り当て
-                if i in inserted:
-                    lines[i] = None
-                    i += 1
+            inserted = moving_lines.clip(moving_lines.normalize_ranges(diff["inserted"]), 1, child_file_loc)
+            deleted = moving_lines.clip(moving_lines.normalize_ranges(diff["deleted"]), 1, parent_file_loc)
+            # child 側にのみ存在する行（挿入行）は対応なし
+            child_ranges = [(start, length, True) for start, length in inserted]
+            child_ranges += [(start, length, False) for start, length in moving_lines.complement(inserted, 1, child_file_loc)]
+            child_ranges.sort()
+            # parent 側で削除された行は飛ばす
+            parent_ranges = moving_lines.complement(deleted, 1, parent_file_loc)
+
+            segments: list[tuple[int, int, int | None]] = []
+            parent_index = 0
+            parent_offset = 0
+            for start, length, is_inserted in child_ranges:
+                if is_inserted:
+                    segments.append((start, start + length - 1, None))
                     continue
-
-                # parent 側で削除された行は j をスキップ（連続削除にも対応）
-                while j <= parent_file_loc and j in deleted:
-                    j += 1
-
-                if j <= parent_file_loc:
-                    # 対応あり
-                    lines[i] = j
-                    i += 1
-                    j += 1
-                else:
-                    # parent 側が尽きた: 以降の child 行は対応なし
-                    lines[i] = None
-                    i += 1
-            result[child_path] = lines
+                while length > 0:
+                    if parent_index >= len(parent_ranges):
+                        # parent 側が尽きた: 以降の child 行は対応なし
+                        segments.append((start, start + length - 1, None))
+                        break
+                    parent_start, parent_length = parent_ranges[parent_index]
+                    size = min(length, parent_length - parent_offset)
+                    segments.append((start, start + size - 1, parent_start + parent_offset))
+                    start += size
+                    length -= size
+                    parent_offset += size
+                    if parent_offset == parent_length:
+                        parent_index += 1
+                        parent_offset = 0
+            result[child_path] = segments
         return result
 
 
-def get_clone_map(clonesets: list[dict], filemap: FileMapper) -> dict[str, list[dict]]:
-    """ファイルパスごとにクローンフラグメントを束ねたマップを返す。"""
-    clone_map: dict[str, list[dict]] = {}
-    for clone_set in clonesets:
-        for index, fragment in enumerate(clone_set["fragments"]):
-            fragment_path = filemap.get_file_path(fragment["file_id"])
-            clone_map.setdefault(fragment_path, []).append({
-                "clone_id": clone_set["clone_id"],
-                "index": index,
-                "file_id": fragment["file_id"],
-                "start_line": fragment["start_line"],
-                "end_line": fragment["end_line"],
-            })
+class FragmentIndex:
+    """1 ファイルの親フラグメントの区間索引。
+
+    rows はそのファイルのフラグメントの（CloneColumns での）位置を元の順序で並べたもの。
+    開始行でソートした配列を二分探索し、行の範囲 [first, last] に重なるフラグメントの位置を元の順序で返す。
+    重なるフラグメントの開始行は first - (最長のフラグメントの行数) + 1 以上なので、その範囲だけを調べる。
+    """
+
+    def __init__(self, fragments: CloneColumns, rows: np.ndarray):
+        self.rows = rows
+        self.unsorted_starts = fragments.start_line[rows].astype(np.int64)
+        self.unsorted_ends = fragments.end_line[rows].astype(np.int64)
+        self.order = np.argsort(self.unsorted_starts, kind="stable")
+        self.starts = self.unsorted_starts[self.order]
+        self.ends = self.unsorted_ends[self.order]
+        self.max_length = max(1, int((self.ends - self.starts).max()) + 1) if len(rows) else 1
+
+    def _overlapping_positions(self, first: int, last: int) -> np.ndarray:
+        low = int(np.searchsorted(self.starts, first - self.max_length + 1, side="left"))
+        high = int(np.searchsorted(self.starts, last, side="right"))
+        hits = self.order[low:high][self.ends[low:high] >= first]
+        hits.sort()
+        return hits
+
+    def overlapping(self, first: int, last: int) -> np.ndarray:
+        return self.rows[self._overlapping_positions(first, last)]
+
+    def match_unchanged(self, start_line: int, end_line: int) -> int | None:
+        """差分のないファイル（親行 = 子行）の子フラグメント [start_line, end_line] に対応する親フラグメントの位置を返す。
+
+        このとき correspond_code_fragments の条件を満たすのは、範囲が一致するか、入れ子（一方が他方を含む）の
+        親フラグメントだけになる。範囲が一致するものも入れ子の条件を満たすので、重なるフラグメントのうち
+        最初に入れ子の条件を満たすものを採る（最初に条件を満たすものを採るのは通常の経路と同じ）。
+        """
+        positions = self._overlapping_positions(start_line, end_line)
+        ps = self.unsorted_starts[positions]
+        pe = self.unsorted_ends[positions]
+        nested = np.flatnonzero((ps <= pe) & (((start_line <= ps) & (pe <= end_line)) | ((ps <= start_line) & (end_line <= pe))))
+        if len(nested) == 0:
+            return None
+        return int(self.rows[positions[nested[0]]])
+
+
+def get_clone_map(fragments: CloneColumns, filemap: FileMapper) -> dict[str, np.ndarray]:
+    """ファイルパスごとに、そのファイルのクローンフラグメントの位置を元の順序で並べた配列を返す。"""
+    clone_map: dict[str, np.ndarray] = {}
+    if len(fragments) == 0:
+        return clone_map
+    order = np.argsort(fragments.file_id, kind="stable")
+    file_ids = fragments.file_id[order]
+    for rows in np.split(order, np.flatnonzero(np.diff(file_ids)) + 1):
+        fragment_path = filemap.get_file_path(int(fragments.file_id[rows[0]]))
+        if fragment_path in clone_map:
+            rows = np.sort(np.concatenate((clone_map[fragment_path], rows)))
+        clone_map[fragment_path] = rows
     return clone_map
 
 
-def correspond_code_fragments(corresponded_lines: CorrespondedLines, child_clonesets: list[dict], parent_clonesets: list[dict], child_filemap: FileMapper, parent_filemap: FileMapper):
-    """子クローンフラグメントと親フラグメントの対応を決定する。"""
+def correspond_code_fragments(corresponded_lines: CorrespondedLines, child_fragments: CloneColumns, parent_fragments: CloneColumns, child_filemap: FileMapper, parent_filemap: FileMapper, use_index: bool = True,
+                              parent_clone_map: dict[str, np.ndarray] | None = None, parent_indexes: dict[str, "FragmentIndex"] | None = None,
+                              child_clone_map: dict[str, np.ndarray] | None = None, match_untouched: bool = ANALYZE_UNTOUCHED_FILES_FAST_PATH):
+    """子クローンフラグメントと親フラグメントの対応を決定する。
+
+    フラグメントは列（CloneColumns）のまま、ファイルごとにまとめて調べる。
+    use_index の場合、親フラグメントはファイルごとの区間索引から、子フラグメントの行が写る親行の範囲に重なるものだけを
+    元の順序で調べる（範囲に重ならない親フラグメントはどの条件でも対応しないので、結果は全件を調べた場合と同じ）。
+    match_untouched（省略時は ANALYZE_UNTOUCHED_FILES_FAST_PATH）の場合、差分に現れないファイルの子フラグメントは、
+    行対応をたどらず FragmentIndex.match_unchanged で対応を決める。
+    use_index=False ではどちらも使わず、全件を線形に調べる。
+    parent_clone_map / child_clone_map / parent_indexes にスナップショットで作成済みのものを渡すと、
+    それを使い（索引は必要に応じて追加し）、作り直さない。
+    """
     corresponded_fragments = {}
     
-    # 親側のフラグメントを path ごとにまとめる
-    parent_clone_map = get_clone_map(parent_clonesets, parent_filemap)
-    # 例: { "path/to/file": [ {clone_id, index, start_line, end_line}, ... ] }
-    
-    for child_clone_set in child_clonesets:
-        child_clone_id = child_clone_set["clone_id"]
-    
-        for index, child_fragment in enumerate(child_clone_set["fragments"]):
-            child_path = child_filemap.get_file_path(child_fragment["file_id"])
-            parent_path = child_path  # リネームは考慮しない仕様
-            c_start = child_fragment["start_line"]
-            c_end   = child_fragment["end_line"]
+    # 親側・子側のフラグメントの位置を path ごとにまとめる
+    if parent_clone_map is None:
+        parent_clone_map = get_clone_map(parent_fragments, parent_filemap)
+    if child_clone_map is None:
+        child_clone_map = get_clone_map(child_fragments, child_filemap)
+    # 例: { "path/to/file": array([フラグメントの位置, ...]) }
+    if parent_indexes is None:
+        parent_indexes = {}
     
+    for child_path, child_rows in child_clone_map.items():
+        parent_path = child_path  # リネームは考慮しない仕様
+        child_keys = zip(child_fragments.clone_id[child_rows].tolist(), child_fragments.index[child_rows].tolist())
+
+        # 親に同一パスのクローンが無いなら確実に新規
+        parent_rows = parent_clone_map.get(parent_path)
+        if parent_rows is None:
+            for child_clone_id, index in child_keys:
+                corresponded_fragments.setdefault(child_clone_id, {})[index] = None
+            continue
+        if use_index and parent_path not in parent_indexes:
+            parent_indexes[parent_path] = FragmentIndex(parent_fragments, parent_rows)
+        # 差分のないファイルは行対応をたどらず、範囲の一致（と入れ子）だけで対応を決める
+        untouched = use_index and match_untouched and not corresponded_lines.is_path_touched(child_path)
+        child_ranges = zip(child_fragments.start_line[child_rows].tolist(), child_fragments.end_line[child_rows].tolist())
+
+        for (child_clone_id, index), (c_start, c_end) in zip(child_keys, child_ranges):
             # デフォルトは None（対応なし / 新規）
             mapped: tuple[int, int] | None = None
 
-            # 親に同一パスのクローンが無いなら確実に新規
-            parent_frags = parent_clone_map.get(parent_path)
-            if not parent_frags:
-                corresponded_fragments.setdefault(child_clone_id, {})[index] = None
+            if untouched and c_start <= c_end:
+                row = parent_indexes[parent_path].match_unchanged(c_start, c_end)
+                corresponded_fragments.setdefault(child_clone_id, {})[index] = None if row is None else parent_fragments.key(row)
                 continue
         
-            # 事前計算：端点の親行、親側での生存行数（= 対応する親行の個数）
-            p_start_pred = corresponded_lines.get_parent_line(child_path, c_start)
-            p_end_pred   = corresponded_lines.get_parent_line(child_path, c_end)
             # 子フラグメント内の「親行に写る行」の個数（0なら新規扱い）
             parent_loc_in_child_frag = corresponded_lines.get_fragment_loc_of_parent(child_path, c_start, c_end)
             if parent_loc_in_child_frag == 0:
                 corresponded_fragments.setdefault(child_clone_id, {})[index] = None
                 continue
 
-             # 子→親・親→子の対応テーブルを一度だけ構築（子フラグメント範囲内）
-            # child2parent: {child_line -> parent_line or None}
-            # parent2child: {parent_line -> [child_line, ...]}
-            child2parent = {}
-            parent2child = {}
-            for cl in range(c_start, c_end + 1):
-                pl = corresponded_lines.get_parent_line(child_path, cl)
-                child2parent[cl] = pl
-                if pl is not None:
-                    parent2child.setdefault(pl, []).append(cl)
+            # 端点の親行
+            p_start_pred = corresponded_lines.get_parent_line(child_path, c_start)
+            p_end_pred = corresponded_lines.get_parent_line(child_path, c_end)
+            # 子フラグメントの各行に対応する親行（対応なしは NO_PARENT）を一度だけ求める
+            # child_parents[i] は子の c_start + i 行目に対応する親行
+            child_parents = corresponded_lines.get_parent_lines(child_path, c_start, c_end)
+            c_len = c_end - c_start + 1
+
+            # 親候補は、子フラグメントの行が写る親行の範囲 [最小, 最大] に重なるものだけ
+            candidates = parent_rows
+            if use_index and len(child_parents) > 0:
+                mapped_parents = child_parents[child_parents != NO_PARENT]
+                candidates = parent_indexes[parent_path].overlapping(int(mapped_parents.min()), int(mapped_parents.max()))
 
             # 親候補を順にチェック
-            for pfrag in parent_frags:
-                ps, pe = pfrag["start_line"], pfrag["end_line"]
-
+            for prow, ps, pe in zip(
+                candidates.tolist(), parent_fragments.start_line[candidates].tolist(), parent_fragments.end_line[candidates].tolist()
+            ):
                 # 1) 完全一致（境界一致）: 子端点が親端点に写っている
                 if p_start_pred == ps and p_end_pred == pe:
-                    mapped = (pfrag["clone_id"], pfrag["index"])
+                    mapped = parent_fragments.key(prow)
                     break
 
-                c_len = c_end - c_start + 1
                 p_len = pe - ps + 1
 
                 # 2) 子のほうが長い（= 子に挿入がある）
-                #    親端点が子フラグメント内に連続して含まれているか（先頭/末尾の挿入を許容）
+                #    親の開始/終了端点に対応する子行が子フラグメント内にあり、親端点の順序が保たれるか（先頭/末尾の挿入を許容）
                 if p_len < c_len:
-                    # 子の範囲内で、親の開始/終了端点に対応する子行が存在するか
-                    #   - 端点が複数行に写ることは普通ないが、防御的に min/max を見る
-                    c_for_ps = parent2child.get(ps, [])
-                    c_for_pe = parent2child.get(pe, [])
-                    if c_for_ps and c_for_pe:
-                        # 端点がそれぞれ子範囲の内側にあり、親端点の順序が保たれる
-                        if min(c_for_ps) >= c_start and max(c_for_pe) <= c_end and min(c_for_ps) <= max(c_for_pe):
-                            mapped = (pfrag["clone_id"], pfrag["index"])
-                            break
+                    c_for_ps = np.flatnonzero(child_parents == ps)
+                    c_for_pe = np.flatnonzero(child_parents == pe)
+                    if len(c_for_ps) > 0 and len(c_for_pe) > 0 and c_for_ps[0] <= c_for_pe[-1]:
+                        mapped = parent_fragments.key(prow)
+                        break
                     # 見つからなければ次候補へ
                     continue
 
                 # 3) 親のほうが長い（= 親端での削除）
-                #    親フラグメント内の「削除されていない親行」たちが、子フラグメントの端点に写っているか
+                #    親フラグメント内の「削除されていない親行」に写る子行が、子フラグメントの両端まで広がっているか
                 if p_len > c_len:
-                    # 親側の範囲 ps..pe のうち削除されていない親行を、子フラグメント内で探す
-                    # 最初に子へ写る親行 → 子側の最小行
-                    c_candidates = []
-                    # 端点限定でもよいが、削除がまとまっている場合に備えて全域を見る
-                    for pl in range(ps, pe + 1):
-                        if corresponded_lines.is_line_deleted(parent_path, pl):
-                            continue
-                        # この親行 pl に対応する子行（子フラグメント内）を取り出す
-                        clist = parent2child.get(pl, [])
-                        c_candidates.extend(clist)
-
-                    if c_candidates:
-                        c_min = min(c_candidates)
-                        c_max = max(c_candidates)
-                        if c_min == c_start and c_max == c_end:
-                            mapped = (pfrag["clone_id"], pfrag["index"])
-                            break
+                    in_parent_frag = (child_parents >= ps) & (child_parents <= pe)
+                    c_candidates = np.flatnonzero(in_parent_frag & ~corresponded_lines.deleted_at(parent_path, child_parents))
+                    if len(c_candidates) > 0 and c_candidates[0] == 0 and c_candidates[-1] == c_len - 1:
+                        mapped = parent_fragments.key(prow)
+                        break
                     # 見つからなければ次候補へ
                     continue
 
@@ -257,12 +390,13 @@ def correspond_code_fragments(corresponded_lines: CorrespondedLines, child_clone
 def correspond_clonesets(
     corresponded_fragments: dict,
     corresponded_lines: CorrespondedLines,
-    child_clonesets: list[dict],
-    parent_clonesets: list[dict],
+    child_fragments: CloneColumns,
+    parent_fragments: CloneColumns,
     child_filemap: FileMapper,
-    parent_filemap: FileMapper
+    parent_filemap: FileMapper,
+    match_untouched: bool = ANALYZE_UNTOUCHED_FILES_FAST_PATH,
 ):
-    """クローンセット間の差分をまとめて返す。"""
+    """クローンセット間の差分をまとめて返す。match_untouched なら差分のないファイル同士の組は行を調べずに stable とする。"""
     """
     出力: modified_clones = [
       {
@@ -279,21 +413,24 @@ def correspond_clonesets(
     """
     modified_clones = []
 
-    # 1) parent clone_id -> クローンセット辞書
-    parent_set_by_id = {cs["clone_id"]: cs for cs in parent_clonesets}
+    # 1) parent clone_id -> クローンセットの位置
+    parent_position_by_id = {clone_id: position for position, clone_id in enumerate(parent_fragments.clone_ids)}
+    parent_offsets = parent_fragments.offsets
 
-    for child_set in child_clonesets:
-        child_clone_id = child_set["clone_id"]
+    for position, child_clone_id in enumerate(child_fragments.clone_ids):
         out_fragments = []
 
         # child セットに対応マップが無くても、各フラグメントを個別に added 扱いできる
         child_map = corresponded_fragments.get(child_clone_id, {})
 
-        for index, child_frag in enumerate(child_set["fragments"]):
-            child_file_id = child_frag["file_id"]
+        first, last = child_fragments.offsets[position], child_fragments.offsets[position + 1]
+        child_columns = zip(
+            child_fragments.file_id[first:last].tolist(),
+            child_fragments.start_line[first:last].tolist(),
+            child_fragments.end_line[first:last].tolist(),
+        )
+        for index, (child_file_id, c_start, c_end) in enumerate(child_columns):
             child_path = child_filemap.get_file_path(child_file_id)
-            c_start = child_frag["start_line"]
-            c_end   = child_frag["end_line"]
 
             mapping = child_map.get(index)  # None or (parent_clone_id, parent_fragment_index)
             if mapping is None:
@@ -315,8 +452,10 @@ def correspond_clonesets(
             parent_clone_id, parent_frag_index = mapping
 
             # 2) parent クローンセットを安全に参照
-            pset = parent_set_by_id.get(parent_clone_id)
-            if pset is None or not (0 <= parent_frag_index < len(pset["fragments"])):
+            parent_position = parent_position_by_id.get(parent_clone_id)
+            if parent_position is None or not (
+                0 <= parent_frag_index < parent_offsets[parent_position + 1] - parent_offsets[parent_position]
+            ):
                 # 想定外（インデックス不整合）の場合は added 扱いに逃がす
                 out_fragments.append({
                     "type": "added",
@@ -332,36 +471,23 @@ def correspond_clonesets(
                 })
                 continue
 
-            parent_frag = pset["fragments"][parent_frag_index]
-            parent_file_id = parent_frag["file_id"]
+            parent_row = parent_offsets[parent_position] + parent_frag_index
+            parent_file_id = int(parent_fragments.file_id[parent_row])
             parent_path = parent_filemap.get_file_path(parent_file_id)
-            p_start = parent_frag["start_line"]
-            p_end   = parent_frag["end_line"]
+            p_start = int(parent_fragments.start_line[parent_row])
+            p_end   = int(parent_fragments.end_line[parent_row])
 
             # 3) 変更有無の判定
-            # いずれか一方でも変化があれば "modified" とするのが自然
-            parent_deleted = False
-            parent_modified = False
-            for l in range(p_start, p_end + 1):
-                # 削除判定を先に見るとわかりやすい（削除は強いシグナル）
-                if corresponded_lines.is_line_deleted(parent_path, l):
-                    parent_deleted = True
-                    break
-                if corresponded_lines.is_line_modified(parent_path, l):
-                    parent_modified = True
-                    break
-
-            child_added = False
-            child_modified = False
-            for l in range(c_start, c_end + 1):
-                if corresponded_lines.is_line_added(child_path, l):
-                    child_added = True
-                    break
-                if corresponded_lines.is_line_modified(child_path, l):
-                    child_modified = True
-                    break
-
-            is_modified = parent_deleted or parent_modified or child_added or child_modified
+            # いずれか一方でも変化（親の削除・変更、子の追加・変更）があれば "modified" とするのが自然
+            # 差分のないファイル同士なら行を調べるまでもなく stable
+            is_modified = (
+                not match_untouched or corresponded_lines.is_path_touched(child_path) or corresponded_lines.is_path_touched(parent_path)
+            ) and (
+                corresponded_lines.any_deleted(parent_path, p_start, p_end)
+                or corresponded_lines.any_modified(parent_path, p_start, p_end)
+                or corresponded_lines.any_added(child_path, c_start, c_end)
+                or corresponded_lines.any_modified(child_path, c_start, c_end)
+            )
 
             frag_record = {
                 "parent": {
@@ -397,66 +523,167 @@ def correspond_clonesets(
 
 def analyze_commit(name: str, language: str, commit: git.Commit, prev: git.Commit) -> bool:
     """単一コミット間でクローン差分を算出し保存する。"""
-    workdir = project_root / "dest/projects" / name
     print(f"{commit.hexsha}-{prev.hexsha}")
-    # childのCCFinderSWファイルの読み込み
-    child_ccfsw_file = project_root / "dest/clones_json" / name / prev.hexsha / f"{language}.json"
-    with open(child_ccfsw_file, "r") as f:
-        child_ccfsw = json.load(f)
-    child_filemap = FileMapper(child_ccfsw["file_data"], str(workdir))
-
-    # parentのCCFinderSWファイルの読み込み
-    parent_ccfsw_file = project_root / "dest/clones_json" / name / commit.hexsha / f"{language}.json"
-    with open(parent_ccfsw_file, "r") as f:
-        parent_ccfsw = json.load(f)
-    parent_filemap = FileMapper(parent_ccfsw["file_data"], str(workdir))
+    return analyze_commit_pair(name, language, commit.hexsha, prev.hexsha)
+
+
+def compute_commit_pair(name: str, language: str, commit_hash: str, prev_hash: str) -> list[dict] | None:
+    """コミット commit_hash（親）と prev_hash（子）の間のクローン差分（correspond_clonesets の結果）を算出する。
+
+    対象言語のファイルやクローン検出の対象ファイルに変更がなく、算出しない組は None を返す。
+    読むのは 2 つの clones_json と moving_lines だけなので、組ごとに別のプロセスで実行できる。
+    """
+    # 対象言語のファイルが変わっていなければクローンも変わらない
+    if clone_store.is_language_unchanged(name, commit_hash, prev_hash, language):
+        return None
+    # child / parent の clones_json の読み込み（隣の組や他のステップと解析結果を共有する）
+    child = clone_store.load_snapshot(name, prev_hash, language)
+    parent = clone_store.load_snapshot(name, commit_hash, language)
+    child_filemap = child.filemap
+    parent_filemap = parent.filemap
     # コミット間のLineDiffファイルの読み込み
-    line_diff_file = project_root / "dest/moving_lines" / name / f"{commit.hexsha}-{prev.hexsha}.json"
-    if not line_diff_file.exists():
-        return False
-    with open(line_diff_file, "r") as f:
-        hunks = json.load(f)
+    line_diff_file = project_root / "dest/moving_lines" / name / f"{commit_hash}-{prev_hash}.json"
+    if not artifact_store.exists(line_diff_file):
+        return None
+    hunks = moving_lines.load(line_diff_file)
     # 修正がなければこのコミットの処理は終了
     if len(hunks) == 0:
-        return False
+        return None
     # CCFinderSWの対象ファイルに修正がなければ終了
     for hunk in hunks:
         if (child_filemap.get_file_loc(hunk["child_path"]) != -1) and (parent_filemap.get_file_loc(hunk["parent_path"]) != -1):
             break
     else:
-        return False
+        return None
     # 親コミットのファイルと子コミットのファイルの行を対応付ける．
     corresponded_lines = CorrespondedLines(hunks, child_filemap, parent_filemap)
-    corresponded_fragments = correspond_code_fragments(corresponded_lines, child_ccfsw["clone_sets"], parent_ccfsw["clone_sets"], child_filemap, parent_filemap)
+    # パスごとのフラグメントの位置は、隣の組で同じスナップショットを子・親として使う場合も共有する
+    build_clone_map = lambda snapshot: get_clone_map(snapshot.fragments, snapshot.filemap)
+    corresponded_fragments = correspond_code_fragments(
+        corresponded_lines, child.fragments, parent.fragments, child_filemap, parent_filemap,
+        parent_clone_map=parent.derived("clone_map", build_clone_map),
+        parent_indexes=parent.derived("fragment_indexes", lambda snapshot: {}),
+        child_clone_map=child.derived("clone_map", build_clone_map),
+    )
 
     # 修正を特定
-    modified_clones = correspond_clonesets(corresponded_fragments, corresponded_lines, child_ccfsw["clone_sets"], parent_ccfsw["clone_sets"], child_filemap, parent_filemap)
+    return correspond_clonesets(corresponded_fragments, corresponded_lines, child.fragments, parent.fragments, child_filemap, parent_filemap)
 
-    # 保存
-    dest_dir = project_root / "dest/modified_clones" / name / f"{commit.hexsha}-{prev.hexsha}"
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    with open(dest_dir / f"{language}.json", "w") as f:
-        json.dump(modified_clones, f, indent=4)
-    
-    # 成功
+
+def _write_commit_pair(name: str, language: str, commit_hash: str, prev_hash: str, cloneset_changes: list[dict]) -> None:
+    # MODIFIED_CLONES_FORMAT が "compact" なら対応と変更だけを整数の配列で持つ形式
+    dest_file = project_root / "dest/modified_clones" / name / f"{commit_hash}-{prev_hash}" / f"{language}.json"
+    modified_clones.write(cloneset_changes, dest_file, compact=MODIFIED_CLONES_FORMAT == "compact")
+
+
+def analyze_commit_pair(name: str, language: str, commit_hash: str, prev_hash: str) -> bool:
+    """コミット commit_hash（親）と prev_hash（子）の間でクローン差分を算出し、modified_clones に保存する。
+
+    書き出すのはこの組の modified_clones だけなので、組ごとに別のプロセスで実行できる。
+    """
+    cloneset_changes = compute_commit_pair(name, language, commit_hash, prev_hash)
+    if cloneset_changes is None:
+        return False
+    _write_commit_pair(name, language, commit_hash, prev_hash, cloneset_changes)
     return True
-        
 
-def analyze_repo(project: dict):
-    """対象リポジトリの全対象コミットに対してクローン差分分析を行う。"""
+
+class AnalyzeCCError(RuntimeError):
+    """一部の (言語, コミットの組) でクローン差分の算出に失敗した。"""
+
+    @classmethod
+    def from_failures(cls, name: str, failures: list[tuple[str, str, str]]) -> "AnalyzeCCError":
+        """失敗した (言語, 親コミット, 子コミット) の一覧からエラーを作る。"""
+        return cls(
+            f"{name}: {len(failures)} 組のクローン差分の算出に失敗しました（"
+            + ", ".join(f"{language} {commit_hash}-{prev_hash}" for language, commit_hash, prev_hash in failures[:5])
+            + ("，..." if len(failures) > 5 else "")
+            + "）．"
+        )
+
+
+def _analyze_pair_isolated(task: tuple[str, str, str, str]) -> tuple[bool | None, str | None]:
+    """analyze_commit_pair を実行し、(結果, 失敗した場合のトレースバック) を返す。ワーカープロセスで実行する。"""
+    try:
+        return analyze_commit_pair(*task), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _compute_pair_isolated(task: tuple[str, str, str, str, bool]) -> tuple[dict | None, str | None]:
+    """compute_commit_pair を実行し、(modified_clones の compact 形式の内容, 失敗した場合のトレースバック) を返す。
+
+    dump が真なら modified_clones にも保存する。ワーカープロセスで実行し、結果は小さい compact 形式で親プロセスに返す。
+    """
+    name, language, commit_hash, prev_hash, dump = task
+    try:
+        cloneset_changes = compute_commit_pair(name, language, commit_hash, prev_hash)
+        if cloneset_changes is None:
+            return None, None
+        if dump:
+            _write_commit_pair(name, language, commit_hash, prev_hash, cloneset_changes)
+        return modified_clones.encode(cloneset_changes), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _pair_tasks(project: dict) -> tuple[str, list[tuple[str, str, str, str]]]:
+    """プロジェクト名と、(name, language, 親コミット, 子コミット) を言語・コミットの順に並べたリストを返す。"""
     url = project["URL"]
     name = url.split("/")[-2] + "." + url.split("/")[-1]
     languages = project["languages"].keys()
-    workdir = project_root / "dest/projects" / name
-    git_repo = git.Repo(workdir)
+    artifact_gc.ensure_available(name, "moving_lines", "collect")
     with open(project_root / "dest/analyzed_commits" / f"{name}.json", "r") as f:
         analyzed_commit_hashes = json.load(f)
-    head_commit = git_repo.commit(analyzed_commit_hashes[0])
-    for language in languages:
-        prev = head_commit
-        for commit_hash in analyzed_commit_hashes:
-            if commit_hash == head_commit.hexsha:
-                continue
-            commit = git_repo.commit(commit_hash)
-            analyze_commit(name, language, commit, prev)
-            prev = commit
+    # analyzed_commits は新しい順なので、隣り合う前者が子
+    tasks = [
+        (name, language, commit_hash, prev_hash)
+        for language in languages
+        for prev_hash, commit_hash in zip(analyzed_commit_hashes, analyzed_commit_hashes[1:])
+    ]
+    return name, tasks
+
+
+def _map_pairs(func: Callable, tasks: list[tuple], workers: int | None) -> Iterator:
+    """tasks の順に func の結果を返す。workers（省略時は ANALYZE_CC_WORKERS）が 2 以上なら ProcessPoolExecutor で並列に実行する。"""
+    workers = ANALYZE_CC_WORKERS if workers is None else workers
+    if workers > 1 and len(tasks) > 1:
+        workers = min(workers, len(tasks))
+        # 隣り合う組は clones_json を共有するので、まとめて同じワーカーに渡してスナップショットのキャッシュを効かせる
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(func, tasks, chunksize=chunksize)
+    else:
+        yield from map(func, tasks)
+
+
+def analyze_repo(project: dict, workers: int | None = None):
+    """対象リポジトリの全対象コミットに対してクローン差分分析を行う。
+
+    (言語, コミットの組) ごとの処理は互いに独立なので、workers（省略時は ANALYZE_CC_WORKERS）が 2 以上なら
+    ProcessPoolExecutor で並列に実行する。結果は並列数によらず言語・コミットの順に表示する。
+    失敗した組があっても残りの組は処理し、最後に AnalyzeCCError を送出する。
+    """
+    name, tasks = _pair_tasks(project)
+    failures = []
+    for (_name, language, commit_hash, prev_hash), (_analyzed, error) in zip(tasks, _map_pairs(_analyze_pair_isolated, tasks, workers)):
+        print(f"{commit_hash}-{prev_hash}")
+        if error is not None:
+            print(f"{language} {commit_hash}-{prev_hash} の解析に失敗しました．")
+            print(error)
+            failures.append((language, commit_hash, prev_hash))
+    if failures:
+        raise AnalyzeCCError.from_failures(name, failures)
+    artifact_gc.mark_regenerated(name, "modified_clones")
+
+
+def iter_repo_changes(project: dict, workers: int | None = None, dump: bool = False) -> Iterator[tuple[str, str, str, dict | None, str | None]]:
+    """analyze_repo と同じ組のクローン差分を、ファイルに書き出さずに言語・コミットの順に返す。
+
+    (language, 親コミット, 子コミット, modified_clones の compact 形式の内容（算出しない組は None）, 失敗した場合のトレースバック)
+    を返す。dump が真なら analyze_repo と同じく modified_clones にも保存する。
+    """
+    name, tasks = _pair_tasks(project)
+    fused_tasks = [(*task, dump) for task in tasks]
+    for (_name, language, commit_hash, prev_hash), (changes, error) in zip(tasks, _map_pairs(_compute_pair_isolated, fused_tasks, workers)):
+        yield language, commit_hash, prev_hash, changes, error
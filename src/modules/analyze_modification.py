@@ -1,6 +1,7 @@
 import json
 import sys
 from pathlib import Path
+from typing import Iterable
 
 import git
 
@@ -16,31 +17,33 @@ project_root = _find_repo_root(Path(__file__).resolve())
 sys.path.append(str(project_root))
 sys.path.append(str(project_root / "src"))
 from modules.util import FileMapper
+from modules.clone_columns import CloneColumns
+import modules.artifact_store as artifact_store
+import modules.artifact_gc as artifact_gc
+import modules.clone_store as clone_store
+import modules.modified_clones as modified_clones
+import modules.analyze_cc as analyze_cc
 
 
-def _load_ccfsw(path: Path) -> dict:
-    with open(path, "r") as f:
-        return json.load(f)
-
-
-def _initialize_latest_clones(head_ccfsw: dict, file_map: FileMapper) -> tuple[dict, dict]:
+def _initialize_latest_clones(head_fragments: CloneColumns, file_map: FileMapper) -> tuple[dict, dict]:
     """初期コミットのクローン情報を準備する。"""
-    latest_codeclones: dict[int, dict[int, dict]] = {}
+    latest_codeclones: dict[int, dict[int, dict]] = {clone_id: {} for clone_id in head_fragments.clone_ids}
     mapping: dict[tuple[int, int], tuple[int, int]] = {}
 
-    for clone_set in head_ccfsw["clone_sets"]:
-        clone_id = clone_set["clone_id"]
-        latest_codeclones[clone_id] = {}
-        for index, fragment in enumerate(clone_set["fragments"]):
-            latest_codeclones[clone_id][index] = {
-                "file_path": file_map.get_file_path(fragment["file_id"]),
-                "start_line": fragment["start_line"],
-                "end_line": fragment["end_line"],
-                "start_col": fragment["start_col"],
-                "end_col": fragment["end_col"],
-                "modification": [],
-            }
-            mapping[(clone_id, index)] = (clone_id, index)
+    columns = (
+        head_fragments.clone_id, head_fragments.index, head_fragments.file_id,
+        head_fragments.start_line, head_fragments.end_line, head_fragments.start_col, head_fragments.end_col,
+    )
+    for clone_id, index, file_id, start_line, end_line, start_col, end_col in zip(*(column.tolist() for column in columns)):
+        latest_codeclones[clone_id][index] = {
+            "file_path": file_map.get_file_path(file_id),
+            "start_line": start_line,
+            "end_line": end_line,
+            "start_col": start_col,
+            "end_col": end_col,
+            "modification": [],
+        }
+        mapping[(clone_id, index)] = (clone_id, index)
     return latest_codeclones, mapping
 
 
@@ -54,14 +57,65 @@ def _record_modification(latest_codeclones: dict, latest_clone_id: int, latest_i
     })
 
 
+class GenealogyTracker:
+    """1 言語について、先頭の対象コミットのクローンの各フラグメントに、過去のコミットでの変更を記録していく。
+
+    コミットの組を新しい順に apply（modified_clones の対応）か skip（算出しなかった組）で与える。
+    mapping は直前に与えた組の親コミットのフラグメント (clone_id, index) から、先頭のコミットのフラグメントへの対応。
+    """
+
+    def __init__(self, head_snapshot: clone_store.CloneSnapshot, head_hash: str):
+        self.latest_codeclones, self.mapping = _initialize_latest_clones(head_snapshot.fragments, head_snapshot.filemap)
+        self.prev_hash = head_hash
+
+    def skip(self, commit_hash: str) -> None:
+        """commit_hash と直前のコミットの間にクローンの変化がない（modified_clones がない）。"""
+        self.prev_hash = commit_hash
+
+    def apply(self, commit_hash: str, events: Iterable[modified_clones.FragmentEvent]) -> None:
+        """commit_hash（親）と直前のコミット（子）の間の modified_clones の対応を反映する。"""
+        mapping: dict[tuple[int, int], tuple[int, int] | tuple[None, None]] = {}
+        for fragment_type, child_key, parent_key in events:
+            if child_key not in self.mapping:
+                continue
+
+            # 親フラグメントへの対応を更新（added 以外）
+            if fragment_type != "added":
+                mapping.setdefault(parent_key, (None, None))
+                mapping[parent_key] = self.mapping[child_key]
+
+            if fragment_type == "modified":
+                latest_clone_id, latest_index = mapping[parent_key]
+                _record_modification(self.latest_codeclones, latest_clone_id, latest_index, "modified", self.prev_hash)
+            elif fragment_type == "added":
+                latest_clone_id, latest_index = self.mapping[child_key]
+                _record_modification(self.latest_codeclones, latest_clone_id, latest_index, "added", commit_hash)
+        self.mapping = mapping
+        self.prev_hash = commit_hash
+
+    def write_csv(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            f.write("clone_id;index;file_path;start_line;end_line;start_column;end_column;modification\n")
+            for clone_id, fragments in self.latest_codeclones.items():
+                for index, fragment in fragments.items():
+                    modification_str = json.dumps(fragment["modification"])
+                    f.write(
+                        f"{clone_id};{index};{fragment['file_path']};"
+                        f"{fragment['start_line']};{fragment['end_line']};"
+                        f"{fragment['start_col']};{fragment['end_col']};{modification_str}\n"
+                    )
+
+
 def analyze_repo(project: dict):
-    """指定プロジェクトのクローン変更履歴を集計する。"""
+    """指定プロジェクトのクローン変更履歴を、analyze-cc が書き出した modified_clones から集計する。"""
     url = project["URL"]
     name = url.split("/")[-2] + "." + url.split("/")[-1]
     workdir = project_root / "dest/projects" / name
     git_repo = git.Repo(workdir)
     analyzed_commits_path = project_root / "dest/analyzed_commits" / f"{name}.json"
     print("name:", name)
+    artifact_gc.ensure_available(name, "modified_clones", "analyze-cc")
 
     with open(analyzed_commits_path, "r") as f:
         analyzed_commit_hashes = json.load(f)
@@ -69,63 +123,61 @@ def analyze_repo(project: dict):
 
     for language in project["languages"]:
         print("language:", language)
-        head_ccfsw_file = project_root / "dest/clones_json" / name / head_commit.hexsha / f"{language}.json"
-        head_ccfsw = _load_ccfsw(head_ccfsw_file)
-        latest_file_map = FileMapper(head_ccfsw["file_data"], str(workdir))
-
-        latest_codeclones, head_mapping = _initialize_latest_clones(head_ccfsw, latest_file_map)
-        prev_mapping_by_commit: dict[str, dict[tuple[int, int], tuple[int, int] | tuple[None, None]]] = {
-            head_commit.hexsha: head_mapping
-        }
-
-        prev_commit = head_commit
+        tracker = GenealogyTracker(clone_store.load_snapshot(name, head_commit.hexsha, language), head_commit.hexsha)
         for commit_hash in analyzed_commit_hashes:
             if commit_hash == head_commit.hexsha:
                 continue
 
             commit = git_repo.commit(commit_hash)
             print("commit:", commit.hexsha)
-            modified_clones_file = project_root / "dest/modified_clones" / name / f"{commit.hexsha}-{prev_commit.hexsha}" / f"{language}.json"
+            modified_clones_file = project_root / "dest/modified_clones" / name / f"{commit.hexsha}-{tracker.prev_hash}" / f"{language}.json"
 
-            if not modified_clones_file.exists():
-                prev_mapping_by_commit[commit.hexsha] = prev_mapping_by_commit[prev_commit.hexsha]
-                prev_commit = commit
+            if not artifact_store.exists(modified_clones_file):
+                tracker.skip(commit.hexsha)
                 continue
+            tracker.apply(commit.hexsha, modified_clones.load(modified_clones_file))
 
-            modified_clones = _load_ccfsw(modified_clones_file)
-            prev_mapping_by_commit[commit.hexsha] = {}
-
-            for modified_clone in modified_clones:
-                for fragment in modified_clone["fragments"]:
-                    child_key = (int(fragment["child"]["clone_id"]), int(fragment["child"]["index"]))
-                    if child_key not in prev_mapping_by_commit[prev_commit.hexsha]:
-                        continue
-
-                    # 親フラグメントへの対応を更新（added 以外）
-                    if fragment["type"] != "added":
-                        parent_key = (int(fragment["parent"]["clone_id"]), int(fragment["parent"]["index"]))
-                        prev_mapping_by_commit[commit.hexsha].setdefault(parent_key, (None, None))
-                        prev_mapping_by_commit[commit.hexsha][parent_key] = prev_mapping_by_commit[prev_commit.hexsha][child_key]
-
-                    if fragment["type"] == "modified":
-                        parent_key = (int(fragment["parent"]["clone_id"]), int(fragment["parent"]["index"]))
-                        latest_clone_id, latest_index = prev_mapping_by_commit[commit.hexsha][parent_key]
-                        _record_modification(latest_codeclones, latest_clone_id, latest_index, "modified", prev_commit.hexsha)
-                    elif fragment["type"] == "added":
-                        latest_clone_id, latest_index = prev_mapping_by_commit[prev_commit.hexsha][child_key]
-                        _record_modification(latest_codeclones, latest_clone_id, latest_index, "added", commit.hexsha)
-
-            prev_commit = commit
-
-        dest_dir = project_root / "dest/csv" / name
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        with open(dest_dir / f"{language}.csv", "w") as f:
-            f.write("clone_id;index;file_path;start_line;end_line;start_column;end_column;modification\n")
-            for clone_id, fragments in latest_codeclones.items():
-                for index, fragment in fragments.items():
-                    modification_str = json.dumps(fragment["modification"])
-                    f.write(
-                        f"{clone_id};{index};{fragment['file_path']};"
-                        f"{fragment['start_line']};{fragment['end_line']};"
-                        f"{fragment['start_col']};{fragment['end_col']};{modification_str}\n"
-                    )
+        tracker.write_csv(project_root / "dest/csv" / name / f"{language}.csv")
+
+
+def analyze_repo_fused(project: dict, workers: int | None = None, dump: bool = False):
+    """analyze-cc と analyze-modification をまとめて実行する。
+
+    コミットの組ごとのクローン差分（analyze_cc.iter_repo_changes）を、算出した順にそのまま GenealogyTracker に渡すので、
+    modified_clones は書き出さない（dump が真なら確認用に書き出す）。workers は analyze_cc.analyze_repo と同じ。
+    失敗した組がある言語の CSV は書き出さず、最後に AnalyzeCCError を送出する。
+    """
+    url = project["URL"]
+    name = url.split("/")[-2] + "." + url.split("/")[-1]
+    print("name:", name)
+    with open(project_root / "dest/analyzed_commits" / f"{name}.json", "r") as f:
+        head_hash = json.load(f)[0]
+
+    trackers = {
+        language: GenealogyTracker(clone_store.load_snapshot(name, head_hash, language), head_hash)
+        for language in project["languages"]
+    }
+    failures = []
+    for language, commit_hash, prev_hash, changes, error in analyze_cc.iter_repo_changes(project, workers, dump):
+        print(f"{language} {commit_hash}-{prev_hash}")
+        if error is not None:
+            print(f"{language} {commit_hash}-{prev_hash} の解析に失敗しました．")
+            print(error)
+            failures.append((language, commit_hash, prev_hash))
+            continue
+        if changes is None:
+            trackers[language].skip(commit_hash)
+        else:
+            trackers[language].apply(commit_hash, modified_clones.iter_events(changes))
+
+    failed_languages = {language for language, _commit_hash, _prev_hash in failures}
+    for language, tracker in trackers.items():
+        if language not in failed_languages:
+            tracker.write_csv(project_root / "dest/csv" / name / f"{language}.csv")
+    if dump:
+        artifact_gc.mark_regenerated(name, "modified_clones")
+    else:
+        # 書き出していないので、--from-step analyze-modification では使えない
+        artifact_gc.mark_removed(name, "modified_clones")
+    if failures:
+        raise analyze_cc.AnalyzeCCError.from_failures(name, failures)
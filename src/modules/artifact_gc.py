@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+import modules.artifact_store as artifact_store
+import modules.clone_store as clone_store
+from config import INCREMENTAL_DETECTOR_MIN_TOKENS
+from modules.incremental_detector import CACHE_VERSION, TOKEN_CACHE_DIR
+
+# gc の対象となる中間成果物（種類 -> dest 配下のディレクトリ）
+ARTIFACT_DIRS = {
+    "ccfswtxt": project_root / "dest/temp/ccfswtxt",
+    "moving_lines": project_root / "dest/moving_lines",
+    "modified_clones": project_root / "dest/modified_clones",
+}
+# incremental 検出器のトークンキャッシュ（blob SHA がキーでプロジェクトをまたいで共有されるので、プロジェクト単位では消さない）
+TOKEN_CACHE_CURRENT = TOKEN_CACHE_DIR / f"v{CACHE_VERSION}-t{INCREMENTAL_DETECTOR_MIN_TOKENS}"
+# gc で削除した成果物の記録（dest/gc/<name>.json）
+REMOVED_DIR = project_root / "dest/gc"
+
+_SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+class ArtifactQuotaExceededError(RuntimeError):
+    """圧縮と削除を行っても中間成果物の合計サイズが上限を超えている。"""
+
+
+@dataclass
+class GCStats:
+    compressed_files: int = 0
+    removed_files: int = 0
+    freed_bytes: int = 0
+
+    def add(self, other: "GCStats") -> None:
+        self.compressed_files += other.compressed_files
+        self.removed_files += other.removed_files
+        self.freed_bytes += other.freed_bytes
+
+
+def parse_size(value: str | int | None) -> int | None:
+    """"200G" のようなサイズ指定をバイト数にする（Java の -Xmx と同じ接尾辞）。None はそのまま返す。"""
+    if value is None or isinstance(value, int):
+        return value
+    text = value.strip().upper().removesuffix("B")
+    if text and text[-1] in _SIZE_UNITS:
+        return int(float(text[:-1]) * _SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def project_name(project: dict) -> str:
+    url = project["URL"]
+    return url.split("/")[-2] + "." + url.split("/")[-1]
+
+
+def _newest_mtime(paths) -> float:
+    newest = 0.0
+    for path in paths:
+        try:
+            newest = max(newest, path.stat().st_mtime)
+        except FileNotFoundError:
+            continue
+    return newest
+
+
+def _newest_input_mtime(name: str, language: str) -> float:
+    """language の CSV の入力（対象コミット・clones_json・moving_lines・modified_clones）の最終更新時刻。"""
+    return max(
+        _newest_mtime([project_root / "dest/analyzed_commits" / f"{name}.json"]),
+        _newest_mtime((clone_store.CLONES_JSON_ROOT / name).glob(f"*/{language}.*")),
+        _newest_mtime((ARTIFACT_DIRS["moving_lines"] / name).glob("*")),
+        _newest_mtime((ARTIFACT_DIRS["modified_clones"] / name).glob(f"*/{language}.json*")),
+    )
+
+
+def is_complete(project: dict) -> bool:
+    """全言語の CSV（最終成果物）が揃っていて、いずれもその入力より新しいか。
+
+    途中で失敗した再実行などで入力の方が新しい場合は、CSV が古い結果なので揃っているとみなさない。
+    """
+    name = project_name(project)
+    csv_dir = project_root / "dest/csv" / name
+    for language in project["languages"]:
+        csv_file = csv_dir / f"{language}.csv"
+        if not csv_file.exists() or csv_file.stat().st_mtime < _newest_input_mtime(name, language):
+            return False
+    return True
+
+
+def _tree_size(path: Path) -> int:
+    if not path.exists():
+        return 0
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.stat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def disk_usage() -> int:
+    """中間成果物（トークンキャッシュを含む）の合計サイズ（バイト）。"""
+    return sum(_tree_size(path) for path in ARTIFACT_DIRS.values()) + _tree_size(TOKEN_CACHE_DIR)
+
+
+def _removed_path(name: str) -> Path:
+    return REMOVED_DIR / f"{name}.json"
+
+
+def removed_artifacts(name: str) -> dict:
+    """gc で削除され、まだ作り直されていない成果物の種類 -> 削除日時。"""
+    path = _removed_path(name)
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_removed(name: str, removed: dict) -> None:
+    path = _removed_path(name)
+    if not removed:
+        path.unlink(missing_ok=True)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = path.with_name(path.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(removed, f, indent=4)
+    os.replace(temp_file, path)
+
+
+def mark_removed(name: str, kind: str) -> None:
+    """kind の成果物が使えない（削除した、または書き出していない）ことを記録する。"""
+    removed = removed_artifacts(name)
+    removed[kind] = datetime.now().isoformat(timespec="seconds")
+    _write_removed(name, removed)
+
+
+def mark_regenerated(name: str, kind: str) -> None:
+    """kind の成果物を作り直したので、削除の記録を消す。"""
+    removed = removed_artifacts(name)
+    if kind in removed:
+        del removed[kind]
+        _write_removed(name, removed)
+
+
+def ensure_available(name: str, kind: str, from_step: str) -> None:
+    """kind の成果物が gc で削除されたまま（または書き出されていない）なら、誤った結果を出さないように停止する。"""
+    removed = removed_artifacts(name)
+    if kind in removed:
+        raise RuntimeError(
+            f"{name} の {kind} は gc で削除されたか，書き出されていません（{removed[kind]}）．"
+            f"--from-step {from_step} から実行し直してください．"
+        )
+
+
+def _remove_tree(path: Path, dry_run: bool) -> GCStats:
+    stats = GCStats()
+    if not path.exists():
+        return stats
+    for _dirpath, _dirnames, filenames in os.walk(path):
+        stats.removed_files += len(filenames)
+    stats.freed_bytes = _tree_size(path)
+    if not dry_run:
+        shutil.rmtree(path)
+    return stats
+
+
+def _remove_parsed_ccfswtxt(name: str, dry_run: bool) -> GCStats:
+    """検出結果（clones_json か列指向の形式）に変換済みの CCFinderSW の出力テキストを削除する。"""
+    stats = GCStats()
+    txt_root = ARTIFACT_DIRS["ccfswtxt"] / name
+    if not txt_root.exists():
+        return stats
+    for txt_file in txt_root.glob("*/*_ccfsw.txt"):
+        commit_hash = txt_file.parent.name
+        language = txt_file.name.removesuffix("_ccfsw.txt")
+        if not clone_store.snapshot_exists(name, commit_hash, language):
+            continue
+        stats.removed_files += 1
+        stats.freed_bytes += txt_file.stat().st_size
+        if not dry_run:
+            txt_file.unlink()
+    return stats
+
+
+def _compress_tree(path: Path, dry_run: bool) -> GCStats:
+    stats = GCStats()
+    if artifact_store.compressed_suffix() is None or not path.exists():
+        return stats
+    for json_file in sorted(path.rglob("*.json")):
+        stats.compressed_files += 1
+        if not dry_run:
+            stats.freed_bytes += artifact_store.compress_file(json_file)
+    return stats
+
+
+def collect_garbage(project: dict, compress: bool = True, dry_run: bool = False) -> GCStats:
+    """1 プロジェクトの中間成果物に保持ポリシーを適用する。
+
+    全言語の CSV が揃っていれば ccfswtxt / moving_lines / modified_clones を削除し、削除したことを
+    dest/gc/<name>.json に記録する。揃っていなければ変換済みの ccfswtxt だけを削除し、
+    まだ必要な moving_lines / modified_clones を圧縮する（compress=False なら圧縮しない）。
+    dry_run では何も変更せず、削除されるバイト数だけを数える（圧縮で減る量は数えない）。
+    """
+    name = project_name(project)
+    stats = GCStats()
+    if is_complete(project):
+        removed = removed_artifacts(name)
+        for kind, root in ARTIFACT_DIRS.items():
+            if not (root / name).exists():
+                continue
+            stats.add(_remove_tree(root / name, dry_run))
+            if kind != "ccfswtxt":
+                removed[kind] = datetime.now().isoformat(timespec="seconds")
+        if not dry_run:
+            _write_removed(name, removed)
+        return stats
+    stats.add(_remove_parsed_ccfswtxt(name, dry_run))
+    if compress:
+        stats.add(_compress_tree(ARTIFACT_DIRS["moving_lines"] / name, dry_run))
+        stats.add(_compress_tree(ARTIFACT_DIRS["modified_clones"] / name, dry_run))
+    return stats
+
+
+def collect_token_cache(dataset: list[dict], dry_run: bool = False, force: bool = False) -> GCStats:
+    """トークンキャッシュに保持ポリシーを適用する。
+
+    形式のバージョンや最小トークン数が現在の設定と異なるキャッシュは常に削除する。
+    現在のキャッシュは、dataset の全プロジェクトの CSV が揃った場合（または force）に削除する。
+    """
+    stats = GCStats()
+    if not TOKEN_CACHE_DIR.exists():
+        return stats
+    for cache_dir in TOKEN_CACHE_DIR.iterdir():
+        if cache_dir != TOKEN_CACHE_CURRENT:
+            stats.add(_remove_tree(cache_dir, dry_run))
+    if force or all(is_complete(project) for project in dataset):
+        stats.add(_remove_tree(TOKEN_CACHE_CURRENT, dry_run))
+    return stats
+
+
+def enforce_quota(dataset: list[dict], quota: int | None) -> GCStats:
+    """中間成果物の合計サイズが quota を超えていれば、dataset の全プロジェクトに gc を適用する。
+
+    それでも超えている場合はトークンキャッシュ（作り直せる）を削除し、なお超えていれば
+    ArtifactQuotaExceededError を送出する。
+    """
+    stats = GCStats()
+    if quota is None:
+        return stats
+    usage = disk_usage()
+    if usage <= quota:
+        return stats
+    for project in dataset:
+        stats.add(collect_garbage(project))
+    stats.add(collect_token_cache(dataset, force=disk_usage() > quota))
+    usage = disk_usage()
+    if usage > quota:
+        raise ArtifactQuotaExceededError(
+            f"中間成果物の合計サイズ {usage / 1024**3:.1f} GiB が上限 {quota / 1024**3:.1f} GiB を超えています"
+            f"（gc で {stats.freed_bytes / 1024**3:.1f} GiB を解放しました）．"
+        )
+    return stats
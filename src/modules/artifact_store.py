@@ -0,0 +1,129 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from config import ARTIFACT_COMPRESSION
+
+ZSTD_SUFFIX = ".zst"
+GZIP_SUFFIX = ".gz"
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+
+_warned_zstd_unavailable = False
+
+
+def compressed_suffix() -> str | None:
+    """ARTIFACT_COMPRESSION に対応する拡張子。zstandard がなければ（初回に警告を表示して）gzip にする。圧縮しない場合は None。"""
+    global _warned_zstd_unavailable
+    if ARTIFACT_COMPRESSION is None:
+        return None
+    if ARTIFACT_COMPRESSION == "zstd":
+        if zstandard is not None:
+            return ZSTD_SUFFIX
+        if not _warned_zstd_unavailable:
+            print("警告: ARTIFACT_COMPRESSION は \"zstd\" ですが zstandard がインストールされていないため，gzip で圧縮します．")
+            _warned_zstd_unavailable = True
+    return GZIP_SUFFIX
+
+
+def variants(path: Path) -> list[Path]:
+    """path 自体と、その圧縮版のパス。"""
+    path = Path(path)
+    return [path, path.with_name(path.name + ZSTD_SUFFIX), path.with_name(path.name + GZIP_SUFFIX)]
+
+
+def resolve(path: Path) -> Path | None:
+    """path か、その圧縮版のうち存在するものを返す（非圧縮を優先する）。"""
+    for variant in variants(path):
+        if variant.exists():
+            return variant
+    return None
+
+
+def exists(path: Path) -> bool:
+    return resolve(path) is not None
+
+
+def discard(path: Path, keep_plain: bool = False) -> None:
+    """path とその圧縮版を削除する。keep_plain の場合は圧縮版だけを削除する。"""
+    for variant in variants(path)[1 if keep_plain else 0:]:
+        variant.unlink(missing_ok=True)
+
+
+@contextmanager
+def open_text(path: Path) -> Iterator[IO[str]]:
+    """path（なければ圧縮版）をテキストとして開く。圧縮版は読みながら展開する。"""
+    resolved = resolve(path)
+    if resolved is None:
+        raise FileNotFoundError(path)
+    if resolved.name.endswith(ZSTD_SUFFIX):
+        if zstandard is None:
+            raise RuntimeError(f"{resolved} を読むには zstandard が必要です．")
+        with open(resolved, "rb") as raw:
+            with zstandard.ZstdDecompressor().stream_reader(raw) as reader:
+                yield io.TextIOWrapper(reader, encoding="utf-8")
+        return
+    if resolved.name.endswith(GZIP_SUFFIX):
+        with gzip.open(resolved, "rt", encoding="utf-8") as f:
+            yield f
+        return
+    with open(resolved, "r", encoding="utf-8") as f:
+        yield f
+
+
+def load_json(path: Path):
+    with open_text(path) as f:
+        return json.load(f)
+
+
+def compress_file(path: Path) -> int:
+    """非圧縮のファイルを ARTIFACT_COMPRESSION で圧縮して置き換え、減ったバイト数を返す。"""
+    suffix = compressed_suffix()
+    if suffix is None or not path.exists():
+        return 0
+    dest_file = path.with_name(path.name + suffix)
+    temp_file = path.with_name(dest_file.name + ".tmp")
+    stat = path.stat()
+    before = stat.st_size
+    try:
+        with open(path, "rb") as src:
+            if suffix == ZSTD_SUFFIX:
+                with open(temp_file, "wb") as raw:
+                    with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw) as writer:
+                        shutil.copyfileobj(src, writer)
+            else:
+                with gzip.open(temp_file, "wb", compresslevel=GZIP_LEVEL) as writer:
+                    shutil.copyfileobj(src, writer)
+        # 圧縮しただけで入力が更新されたとみなされないよう（artifact_gc.is_complete）、更新時刻を引き継ぐ
+        os.utime(temp_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp_file, dest_file)
+    finally:
+        temp_file.unlink(missing_ok=True)
+    path.unlink()
+    # 別の形式の古い圧縮版が残っていれば消す
+    for variant in variants(path)[1:]:
+        if variant != dest_file:
+            variant.unlink(missing_ok=True)
+    return before - dest_file.stat().st_size
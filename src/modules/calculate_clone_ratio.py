@@ -16,7 +16,7 @@ sys.path.append(str(project_root / "src"))
 
 from modules.util import get_codeclones_classified_by_type
 from modules.util import calculate_loc
-from modules.util import FileMapper
+import modules.clone_store as clone_store
 import modules.github_linguist
 
 
@@ -32,14 +32,12 @@ def analyze_repo(project: dict):
     languages = project["languages"]
     result = {}
     for language in languages:
-        first_commit_ccfsw_file = project_root / "dest/clones_json" / name / first_commit / f"{language}.json"
-        with open(first_commit_ccfsw_file, "r") as f:
-            project_ccfsw_data = json.load(f)
-        file_mapper = FileMapper(project_ccfsw_data["file_data"], str(workdir))
+        first_commit_snapshot = clone_store.load_snapshot(name, first_commit, language)
+        file_mapper = first_commit_snapshot.filemap
         clonesets = get_codeclones_classified_by_type(project, language)
         codebases = project["languages"][language].keys()
         file_dict = {}
-        for file_data in project_ccfsw_data["file_data"]:
+        for file_data in first_commit_snapshot.file_data:
             file_path = file_mapper.get_file_path(file_data["file_id"])
             for codebase in codebases:
                 if file_path.startswith(codebase):
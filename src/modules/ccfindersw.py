@@ -0,0 +1,358 @@
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from config import (
+    ANTLR_LANGUAGE,
+    CCFINDERSW_CDS_ARCHIVE,
+    CCFINDERSW_JAR,
+    CCFINDERSWPARSER,
+    CCFINDERSW_JAVA_XMX,
+    CCFINDERSW_JAVA_XSS,
+    CCFINDERSW_OUTPUT_FIFO,
+    CCFINDERSW_OUTPUT_PARSER,
+    CCFINDERSW_USE_CDS_ARCHIVE,
+    CCFINDERSW_USE_WORKER,
+    CCFINDERSW_WORKER_CLASSES,
+    CCFINDERSW_WORKER_MAX_JOBS,
+    CCFINDERSW_WORKER_HEAP_RECYCLE_RATIO,
+)
+import modules.ccfsw_reader as ccfsw_reader
+
+CCFINDERSW_WORKER_SOURCE = project_root / "lib/ccfindersw-worker/CCFinderSWWorker.java"
+# -XX:+ExitOnOutOfMemoryError を指定した JVM がヒープ不足で終了したときの終了コード
+JVM_OUT_OF_MEMORY_EXIT_CODE = 3
+# CCFinderSW がクローンとみなす最小トークン数（-t を指定しないので既定値）
+CCFINDERSW_MIN_TOKENS = 50
+
+
+class CCFinderSWOutOfMemoryError(RuntimeError):
+    """CCFinderSW がヒープ不足で終了したことを表す。"""
+
+
+class CCFinderSWWorkerError(RuntimeError):
+    """常駐ワーカーで実行したジョブが失敗したことを表す。"""
+
+
+def convert_language_for_ccfindersw(language: str) -> str:
+    match language:
+        case "C++":
+            return "cpp"
+        case "C#":
+            return "csharp"
+        case _:
+            return language.lower()
+
+
+def build_ccfindersw_args(directory: Path, language: str, exts: tuple[str], dest_file: Path) -> list[str]:
+    """CCFinderSW に渡す引数（java -jar より後ろ）を組み立てる。"""
+    base_args = [
+        "D",
+        "-d",
+        str(directory),
+        "-l",
+        convert_language_for_ccfindersw(language),
+        "-o",
+        str(dest_file),
+    ]
+    if language in ANTLR_LANGUAGE:
+        return [*base_args, "-antlr", "|".join(exts), "-w", "2", "-ccfsw", "set"]
+    return [*base_args, "-w", "2", "-ccfsw", "set"]
+
+
+def java_options(use_cds_archive: bool = CCFINDERSW_USE_CDS_ARCHIVE, xmx: str = CCFINDERSW_JAVA_XMX) -> list[str]:
+    """CCFinderSW を起動する JVM のオプションを返す。
+
+    use_cds_archive（省略時は CCFINDERSW_USE_CDS_ARCHIVE）なら、prepare-jvm で作成した AppCDS アーカイブがあれば指定する。
+    アーカイブが JVM と合わない場合も -Xshare:auto により通常起動にフォールバックする。
+    ヒープ不足は終了コードで判別できるよう、OutOfMemoryError の時点で JVM を終了させる。
+    """
+    options = [
+        f"-Xmx{xmx}",
+        f"-Xss{CCFINDERSW_JAVA_XSS}",
+        "-XX:+ExitOnOutOfMemoryError",
+    ]
+    if use_cds_archive and CCFINDERSW_CDS_ARCHIVE.exists():
+        options.extend(["-Xshare:auto", f"-XX:SharedArchiveFile={CCFINDERSW_CDS_ARCHIVE}"])
+    return options
+
+
+_compile_lock = threading.Lock()
+
+
+def compile_worker() -> Path:
+    """常駐ワーカーのクラスを CCFINDERSW_WORKER_CLASSES にコンパイルし、そのディレクトリを返す。
+
+    ソースより新しいクラスファイルがあればコンパイルしない。
+    """
+    class_file = CCFINDERSW_WORKER_CLASSES / f"{CCFINDERSW_WORKER_SOURCE.stem}.class"
+    with _compile_lock:
+        if class_file.exists() and class_file.stat().st_mtime >= CCFINDERSW_WORKER_SOURCE.stat().st_mtime:
+            return CCFINDERSW_WORKER_CLASSES
+        CCFINDERSW_WORKER_CLASSES.mkdir(parents=True, exist_ok=True)
+        # 他のプロセスが起動中のワーカーから読まれても壊れないよう、別のディレクトリに出力してから置き換える
+        temp_dir = Path(tempfile.mkdtemp(dir=CCFINDERSW_WORKER_CLASSES))
+        try:
+            cmd = ["javac", "-cp", str(CCFINDERSW_JAR), "-d", str(temp_dir), str(CCFINDERSW_WORKER_SOURCE)]
+            subprocess.run(cmd, check=True)
+            for compiled in temp_dir.glob("*.class"):
+                os.replace(compiled, CCFINDERSW_WORKER_CLASSES / compiled.name)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return CCFINDERSW_WORKER_CLASSES
+
+
+class CCFinderSWWorker:
+    """JVM を起動したままにして CCFinderSW のジョブを受け付ける常駐ワーカー。
+
+    max_jobs 件のジョブを処理するか、ジョブ終了時のヒープ使用率が
+    heap_recycle_ratio を超えた場合は次のジョブの前に JVM を再起動する。
+    クラスのコンパイルや JVM の起動に失敗した場合は unavailable になり、以降のジョブは受け付けない。
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = CCFINDERSW_WORKER_MAX_JOBS,
+        heap_recycle_ratio: float = CCFINDERSW_WORKER_HEAP_RECYCLE_RATIO,
+        xmx: str = CCFINDERSW_JAVA_XMX,
+    ) -> None:
+        self.xmx = xmx
+        self.max_jobs = max_jobs
+        self.heap_recycle_ratio = heap_recycle_ratio
+        self.process: subprocess.Popen | None = None
+        self.jobs = 0
+        self.needs_recycle = False
+        self.unavailable = False
+
+    def _start(self) -> None:
+        cmd = [
+            "java",
+            *java_options(xmx=self.xmx),
+            "-cp",
+            os.pathsep.join([str(CCFINDERSW_JAR), str(compile_worker())]),
+            CCFINDERSW_WORKER_SOURCE.stem,
+        ]
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self.jobs = 0
+        self.needs_recycle = False
+        if self.process.stdout.readline().strip() != "READY":
+            self.close()
+            raise CCFinderSWWorkerError("CCFinderSW ワーカーが READY を返しませんでした．")
+
+    def close(self) -> int | None:
+        """ワーカーを終了し、JVM の終了コードを返す。"""
+        if self.process is None:
+            return None
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=30)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+        returncode = self.process.returncode
+        self.process = None
+        return returncode
+
+    def run(self, args: list[str]) -> bool:
+        """ジョブを 1 件実行する。引数をワーカーに渡せない場合や、ワーカーを起動できない場合は何も実行せずに False を返す。
+
+        ジョブを渡した後に失敗した場合は再実行せずに例外を送出する。
+        ヒープ不足で JVM が終了した場合は CCFinderSWOutOfMemoryError、それ以外は CCFinderSWWorkerError。
+        """
+        if self.unavailable or any("\t" in arg or "\n" in arg for arg in args):
+            return False
+        if self.process is not None and (self.needs_recycle or self.process.poll() is not None):
+            self.close()
+        if self.process is None:
+            try:
+                self._start()
+            except (OSError, subprocess.CalledProcessError, CCFinderSWWorkerError) as e:
+                # javac がない・コンパイルに失敗した・JVM が起動しないなど。ジョブは渡していないので JVM を都度起動して実行する
+                print(f"CCFinderSW ワーカーを起動できないため，JVM を都度起動して実行します: {e}")
+                self.unavailable = True
+                return False
+        try:
+            self.process.stdin.write("\t".join(args) + "\n")
+            self.process.stdin.flush()
+            response = self.process.stdout.readline().rstrip("\n").split("\t")
+        except OSError as e:
+            response = ["ERR", str(e)]
+        if response[0] != "OK":
+            message = " ".join(response[1:]) or "worker exited"
+            # 失敗したジョブの状態を次のジョブに持ち込まないよう、ワーカーは作り直す
+            if self.close() == JVM_OUT_OF_MEMORY_EXIT_CODE:
+                raise CCFinderSWOutOfMemoryError(f"CCFinderSW がヒープ不足で終了しました（-Xmx{self.xmx}）．")
+            raise CCFinderSWWorkerError(f"CCFinderSW ワーカーでの実行に失敗しました: {message}")
+        self.jobs += 1
+        used, max_heap = int(response[1]), int(response[2])
+        if self.jobs >= self.max_jobs or (max_heap > 0 and used / max_heap > self.heap_recycle_ratio):
+            self.needs_recycle = True
+        return True
+
+
+_local = threading.local()
+_workers: list[CCFinderSWWorker] = []
+_workers_lock = threading.Lock()
+
+
+def _get_worker(xmx: str) -> CCFinderSWWorker:
+    # スレッドごと・ヒープサイズごとに 1 つのワーカーを割り当てる（並列検出時は JVM が jobs 個になる）
+    workers = getattr(_local, "workers", None)
+    if workers is None:
+        workers = _local.workers = {}
+    worker = workers.get(xmx)
+    if worker is None:
+        worker = workers[xmx] = CCFinderSWWorker(xmx=xmx)
+        with _workers_lock:
+            _workers.append(worker)
+    return worker
+
+
+@atexit.register
+def shutdown_workers() -> None:
+    with _workers_lock:
+        for worker in _workers:
+            worker.close()
+
+
+def run_ccfindersw(args: list[str], xmx: str = CCFINDERSW_JAVA_XMX) -> None:
+    """CCFinderSW を実行する。CCFINDERSW_USE_WORKER でない場合や、引数をワーカーに渡せない場合、ワーカーを起動できない場合は
+    JVM を都度起動する。
+
+    ヒープ不足で終了した場合は CCFinderSWOutOfMemoryError を送出する。
+    ワーカーで失敗したジョブは JVM を起動し直して再実行しない（CCFinderSWWorkerError を送出する）。
+    """
+    if CCFINDERSW_USE_WORKER and _get_worker(xmx).run(args):
+        return
+    cmd = [
+        "java",
+        *java_options(xmx=xmx),
+        "-jar",
+        str(CCFINDERSW_JAR),
+        *args,
+    ]
+    completed = subprocess.run(cmd)
+    if completed.returncode == JVM_OUT_OF_MEMORY_EXIT_CODE:
+        raise CCFinderSWOutOfMemoryError(f"CCFinderSW がヒープ不足で終了しました（-Xmx{xmx}）．")
+    completed.check_returncode()
+
+
+def relocate_clones_json(json_file: Path, src_dir: Path, dest_dir: Path):
+    """クローン検出結果の file_path を src_dir 基準から dest_dir 基準に書き換える。"""
+    with open(json_file, "r") as f:
+        ccfsw = json.load(f)
+    src_prefix = str(src_dir) + "/"
+    dest_prefix = str(dest_dir) + "/"
+    for file_data in ccfsw["file_data"]:
+        file_path = str(file_data["file_path"])
+        if file_path.startswith(src_prefix):
+            file_data["file_path"] = dest_prefix + file_path[len(src_prefix):]
+    with open(json_file, "w") as f:
+        json.dump(ccfsw, f)
+
+
+def _release_fifo(fifo: Path) -> None:
+    # CCFinderSW が出力先を開かずに終了した場合でも、読み出し側の open() が戻るように書き込み側を開いて閉じる
+    try:
+        fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        # 読み出し側がすでに閉じている
+        return
+    os.close(fd)
+
+
+def _detect_through_fifo(args: list[str], txt_file: Path, json_dest: Path, relocate: tuple[str, str] | None, xmx: str) -> None:
+    """出力先に名前付きパイプを置き、CCFinderSW が書き出す内容をディスクに置かずに clones_json へ変換する。
+
+    パイプと読み出し側のスレッドは CCFinderSW の 1 回の実行にだけ使う（run_ccfindersw は失敗したジョブを再実行しない）。
+    読み出した結果は、CCFinderSW が正常に終了し、出力を最後まで読めた場合だけ json_dest に置き換える。
+    """
+    txt_file.unlink(missing_ok=True)
+    os.mkfifo(txt_file)
+    partial = json_dest.with_name(json_dest.name + ".partial")
+    errors: list[BaseException] = []
+
+    def read() -> None:
+        try:
+            ccfsw_reader.convert_file(txt_file, partial, relocate)
+        except BaseException as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        run_ccfindersw(args, xmx=xmx)
+        _release_fifo(txt_file)
+        reader.join()
+        if errors:
+            raise errors[0]
+        os.replace(partial, json_dest)
+    finally:
+        _release_fifo(txt_file)
+        reader.join()
+        txt_file.unlink(missing_ok=True)
+        partial.unlink(missing_ok=True)
+
+
+def detect_to_json(
+    directory: Path,
+    language: str,
+    exts: tuple[str],
+    txt_dest: Path,
+    json_dest: Path,
+    xmx: str = CCFINDERSW_JAVA_XMX,
+    path_base: Path | None = None,
+) -> None:
+    """directory に対して CCFinderSW を実行し、クローンセットの JSON に変換する。
+
+    CCFINDERSW_OUTPUT_PARSER が builtin の場合は modules.ccfsw_reader で出力を読みながら JSON を書き出し、
+    CCFinderSW の出力テキストは残さない（CCFINDERSW_OUTPUT_FIFO では名前付きパイプ経由で受け取る）。
+    ccfindersw-parser の場合は外部の ccfindersw-parser で変換する。
+    path_base を指定した場合、出力の file_path を directory 基準から path_base 基準に書き換える。
+    """
+    txt_dest.parent.mkdir(parents=True, exist_ok=True)
+    json_dest.parent.mkdir(parents=True, exist_ok=True)
+    txt_file = Path(f"{txt_dest}_ccfsw.txt")
+    args = build_ccfindersw_args(directory, language, exts, txt_dest)
+    relocate = None
+    if path_base is not None and Path(path_base) != Path(directory):
+        relocate = (str(directory) + "/", str(path_base) + "/")
+    if CCFINDERSW_OUTPUT_PARSER == "builtin":
+        if CCFINDERSW_OUTPUT_FIFO and hasattr(os, "mkfifo"):
+            _detect_through_fifo(args, txt_file, json_dest, relocate, xmx)
+            return
+        run_ccfindersw(args, xmx=xmx)
+        try:
+            ccfsw_reader.convert_file(txt_file, json_dest, relocate)
+        finally:
+            txt_file.unlink(missing_ok=True)
+        return
+    run_ccfindersw(args, xmx=xmx)
+    cmd = [str(CCFINDERSWPARSER), "-i", str(txt_file), "-o", str(json_dest)]
+    subprocess.run(cmd, check=True)
+    if relocate is not None:
+        relocate_clones_json(json_dest, Path(directory), Path(path_base))
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+# クローン片の行: "\t<ファイル ID>:<開始行>,<開始列> - <終了行>,<終了列>"
+FRAGMENT_LINE = re.compile(r"^\t(\d+):(\d+),(\d+) - (\d+),(\d+)")
+
+
+class CCFSWFormatError(ValueError):
+    """CCFinderSW の出力として解釈できない。"""
+
+
+def iter_records(lines: Iterable[str]) -> Iterator[tuple[str, dict]]:
+    """CCFinderSW の -ccfsw set 形式の出力を 1 行ずつ解析し、レコードを順に返す。
+
+    #source_files の各行から ("file", {"file_id", "file_path", "loc"}) を、
+    #clone_sets の各クローンセットから ("clone_set", {"clone_id", "fragments"}) を返す。
+    レコードの形は ccfindersw-parser が出力する JSON の file_data / clone_sets の要素と同じ。
+    #clone_sets を最後まで読めなかった出力（セクションがない、最後の行が改行で終わっていない、
+    フラグメントが 2 つ未満のクローンセットがある、解釈できない行がある）は CCFSWFormatError にする。
+    最後のクローンセットを返した後に送出されるので、受け取る側は全て読み終えるまで結果を確定させないこと。
+    """
+    section = None
+    seen_source_files = False
+    seen_clone_sets = False
+    current = None
+    line = ""
+    for line in lines:
+        text = line.rstrip("\r\n")
+        if text.startswith("#"):
+            if current is not None:
+                _check_clone_set(current)
+                yield "clone_set", current
+                current = None
+            section = text[1:].strip()
+            seen_source_files = seen_source_files or section == "source_files"
+            seen_clone_sets = seen_clone_sets or section == "clone_sets"
+            continue
+        if section == "source_files":
+            fields = text.split("\t", 3)
+            if len(fields) != 4 or not fields[0].isdigit():
+                continue
+            file_id, loc, _tokens, file_path = fields
+            yield "file", {"file_id": int(file_id), "file_path": file_path, "loc": int(loc)}
+        elif section == "clone_sets":
+            if text.startswith("cloneID:"):
+                if current is not None:
+                    _check_clone_set(current)
+                    yield "clone_set", current
+                current = {"clone_id": int(text[len("cloneID:"):]), "fragments": []}
+                continue
+            if not text.strip():
+                continue
+            match = FRAGMENT_LINE.match(text)
+            if match is None or current is None:
+                raise CCFSWFormatError(f"#clone_sets の行を解釈できません: {text!r}")
+            file_id, start_line, start_col, end_line, end_col = map(int, match.groups())
+            current["fragments"].append(
+                {"file_id": file_id, "start_line": start_line, "start_col": start_col, "end_line": end_line, "end_col": end_col}
+            )
+    if not seen_source_files:
+        raise CCFSWFormatError("#source_files がありません（CCFinderSW の出力が空か途中で途切れています）．")
+    if not seen_clone_sets:
+        raise CCFSWFormatError("#clone_sets がありません（CCFinderSW の出力が途中で途切れています）．")
+    if line and not line.endswith("\n"):
+        raise CCFSWFormatError("最後の行が改行で終わっていません（CCFinderSW の出力が途中で途切れています）．")
+    if current is not None:
+        _check_clone_set(current)
+        yield "clone_set", current
+
+
+def _check_clone_set(clone_set: dict) -> None:
+    if len(clone_set["fragments"]) < 2:
+        raise CCFSWFormatError(f"クローンセット {clone_set['clone_id']} のフラグメントが 2 つ未満です（出力が途中で途切れています）．")
+
+
+def write_clones_json(records: Iterable[tuple[str, dict]], json_dest: Path, relocate: tuple[str, str] | None = None) -> tuple[int, int]:
+    """iter_records のレコードを clones_json（インデントなし）として逐次書き出し、(ファイル数, クローンセット数) を返す。
+
+    relocate = (元の接頭辞, 新しい接頭辞) を指定した場合、file_path の接頭辞を書き換える。
+    書き出しは一時ファイルに行い、最後まで書けた場合だけ json_dest に置き換える。
+    """
+    json_dest.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = json_dest.with_name(json_dest.name + ".tmp")
+    file_count = 0
+    clone_set_count = 0
+    try:
+        with open(temp_file, "w") as f:
+            f.write('{"file_data": [')
+            in_clone_sets = False
+            for kind, record in records:
+                if kind == "file":
+                    if in_clone_sets:
+                        raise CCFSWFormatError("#clone_sets の後に #source_files のファイルがあります．")
+                    if relocate is not None and record["file_path"].startswith(relocate[0]):
+                        record["file_path"] = relocate[1] + record["file_path"][len(relocate[0]):]
+                    if file_count > 0:
+                        f.write(", ")
+                    json.dump(record, f)
+                    file_count += 1
+                else:
+                    if not in_clone_sets:
+                        f.write('], "clone_sets": [')
+                        in_clone_sets = True
+                    if clone_set_count > 0:
+                        f.write(", ")
+                    json.dump(record, f)
+                    clone_set_count += 1
+            f.write("]}" if in_clone_sets else '], "clone_sets": []}')
+        os.replace(temp_file, json_dest)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+    return file_count, clone_set_count
+
+
+def convert_file(txt_file: Path, json_dest: Path, relocate: tuple[str, str] | None = None) -> tuple[int, int]:
+    """CCFinderSW の出力（ファイルまたは名前付きパイプ）を読み、clones_json を書き出す。"""
+    with open(txt_file, "r", encoding="utf-8", errors="surrogateescape") as f:
+        return write_clones_json(iter_records(f), json_dest, relocate)
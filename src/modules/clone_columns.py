@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+# <lang>.npy の行（フラグメントごとの列）
+COLUMNS = ("clone_id", "file_id", "start_line", "start_col", "end_line", "end_col")
+FORMAT_VERSION = 1
+
+
+class CloneColumns:
+    """クローンセットのフラグメントを列（COLUMNS ごとの int32 の配列）で持つ。
+
+    フラグメントはクローンセットの順、セット内の順に並び、position 番目のクローンセット（clone_id は clone_ids[position]）の
+    フラグメントは offsets[position] から offsets[position + 1] の手前まで。index は各フラグメントのセット内の位置。
+    列指向の形式から読んだ場合、列はメモリマップをそのまま参照する。
+    """
+
+    def __init__(self, columns: np.ndarray, clone_ids: list[int], offsets: list[int]):
+        self.clone_id, self.file_id, self.start_line, self.start_col, self.end_line, self.end_col = columns
+        self.clone_ids = clone_ids
+        self.offsets = offsets
+        starts = np.asarray(offsets[:-1], dtype=np.int64)
+        self.index = np.arange(len(self.clone_id), dtype=np.int64) - np.repeat(starts, np.diff(offsets))
+
+    @classmethod
+    def from_clone_sets(cls, clone_sets: list[dict]) -> "CloneColumns":
+        """clones_json の clone_sets から作る。"""
+        return cls(*_encode_clone_sets(clone_sets))
+
+    def __len__(self) -> int:
+        return len(self.clone_id)
+
+    def key(self, row: int) -> tuple[int, int]:
+        """row 番目のフラグメントの (clone_id, セット内の位置)。"""
+        return int(self.clone_id[row]), int(self.index[row])
+
+
+def _encode_clone_sets(clone_sets: list[dict]) -> tuple[np.ndarray, list[int], list[int]]:
+    clone_ids = []
+    offsets = [0]
+    rows = []
+    for clone_set in clone_sets:
+        clone_id = clone_set["clone_id"]
+        clone_ids.append(clone_id)
+        for fragment in clone_set["fragments"]:
+            rows.append((
+                clone_id,
+                fragment["file_id"],
+                fragment["start_line"],
+                fragment["start_col"],
+                fragment["end_line"],
+                fragment["end_col"],
+            ))
+        offsets.append(len(rows))
+    wide = np.array(rows, dtype=np.int64).reshape(len(rows), len(COLUMNS))
+    if len(rows) and (wide.min() < np.iinfo(np.int32).min or wide.max() > np.iinfo(np.int32).max):
+        raise ValueError("clones_json の値が int32 の範囲を超えています．")
+    return np.ascontiguousarray(wide.T, dtype=np.int32), clone_ids, offsets
+
+
+def encode(data: dict) -> tuple[np.ndarray, dict]:
+    """clones_json の内容を、列の配列と <lang>.meta.json の内容にする。
+
+    配列は (len(COLUMNS), フラグメント数) の int32 で、フラグメントはクローンセットの順、セット内の順に並ぶ。
+    メタデータには file_data と、クローンセットごとの clone_id・先頭フラグメントの位置（offsets）を持つ。
+    """
+    columns, clone_ids, offsets = _encode_clone_sets(data["clone_sets"])
+    meta = {
+        "version": FORMAT_VERSION,
+        "columns": list(COLUMNS),
+        "fragments": columns.shape[1],
+        "file_data": data["file_data"],
+        "clone_ids": clone_ids,
+        "offsets": offsets,
+    }
+    return columns, meta
+
+
+def write(data: dict, npy_path: Path, meta_path: Path) -> None:
+    """clones_json の内容を列指向の形式で書き出す。
+
+    どちらのファイルも一時ファイルに書いてから置き換える。メタデータを後に置き換えるので、
+    途中で止まった場合はフラグメント数が合わず、read_columns の側で使われない。
+    """
+    columns, meta = encode(data)
+    npy_path.parent.mkdir(parents=True, exist_ok=True)
+    for path, dump in (
+        (npy_path, lambda f: np.save(f, columns)),
+        (meta_path, lambda f: f.write(json.dumps(meta).encode())),
+    ):
+        temp_file = path.with_name(path.name + ".tmp")
+        try:
+            with open(temp_file, "wb") as f:
+                dump(f)
+            os.replace(temp_file, path)
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+
+
+def read_meta(meta_path: Path) -> dict | None:
+    """メタデータを読む。なければ、または形式が異なれば None。"""
+    if not meta_path.exists():
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION or meta.get("columns") != list(COLUMNS):
+        return None
+    return meta
+
+
+def read_columns(npy_path: Path, meta: dict) -> CloneColumns | None:
+    """列の配列をメモリマップで開く。フラグメント数がメタデータと合わなければ None。"""
+    columns = np.load(npy_path, mmap_mode="r")
+    if columns.shape != (len(COLUMNS), meta["fragments"]):
+        return None
+    return CloneColumns(columns, meta["clone_ids"], meta["offsets"])
+
+
+def decode_clone_sets(fragments: CloneColumns) -> list[dict]:
+    """clones_json と同じ形の clone_sets を作る（形式の検証や、以前の実装との比較に使う）。"""
+    file_ids, start_lines, start_cols, end_lines, end_cols = (
+        column.tolist() for column in (fragments.file_id, fragments.start_line, fragments.start_col, fragments.end_line, fragments.end_col)
+    )
+    dicts = [
+        {"file_id": file_id, "start_line": start_line, "start_col": start_col, "end_line": end_line, "end_col": end_col}
+        for file_id, start_line, start_col, end_line, end_col in zip(file_ids, start_lines, start_cols, end_lines, end_cols)
+    ]
+    offsets = fragments.offsets
+    return [
+        {"clone_id": clone_id, "fragments": dicts[offsets[position]:offsets[position + 1]]}
+        for position, clone_id in enumerate(fragments.clone_ids)
+    ]
@@ -0,0 +1,269 @@
+import json
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from modules.util import FileMapper
+import modules.clone_columns as clone_columns
+from config import CLONE_DETECTOR, SNAPSHOT_CACHE_MAX_BYTES, SNAPSHOT_CACHE_SIZE_FACTOR
+
+# 検出器ごとの検出結果の保存先。incremental 検出器の結果は CCFinderSW の結果と一致しないので、混ざらないように分ける
+CLONES_JSON_ROOTS = {
+    "ccfindersw": project_root / "dest/clones_json",
+    "incremental": project_root / "dest/clones_json_incremental",
+}
+CLONES_JSON_ROOT = CLONES_JSON_ROOTS[CLONE_DETECTOR]
+
+_manifest_lock = threading.Lock()
+
+
+def snapshot_dir(name: str, commit_hash: str) -> Path:
+    return CLONES_JSON_ROOT / name / commit_hash
+
+
+def clones_json_path(name: str, commit_hash: str, language: str) -> Path:
+    return snapshot_dir(name, commit_hash) / f"{language}.json"
+
+
+def columnar_paths(json_path: Path) -> tuple[Path, Path]:
+    """clones_json（<lang>.json）に対応する列指向の形式のファイル（<lang>.npy, <lang>.meta.json）。"""
+    return json_path.with_suffix(".npy"), json_path.with_name(json_path.stem + ".meta.json")
+
+
+def snapshot_exists(name: str, commit_hash: str, language: str) -> bool:
+    """コミットと言語の検出結果が（clones_json か列指向の形式で）あるか。"""
+    json_path = clones_json_path(name, commit_hash, language)
+    return json_path.exists() or all(path.exists() for path in columnar_paths(json_path))
+
+
+def _snapshot_file(json_path: Path) -> Path:
+    """読み込む検出結果のファイル。clones_json があればそれ（列指向の形式に変換した後に検出し直した結果）、なければ <lang>.npy。"""
+    npy_path, _meta_path = columnar_paths(json_path)
+    if json_path.exists() or not npy_path.exists():
+        return json_path
+    return npy_path
+
+
+def write_columnar(name: str, commit_hash: str, language: str) -> bool:
+    """clones_json を列指向の形式に変換し、clones_json を削除する。clones_json がない（変換済みの）場合は何もせず False を返す。
+
+    clones_json はハードリンクで他のコミットと共有されている場合があるので、削除するのはこのコミットのパスだけ。
+    """
+    json_path = clones_json_path(name, commit_hash, language)
+    if not json_path.exists():
+        return False
+    npy_path, meta_path = columnar_paths(json_path)
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    clone_columns.write(data, npy_path, meta_path)
+    json_path.unlink()
+    return True
+
+
+def load_manifest(name: str, commit_hash: str) -> dict:
+    """スナップショットのマニフェスト（言語ごとのフィンガープリントや再利用元）を返す。"""
+    manifest_file = snapshot_dir(name, commit_hash) / "manifest.json"
+    if not manifest_file.exists():
+        return {"languages": {}}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def update_manifest(name: str, commit_hash: str, language: str, **entry) -> None:
+    """マニフェストの言語エントリを更新する。"""
+    with _manifest_lock:
+        manifest = load_manifest(name, commit_hash)
+        manifest["languages"].setdefault(language, {}).update(entry)
+        dest_dir = snapshot_dir(name, commit_hash)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        with open(dest_dir / "manifest.json", "w") as f:
+            json.dump(manifest, f)
+
+
+def get_fingerprint(name: str, commit_hash: str, language: str) -> str | None:
+    return load_manifest(name, commit_hash)["languages"].get(language, {}).get("fingerprint")
+
+
+def get_scope(name: str, commit_hash: str, language: str) -> str:
+    """検出結果の範囲（DETECTION_SCOPE）を返す。記録がない結果はリポジトリ全体を対象にしたものとみなす。"""
+    return load_manifest(name, commit_hash)["languages"].get(language, {}).get("scope", "repository")
+
+
+def get_detector(name: str, commit_hash: str, language: str) -> str:
+    """検出結果を出力した検出器（とその設定）を返す。記録がない結果は CCFinderSW で検出したものとみなす。"""
+    return load_manifest(name, commit_hash)["languages"].get(language, {}).get("detector", "ccfindersw")
+
+
+def is_language_unchanged(name: str, commit_hash: str, other_hash: str, language: str) -> bool:
+    """2 つのコミットで対象言語のファイルが同一かどうかをマニフェストから判定する。"""
+    fingerprint = get_fingerprint(name, commit_hash, language)
+    return fingerprint is not None and fingerprint == get_fingerprint(name, other_hash, language)
+
+
+def is_pair_unchanged(name: str, commit_hash: str, other_hash: str) -> bool:
+    """2 つのコミットで全ての対象言語のファイルが同一かどうかを判定する。"""
+    languages = load_manifest(name, commit_hash)["languages"].keys()
+    if not languages:
+        return False
+    return all(is_language_unchanged(name, commit_hash, other_hash, language) for language in languages)
+
+
+def _link_or_copy(src_file: Path, dest_file: Path) -> None:
+    # 異なる検出範囲の古い結果が残っている場合は置き換える
+    if dest_file.exists():
+        dest_file.unlink()
+    try:
+        os.link(src_file, dest_file)
+    except OSError:
+        shutil.copy2(src_file, dest_file)
+
+
+def link_snapshot(src_file: Path, dest_file: Path) -> None:
+    """src_file（clones_json のパス）の検出結果を、形式ごと dest_file のものとしてハードリンクする（できなければコピー）。
+
+    src_file の側にない形式のファイルは、dest_file の側の古いものを消す。
+    """
+    for src_path, dest_path in zip((src_file, *columnar_paths(src_file)), (dest_file, *columnar_paths(dest_file))):
+        if src_path.exists():
+            _link_or_copy(src_path, dest_path)
+        else:
+            dest_path.unlink(missing_ok=True)
+
+
+def reuse_snapshot(name: str, src_hash: str, dest_hash: str, language: str) -> None:
+    """src_hash の検出結果を dest_hash の結果としてハードリンクする（できなければコピー）。"""
+    dest_file = clones_json_path(name, dest_hash, language)
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    link_snapshot(clones_json_path(name, src_hash, language), dest_file)
+    src_entry = load_manifest(name, src_hash)["languages"].get(language, {})
+    update_manifest(
+        name,
+        dest_hash,
+        language,
+        reused_from=src_hash,
+        scope=src_entry.get("scope", "repository"),
+        detector=src_entry.get("detector", "ccfindersw"),
+        mode=src_entry.get("mode"),
+    )
+
+
+class CloneSnapshot:
+    """解析済みの検出結果と、そこから作る FileMapper などの派生データ。
+
+    fragments にはフラグメントを列で持つ（列指向の形式から読んだ場合は <lang>.npy のメモリマップ）。
+    キャッシュで共有されるので、file_data / fragments や派生データを書き換えてはならない。
+    """
+
+    def __init__(self, file_data: list[dict], filemap: FileMapper, size: int, fragments: clone_columns.CloneColumns):
+        self.file_data = file_data
+        self.filemap = filemap
+        self.size = size
+        self.fragments = fragments
+        self._derived: dict[str, object] = {}
+
+    def derived(self, key: str, build: Callable[["CloneSnapshot"], object]):
+        """key の派生データ（パスごとのクローン片やその索引など）を、初めて使うときに build で作って保持する。"""
+        if key not in self._derived:
+            self._derived[key] = build(self)
+        return self._derived[key]
+
+
+class SnapshotCache:
+    """検出結果の解析結果（CloneSnapshot）の LRU キャッシュ。
+
+    キーはファイル（clones_json か <lang>.npy）の (デバイス, inode, サイズ, 更新時刻) とプロジェクトのディレクトリなので、
+    書き換えられたファイルは読み直し、ハードリンクで再利用した結果は 1 つの解析結果を共有する。
+    メモリ使用量はファイルサイズ × SNAPSHOT_CACHE_SIZE_FACTOR で見積もり、合計が max_bytes を超えたら古いものから捨てる。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, CloneSnapshot] = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, path: Path, project_dir: Path) -> CloneSnapshot:
+        stat = path.stat()
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, str(project_dir))
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+        snapshot = _read_snapshot(path, project_dir, stat.st_size * SNAPSHOT_CACHE_SIZE_FACTOR)
+        if snapshot.size > self.max_bytes:
+            return snapshot
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = snapshot
+                self.current_bytes += snapshot.size
+            while self.current_bytes > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+                self.evictions += 1
+        return snapshot
+
+    def clear(self) -> None:
+        """保持している解析結果を捨て、カウンタを 0 に戻す。"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def report(self) -> str:
+        return (
+            f"snapshot cache: hit={self.hits} miss={self.misses} evicted={self.evictions} "
+            f"entries={len(self._entries)} ({self.current_bytes / 1024 / 1024:.1f} MiB estimated)"
+        )
+
+
+def _read_snapshot(path: Path, project_dir: Path, size: int) -> CloneSnapshot:
+    if path.suffix == ".npy":
+        meta = clone_columns.read_meta(columnar_paths(path)[1])
+        fragments = clone_columns.read_columns(path, meta) if meta is not None else None
+        if fragments is None:
+            raise ValueError(f"{path} は列指向の形式として読み込めません．clones_json から変換し直してください．")
+        return CloneSnapshot(meta["file_data"], FileMapper(meta["file_data"], str(project_dir)), size, fragments)
+    with open(path, "r") as f:
+        data = json.load(f)
+    fragments = clone_columns.CloneColumns.from_clone_sets(data["clone_sets"])
+    return CloneSnapshot(data["file_data"], FileMapper(data["file_data"], str(project_dir)), size, fragments)
+
+
+_snapshot_cache = SnapshotCache(SNAPSHOT_CACHE_MAX_BYTES)
+
+
+def snapshot_cache() -> SnapshotCache:
+    """このプロセスで共有する SnapshotCache。"""
+    return _snapshot_cache
+
+
+def load_snapshot(name: str, commit_hash: str, language: str) -> CloneSnapshot:
+    """コミットと言語の検出結果を、このプロセスで共有するキャッシュを通して読み込む。
+
+    clones_json があればそれを、なければ列指向の形式（write_columnar で変換したもの）を読む。
+    """
+    path = _snapshot_file(clones_json_path(name, commit_hash, language))
+    return _snapshot_cache.load(path, project_root / "dest/projects" / name)
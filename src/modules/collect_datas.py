@@ -1,10 +1,10 @@
 from pathlib import Path
+import os
 import sys
-import subprocess
 import git
 import traceback
 import json
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 def _find_repo_root(start: Path) -> Path:
     for parent in [start] + list(start.parents):
@@ -17,139 +17,240 @@ project_root = _find_repo_root(Path(__file__).resolve())
 sys.path.append(str(project_root))
 sys.path.append(str(project_root / "src"))
 from modules.github_linguist import get_exts
-from config import (
-    ANTLR_LANGUAGE,
-    CCFINDERSW_JAR,
-    CCFINDERSWPARSER,
-    CCFINDERSW_JAVA_XMX,
-    CCFINDERSW_JAVA_XSS,
-)
-
-
-def parse_diff_str(diff: str) -> Optional[Tuple[list[str], int, int]]:
-    """diff 文字列からハンク行と開始行番号を抽出する。"""
-    diff_at_split = diff.split("@@")
-    if len(diff_at_split) < 3:
-        return None
+from modules.worktree_pool import WorktreePool
+from modules.ccfindersw import CCFinderSWOutOfMemoryError, detect_to_json
+from modules.sharded_detection import detect_sharded
+from modules.language_fingerprint import compute_language_fingerprints
+import modules.incremental_detector as incremental_detector
+import modules.clone_store as clone_store
+import modules.snapshot as snapshot
+import modules.diff_engine as diff_engine
+import modules.overlapped_pipeline as overlapped_pipeline
+import modules.artifact_store as artifact_store
+import modules.artifact_gc as artifact_gc
+from modules.file_dedup import expand_clones_json
+from modules.detection_scope import service_prefixes
+from config import COLLECT_PIPELINE, COLLECT_PIPELINE_QUEUE_SIZE, CLONE_DETECTION_SHARDING, CLONE_SNAPSHOT_FORMAT, CLONE_DETECTION_SOURCE, CLONE_DETECTOR, DEDUPLICATE_IDENTICAL_FILES, DETECTION_SCOPE
+
+# マニフェストに記録する検出器。異なる検出器の結果が残っている言語は検出し直す
+CONFIGURED_DETECTOR = incremental_detector.DETECTOR_ID if CLONE_DETECTOR == "incremental" else "ccfindersw"
+
+
+def find_moving_lines(commit: git.Commit, prev: git.Commit, name: str, is_relevant=None) -> tuple[int, int]:
+    """2 つのコミット間で追加・削除・変更された行を収集して保存する。
+
+    is_relevant（リポジトリ相対パス -> bool）を指定した場合は、それに当てはまるファイルだけ差分を取る。
+    戻り値は (差分を取らなかったファイル数, そのファイルの blob の合計バイト数)。
+    """
+    # 対象言語のファイルがどれも変わっていなければ差分は不要
+    if clone_store.is_pair_unchanged(name, commit.hexsha, prev.hexsha):
+        return 0, 0
+    repo_dir = Path(commit.repo.working_dir)
+    dest_file = project_root / "dest/moving_lines" / name / f"{commit.hexsha}-{prev.hexsha}.json"
+    if is_relevant is None:
+        diff_engine.write_moving_lines(repo_dir, prev.hexsha, commit.hexsha, dest_file)
+        return 0, 0
+    paths, skipped_files, skipped_bytes = diff_engine.select_diff_paths(repo_dir, prev.hexsha, commit.hexsha, is_relevant)
+    diff_engine.write_moving_lines(repo_dir, prev.hexsha, commit.hexsha, dest_file, paths)
+    return skipped_files, skipped_bytes
+
+
+def _load_clone_file_paths(name: str, commit_hash: str, languages) -> set[str] | None:
+    """コミットの検出結果に含まれるファイルのリポジトリ相対パスを返す。どれかの言語の結果がなければ None。"""
+    paths = set()
+    for language in languages:
+        if not clone_store.snapshot_exists(name, commit_hash, language):
+            return None
+        paths.update(clone_store.load_snapshot(name, commit_hash, language).filemap.path_to_id)
+    return paths
+
+
+def _diff_path_filter(all_exts: set[str], child_paths: set[str] | None, parent_paths: set[str] | None):
+    """差分を取るファイルの判定関数を返す。
+
+    両方のコミットの clones_json があればそこに含まれるファイル（analyze_cc の FileMapper に載るファイル）だけ、
+    なければ対象言語の拡張子のファイルを対象にする。
+    """
+    if child_paths is not None and parent_paths is not None:
+        paths = child_paths | parent_paths
+        return lambda path: path in paths
+    return lambda path: os.path.splitext(path)[1].replace(".", "") in all_exts - {""}
+
+
+# ヒープ不足になった (プロジェクト, 言語)。以降のコミットは最初からシャードに分けて検出する
+_sharded_languages: set[tuple[str, str]] = set()
+
+
+def detect_cc(
+    project: Path,
+    name: str,
+    language: str,
+    commit_hash: str,
+    exts: tuple[str],
+    path_base: Path | None = None,
+    prefixes: tuple[str] | None = None,
+    codebases: tuple[str] | None = None,
+):
+    """対象言語とコミットで CC-Finder SW を実行し、結果を保存する。
+
+    path_base を指定した場合、出力の file_path を path_base 基準に書き換える（worktree 上で検出した場合など）。
+    prefixes は incremental 検出器で対象にするパスの接頭辞（CCFinderSW では展開するスナップショット側で絞り込む）。
+    codebases はサービスのコードベース。CCFinderSW がヒープ不足で終了した場合などに、これを単位に分割して検出する。
+    どちらで検出したかはマニフェストの mode（"whole" / "sharded"）に記録する。
+    """
     try:
-        hunk_range_split = diff_at_split[1].replace("+", "").replace("-", "").split(" ")
-        hunk_range_old = hunk_range_split[1]
-        hunk_range_new = hunk_range_split[2]
-        old_line_count = int(hunk_range_old.split(",")[0])
-        new_line_count = int(hunk_range_new.split(",")[0])
-    except (IndexError, ValueError):
-        return None
-    hunk_lines = diff_at_split[2].split("\n")
-    return hunk_lines, old_line_count, new_line_count
-
-
-def find_moving_lines(commit: git.Commit, prev: git.Commit, name: str):
-    """2 つのコミット間で追加・削除・変更された行を収集して保存する。"""
-    diff_hunks = prev.diff(commit, create_patch=True)
-    output_result = []
-    for diff_hunk in diff_hunks:
-        if diff_hunk.diff:
-            child_path = diff_hunk.b_path
-            parent_path = diff_hunk.a_path
-            try:
-                result = parse_diff_str(diff_hunk.diff.decode("utf-8"))
-                if result is None:
-                    continue
-            except UnicodeDecodeError:
-                print(f"diff.diff.decode('utf-8')のデコードに失敗しました．")
-                print(diff_hunk.diff)
-                continue
-            hunk, old_file_line_count, new_file_line_count = result
-            potential_inserted_lines: list[int] = []
-            potential_deleted_lines: list[int] = []
-            for line in hunk:
-                if line.startswith("+"):
-                    potential_inserted_lines.append(new_file_line_count)
-                    new_file_line_count += 1
-                elif line.startswith("-"):
-                    potential_deleted_lines.append(old_file_line_count)
-                    old_file_line_count += 1
-                else:
-                    old_file_line_count += 1
-                    new_file_line_count += 1
-            inserted_lines = []
-            deleted_lines = []
-            modified_lines = []
-            for inserted_line in potential_inserted_lines:
-                if inserted_line not in potential_deleted_lines:
-                    inserted_lines.append(inserted_line)
-                else:
-                    modified_lines.append(inserted_line)
-            for deleted_line in potential_deleted_lines:
-                if deleted_line not in potential_inserted_lines:
-                    deleted_lines.append(deleted_line)
-            output_result.append(
-                {
-                    "child_path": child_path,
-                    "parent_path": parent_path,
-                    "inserted_lines": inserted_lines,
-                    "deleted_lines": deleted_lines,
-                    "modified_lines": modified_lines,
-                }
+        if CLONE_DETECTOR == "incremental":
+            # git のオブジェクトから直接読むので、作業ツリーの状態には依存しない
+            json_dest_file = clone_store.clones_json_path(name, commit_hash, language)
+            incremental_detector.detect_to_file(
+                project, commit_hash, language, exts, json_dest_file, path_base=path_base or project, prefixes=prefixes
             )
-    if output_result:
-        dest_dir = project_root / "dest/moving_lines" / name
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        dest_file = dest_dir / f"{commit.hexsha}-{prev.hexsha}.json"
-        with open(dest_file, "w") as f:
-            json.dump(output_result, f)
-
-
-def convert_language_for_ccfindersw(language: str) -> str:
-    match language:
-        case "C++":
-            return "cpp"
-        case "C#":
-            return "csharp"
-        case _:
-            return language.lower()
-
-
-def detect_cc(project: Path, name: str, language: str, commit_hash: str, exts: tuple[str]):
-    """対象言語とコミットで CC-Finder SW を実行し、結果を保存する。"""
-    try:
-        dest_dir = project_root / "dest/temp/ccfswtxt" / name / commit_hash
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        dest_file = dest_dir / language
-        language_arg = convert_language_for_ccfindersw(language)
-        base_cmd = [
-            "java",
-            f"-Xmx{CCFINDERSW_JAVA_XMX}",
-            f"-Xss{CCFINDERSW_JAVA_XSS}",
-            "-jar",
-            str(CCFINDERSW_JAR),
-            "D",
-            "-d",
-            str(project),
-            "-l",
-            language_arg,
-            "-o",
-            str(dest_file),
-        ]
-        if language in ANTLR_LANGUAGE:
-            cmd = [*base_cmd, "-antlr", "|".join(exts), "-w", "2", "-ccfsw", "set"]
-        else:
-            cmd = [*base_cmd, "-w", "2", "-ccfsw", "set"]
-        subprocess.run(cmd, check=True)
-        
-        json_dest_dir = project_root / "dest/clones_json" / name / commit_hash
-        json_dest_dir.mkdir(parents=True, exist_ok=True)
-        json_dest_file = json_dest_dir / f"{language}.json"
-        cmd = [str(CCFINDERSWPARSER), "-i", str(f"{dest_file}_ccfsw.txt"), "-o", str(json_dest_file)]
-        subprocess.run(cmd, check=True)
+            clone_store.update_manifest(name, commit_hash, language, scope=DETECTION_SCOPE, detector=CONFIGURED_DETECTOR, mode="whole")
+            return
+        json_dest_file = clone_store.clones_json_path(name, commit_hash, language)
+        can_shard = CLONE_DETECTION_SHARDING != "never" and codebases is not None and len(codebases) >= 1
+        if can_shard and (CLONE_DETECTION_SHARDING == "always" or (name, language) in _sharded_languages):
+            detect_sharded(Path(project), name, language, commit_hash, exts, codebases, json_dest_file, Path(path_base or project))
+            clone_store.update_manifest(name, commit_hash, language, scope=DETECTION_SCOPE, detector=CONFIGURED_DETECTOR, mode="sharded")
+            return
+        dest_file = project_root / "dest/temp/ccfswtxt" / name / commit_hash / language
+        try:
+            detect_to_json(Path(project), language, exts, dest_file, json_dest_file, path_base=path_base)
+        except CCFinderSWOutOfMemoryError:
+            if not can_shard:
+                raise
+            print(f"CCFinderSW がヒープ不足で終了したため，{name} の {language} をコードベースごとに分割して検出します．")
+            _sharded_languages.add((name, language))
+            detect_sharded(Path(project), name, language, commit_hash, exts, codebases, json_dest_file, Path(path_base or project))
+            clone_store.update_manifest(name, commit_hash, language, scope=DETECTION_SCOPE, detector=CONFIGURED_DETECTOR, mode="sharded")
+            return
+        clone_store.update_manifest(name, commit_hash, language, scope=DETECTION_SCOPE, detector=CONFIGURED_DETECTOR, mode="whole")
     except Exception as e:
         print("CCFinderの実行に失敗しました．")
         print(traceback.format_exc())
         raise e
 
 
-def collect_datas_of_repo(project: dict):
-    """対象コミットに対してコードクローンと変更行情報を収集する。"""
+def _find_missing_languages(name: str, commit_hash: str, languages) -> list[str]:
+    """検出結果がない、または現在の DETECTION_SCOPE と異なる範囲か、設定と異なる検出器で検出された言語を返す。"""
+    missing_languages = []
+    for language in languages:
+        if (
+            not clone_store.snapshot_exists(name, commit_hash, language)
+            or clone_store.get_scope(name, commit_hash, language) != DETECTION_SCOPE
+            or clone_store.get_detector(name, commit_hash, language) != CONFIGURED_DETECTOR
+        ):
+            missing_languages.append(language)
+    return missing_languages
+
+
+def _plan_clone_detection(name: str, analyzed_commit_hashes: list[str], languages, fingerprints: dict[str, dict[str, str]]):
+    """検出が必要な言語と、直前の対象コミットの結果を再利用できる言語をコミットごとに決める。
+
+    対象言語のファイル（パスと blob SHA）が直前の対象コミットと同一であれば、CCFinderSW は実行せずに結果を再利用する。
+    """
+    detections: dict[str, list[str]] = {}
+    reuses: dict[str, list[tuple[str, str]]] = {}
+    prev_hash = None
+    for commit_hash in analyzed_commit_hashes:
+        for language in _find_missing_languages(name, commit_hash, languages):
+            if prev_hash is not None and fingerprints[prev_hash][language] == fingerprints[commit_hash][language]:
+                reuses.setdefault(commit_hash, []).append((language, prev_hash))
+            else:
+                detections.setdefault(commit_hash, []).append(language)
+        prev_hash = commit_hash
+    return detections, reuses
+
+
+def _detect_commits_in_parallel(
+    project_dir: Path,
+    name: str,
+    detections: dict[str, list[str]],
+    exts: dict,
+    codebases: dict[str, tuple[str]],
+    jobs: int,
+):
+    """git worktree を jobs 個用意し、コミットごとのクローン検出を並列に実行する。"""
+    if not detections:
+        return
+
+    def detect_commit(commit_hash: str, missing_languages: list[str]):
+        with pool.checkout(commit_hash) as worktree:
+            print(f"checkout to {commit_hash} in {worktree.name}...")
+            for language in missing_languages:
+                detect_cc(
+                    worktree, name, language, commit_hash, exts.get(language, ()), path_base=project_dir, codebases=codebases[language]
+                )
+
+    with WorktreePool(project_dir, name, min(jobs, len(detections))) as pool:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = [executor.submit(detect_commit, commit_hash, missing_languages) for commit_hash, missing_languages in detections.items()]
+            for future in futures:
+                future.result()
+
+
+def _detect_commits_from_snapshots(
+    project_dir: Path,
+    name: str,
+    detections: dict[str, list[str]],
+    exts: dict,
+    prefixes: dict[str, tuple[str] | None],
+    codebases: dict[str, tuple[str]],
+    jobs: int,
+):
+    """対象言語のファイルだけをスナップショットとして展開し、コミットごとのクローン検出を実行する。
+
+    project_dir のチェックアウトは行わない。jobs が 2 以上の場合はコミット単位で並列に実行する。
+    DEDUPLICATE_IDENTICAL_FILES が有効な場合、内容が同一のファイルは代表の 1 つだけを検出し、
+    代表ファイルのクローン片と、重複ファイル同士のファイル全体のクローンセットを書き戻す。
+    """
+    if not detections:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(detections))) as executor:
+        futures = [
+            executor.submit(_detect_commit_from_snapshot, project_dir, name, commit_hash, missing_languages, exts, prefixes, codebases)
+            for commit_hash, missing_languages in detections.items()
+        ]
+        for future in futures:
+            future.result()
+
+
+def _detect_commit_from_snapshot(
+    project_dir: Path,
+    name: str,
+    commit_hash: str,
+    missing_languages: list[str],
+    exts: dict,
+    prefixes: dict[str, tuple[str] | None],
+    codebases: dict[str, tuple[str]],
+):
+    """1 コミットの対象言語のファイルをスナップショットとして展開し、クローン検出を実行する。"""
+    snapshot_exts = {language: exts.get(language, ()) for language in missing_languages}
+    with snapshot.materialize(
+        project_dir, name, commit_hash, snapshot_exts, prefixes, deduplicate=DEDUPLICATE_IDENTICAL_FILES
+    ) as (snapshot_dir, duplicates):
+        for language in missing_languages:
+            detect_cc(
+                snapshot_dir, name, language, commit_hash, exts.get(language, ()), path_base=project_dir, codebases=codebases[language]
+            )
+            if not duplicates:
+                continue
+            json_file = clone_store.clones_json_path(name, commit_hash, language)
+            duplicate_files, skipped_tokens = expand_clones_json(json_file, duplicates, snapshot_dir, project_dir, language)
+            print(f"dedup {commit_hash} ({language}): {duplicate_files} duplicate files, {skipped_tokens} tokens skipped")
+            clone_store.update_manifest(
+                name, commit_hash, language, deduplicated_files=duplicate_files, deduplicated_tokens=skipped_tokens
+            )
+
+
+def collect_datas_of_repo(project: dict, jobs: int = 1) -> bool:
+    """対象コミットに対してコードクローンと変更行情報を収集する。失敗した場合は内容を表示して False を返す。
+
+    CLONE_DETECTION_SOURCE が "snapshot" の場合（または DETECTION_SCOPE が "services" の場合、
+    DEDUPLICATE_IDENTICAL_FILES が有効な場合）は対象言語のファイルだけを展開して検出し、作業ツリーは変更しない。
+    "checkout" の場合は jobs が 2 以上なら git worktree を使ってコミットごとのクローン検出を並列に実行する。
+    """
     url = project["URL"]
     # リポジトリの識別子とプロジェクトディレクトリの設定
     name = url.split('/')[-2] + '.' + url.split('/')[-1]
@@ -167,32 +268,108 @@ def collect_datas_of_repo(project: dict):
     with open(analyzed_commits_path, "r") as f:
         analyzed_commit_hashes = json.load(f)
     hcommit = git_repo.commit(analyzed_commit_hashes[0])
+    # incremental 検出器は git のオブジェクトを直接読むので、展開もチェックアウトも不要
+    # 重複ファイルの除外は展開時に行うので、DEDUPLICATE_IDENTICAL_FILES が有効ならスナップショットから検出する
+    use_snapshot = CLONE_DETECTOR != "incremental" and (
+        CLONE_DETECTION_SOURCE == "snapshot" or DETECTION_SCOPE == "services" or DEDUPLICATE_IDENTICAL_FILES
+    )
+    use_checkout = CLONE_DETECTOR != "incremental" and not use_snapshot
     try:
-        prev_commit = hcommit
+        # 言語ごとのファイル構成のフィンガープリントを記録（未変更の言語の検出・差分解析を省略するため）
+        language_exts = {language: exts.get(language, ()) for language in languages}
+        # DETECTION_SCOPE が "services" の場合は言語ごとのサービスのコンテキスト配下だけを対象にする
+        language_prefixes = {language: service_prefixes(project, language) for language in languages}
+        # ヒープ不足時の分割検出の単位
+        language_codebases = {language: tuple(project["languages"][language].keys()) for language in languages}
+        fingerprints = {}
         for commit_hash in analyzed_commit_hashes:
-            missing_languages = []
-            for language in languages:
-                clones_json = project_root / "dest/clones_json" / name / commit_hash / f"{language}.json"
-                if not clones_json.exists():
-                    missing_languages.append(language)
-            if missing_languages:
+            fingerprints[commit_hash] = compute_language_fingerprints(project_dir, commit_hash, language_exts, language_prefixes)
+            for language, fingerprint in fingerprints[commit_hash].items():
+                clone_store.update_manifest(name, commit_hash, language, fingerprint=fingerprint)
+        detections, reuses = _plan_clone_detection(name, analyzed_commit_hashes, languages, fingerprints)
+        all_exts = {ext for language in languages for ext in language_exts[language]}
+        clone_file_paths: dict[str, set[str] | None] = {}
+        diff_skipped = [0, 0]
+
+        def detect_commit(commit_hash: str):
+            if commit_hash not in detections:
+                return
+            if use_snapshot:
+                _detect_commit_from_snapshot(
+                    project_dir, name, commit_hash, detections[commit_hash], language_exts, language_prefixes, language_codebases
+                )
+                return
+            if use_checkout:
                 print(f"checkout to {commit_hash}...")
                 git_repo.git.checkout(commit_hash)
-                for language in missing_languages:
-                    detect_cc(project_dir, name, language, commit_hash, exts[language])
-            else:
+            for language in detections[commit_hash]:
+                detect_cc(
+                    project_dir,
+                    name,
+                    language,
+                    commit_hash,
+                    language_exts[language],
+                    prefixes=language_prefixes[language],
+                    codebases=language_codebases[language],
+                )
+
+        def reuse_detections(commit_hash: str):
+            for language, src_hash in reuses.get(commit_hash, []):
+                print(f"reuse clone detection of {src_hash} for {commit_hash} ({language} unchanged)")
+                clone_store.reuse_snapshot(name, src_hash, commit_hash, language)
+            if CLONE_SNAPSHOT_FORMAT == "columnar":
+                for language in languages:
+                    clone_store.write_columnar(name, commit_hash, language)
+            if commit_hash not in detections and commit_hash not in reuses:
                 print(f"skip clone detection for {commit_hash} (already detected)")
-            if commit_hash == hcommit.hexsha:
-                continue
+
+        def diff_commits(commit_hash: str, prev_hash: str):
             commit = git_repo.commit(commit_hash)
+            prev_commit = git_repo.commit(prev_hash)
             moving_lines_file = project_root / "dest/moving_lines" / name / f"{commit.hexsha}-{prev_commit.hexsha}.json"
-            if not moving_lines_file.exists():
+            if not artifact_store.exists(moving_lines_file):
+                for target_hash in (commit.hexsha, prev_commit.hexsha):
+                    if target_hash not in clone_file_paths:
+                        clone_file_paths[target_hash] = _load_clone_file_paths(name, target_hash, languages)
+                is_relevant = _diff_path_filter(all_exts, clone_file_paths[prev_commit.hexsha], clone_file_paths[commit.hexsha])
                 # 修正を保存
-                find_moving_lines(commit, prev_commit, name)
-            prev_commit = commit
+                skipped_files, skipped_bytes = find_moving_lines(commit, prev_commit, name, is_relevant)
+                diff_skipped[0] += skipped_files
+                diff_skipped[1] += skipped_bytes
+            # 次のペアでは使わない
+            clone_file_paths.pop(prev_commit.hexsha, None)
+
+        if COLLECT_PIPELINE and not use_checkout:
+            # コミット N とその直前のコミットの差分を取っている間に、コミット N+1 の検出を進める
+            detect_jobs = 1 if CLONE_DETECTOR == "incremental" else jobs
+            times = overlapped_pipeline.run(
+                analyzed_commit_hashes, detect_commit, reuse_detections, diff_commits, detect_jobs, COLLECT_PIPELINE_QUEUE_SIZE
+            )
+            print(times.report())
+        else:
+            detect_in_loop = CLONE_DETECTOR == "incremental" or (use_checkout and jobs <= 1)
+            if use_snapshot:
+                _detect_commits_from_snapshots(project_dir, name, detections, language_exts, language_prefixes, language_codebases, jobs)
+            elif use_checkout and jobs > 1:
+                _detect_commits_in_parallel(project_dir, name, detections, exts, language_codebases, jobs)
+            prev_hash = None
+            for commit_hash in analyzed_commit_hashes:
+                if detect_in_loop:
+                    detect_commit(commit_hash)
+                reuse_detections(commit_hash)
+                if prev_hash is not None:
+                    diff_commits(commit_hash, prev_hash)
+                prev_hash = commit_hash
+        print(f"diff: skipped {diff_skipped[0]} irrelevant files ({diff_skipped[1] / 1024 / 1024:.1f} MiB of blobs not diffed)")
     except Exception as e:
         print(traceback.format_exc())
         print(e)
+        return False
+    else:
+        # 全てのコミットの組の moving_lines が揃った場合だけ、gc で削除した記録を消す
+        artifact_gc.mark_regenerated(name, "moving_lines")
+        return True
     finally:
-        print("checkout to latest commit...")
-        git_repo.git.checkout(hcommit.hexsha)
+        if use_checkout:
+            print("checkout to latest commit...")
+            git_repo.git.checkout(hcommit.hexsha)
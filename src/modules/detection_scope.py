@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from config import DETECTION_SCOPE
+
+
+def service_prefixes(project: dict, language: str) -> tuple[str, ...] | None:
+    """クローン検出の対象とするパスの接頭辞（サービスのコンテキスト）を返す。
+
+    DETECTION_SCOPE が "repository" の場合はリポジトリ全体が対象なので None を返す。
+    """
+    if DETECTION_SCOPE != "services":
+        return None
+    return tuple(project["languages"][language].keys())
+
+
+def in_scope(path: str, prefixes: tuple[str, ...] | None) -> bool:
+    """リポジトリルートからの相対パスが検出対象に含まれるかどうか。
+
+    後段（get_codeclones_classified_by_type など）のサービス判定と同じく、接頭辞の前方一致で判定する。
+    """
+    if prefixes is None:
+        return True
+    return any(path.startswith(prefix) for prefix in prefixes)
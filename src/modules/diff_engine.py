@@ -0,0 +1,256 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+import modules.moving_lines as moving_lines
+import modules.artifact_store as artifact_store
+from modules.git_objects import object_sizes
+
+# 1 回の git diff に渡すパスの上限（コマンドラインの長さ制限を避けるため）
+PATHSPEC_BATCH_SIZE = 500
+NULL_HASH = "0" * 40
+HUNK_HEADER = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_ESCAPES = {b"a": b"\a", b"b": b"\b", b"t": b"\t", b"n": b"\n", b"v": b"\v", b"f": b"\f", b"r": b"\r", b'"': b'"', b"\\": b"\\"}
+
+
+def _unquote(path: bytes) -> bytes:
+    """git が C 形式でクオートしたパス（"a\\tb" など）を元に戻す。"""
+    if not (path.startswith(b'"') and path.endswith(b'"')):
+        return path
+    body = path[1:-1]
+    result = bytearray()
+    index = 0
+    while index < len(body):
+        char = body[index:index + 1]
+        if char != b"\\":
+            result += char
+            index += 1
+            continue
+        escaped = body[index + 1:index + 2]
+        if escaped.isdigit():
+            result.append(int(body[index + 1:index + 4], 8))
+            index += 4
+        else:
+            result += _ESCAPES.get(escaped, escaped)
+            index += 2
+    return bytes(result)
+
+
+def _header_path(line: bytes, side: bytes) -> str | None:
+    """"--- a/path" / "+++ b/path" の行からパスを取り出す。/dev/null の場合は None。"""
+    path = _unquote(line[4:].rstrip(b"\n").split(b"\t")[0])
+    if path == b"/dev/null":
+        return None
+    if path.startswith(side + b"/"):
+        path = path[2:]
+    return path.decode("utf-8", errors="surrogateescape")
+
+
+def _subtract(start: int, count: int, overlap_start: int, overlap_end: int) -> list[list[int]]:
+    # [start, start + count) から [overlap_start, overlap_end) を除いた区間
+    end = start + count
+    if overlap_start >= overlap_end:
+        return [[start, count]] if count > 0 else []
+    ranges = []
+    if start < overlap_start:
+        ranges.append([start, min(end, overlap_start) - start])
+    if overlap_end < end:
+        ranges.append([max(start, overlap_end), end - max(start, overlap_end)])
+    return ranges
+
+
+def split_hunk(old_start: int, old_count: int, new_start: int, new_count: int) -> tuple[list[list[int]], list[list[int]], list[list[int]]]:
+    """ハンクの行範囲を (追加行, 削除行, 変更行) の [開始行, 行数] の区間に分ける。
+
+    新旧で同じ行番号が両方の範囲に含まれる行を変更行とし、残りをそれぞれ追加行・削除行とする。
+    """
+    overlap_start = max(old_start, new_start)
+    overlap_end = min(old_start + old_count, new_start + new_count)
+    inserted = _subtract(new_start, new_count, overlap_start, overlap_end)
+    deleted = _subtract(old_start, old_count, overlap_start, overlap_end)
+    modified = [[overlap_start, overlap_end - overlap_start]] if overlap_start < overlap_end else []
+    return inserted, deleted, modified
+
+
+def list_changed_files(repo_dir: Path, src_hash: str, dest_hash: str) -> list[tuple[str, str, list[str]]]:
+    """git diff --raw で変更されたファイルを (src 側の blob, dest 側の blob, パス) の一覧で返す。
+
+    リネーム・コピーの場合、パスは [src 側, dest 側] の 2 つになる。パッチは生成しないので軽い。
+    """
+    output = subprocess.run(
+        ["git", "diff", "--raw", "-z", "--no-abbrev", "-M", src_hash, dest_hash],
+        cwd=str(repo_dir),
+        capture_output=True,
+        check=True,
+    ).stdout
+    fields = output.split(b"\0")
+    changes = []
+    index = 0
+    while index < len(fields) and fields[index].startswith(b":"):
+        _src_mode, _dest_mode, src_blob, dest_blob, status = fields[index][1:].split(b" ")
+        path_count = 2 if status[:1] in (b"R", b"C") else 1
+        paths = [path.decode("utf-8", errors="surrogateescape") for path in fields[index + 1:index + 1 + path_count]]
+        changes.append((src_blob.decode(), dest_blob.decode(), paths))
+        index += 1 + path_count
+    return changes
+
+
+def blob_sizes(repo_dir: Path, blob_hashes) -> int:
+    """blob の合計サイズ（バイト）を返す。"""
+    blob_hashes = [blob_hash for blob_hash in blob_hashes if blob_hash != NULL_HASH]
+    sizes = object_sizes(repo_dir, blob_hashes)
+    return sum(sizes.get(blob_hash, 0) for blob_hash in blob_hashes)
+
+
+def select_diff_paths(
+    repo_dir: Path, src_hash: str, dest_hash: str, is_relevant: Callable[[str], bool]
+) -> tuple[list[list[str]], int, int]:
+    """差分を取る必要があるパスを選ぶ。
+
+    is_relevant がどちらかのパスで真になる変更だけを残す。戻り値は
+    (変更ごとのパスのリスト, 除外したファイル数, 除外したファイルの blob の合計バイト数)。
+    """
+    selected = []
+    skipped_blobs = []
+    for src_blob, dest_blob, paths in list_changed_files(repo_dir, src_hash, dest_hash):
+        if any(is_relevant(path) for path in paths):
+            selected.append(paths)
+        else:
+            skipped_blobs.extend([src_blob, dest_blob])
+    return selected, len(skipped_blobs) // 2, blob_sizes(repo_dir, skipped_blobs)
+
+
+def iter_moving_lines(repo_dir: Path, src_hash: str, dest_hash: str, paths: list[list[str]] | None = None) -> Iterator[dict]:
+    """git diff -U0 src_hash dest_hash を流し読みし、ファイルごとの変更行を区間形式で返す。
+
+    "+" 側（dest_hash）のパスを child_path、"-" 側（src_hash）のパスを parent_path とする。
+    ハンクの本文は読み飛ばし、全てのハンクヘッダの行範囲から変更行を求める。
+    paths（select_diff_paths の結果）を指定した場合は、そのパスだけを PATHSPEC_BATCH_SIZE 件ずつ差分を取る。
+    リネームの両側のパスは同じ回に渡すので、リネームの検出結果は変わらない。
+    """
+    if paths is None:
+        yield from _iter_diff(repo_dir, src_hash, dest_hash, [])
+        return
+    batch: list[str] = []
+    for change_paths in paths:
+        batch.extend(change_paths)
+        if len(batch) >= PATHSPEC_BATCH_SIZE:
+            yield from _iter_diff(repo_dir, src_hash, dest_hash, batch)
+            batch = []
+    if batch:
+        yield from _iter_diff(repo_dir, src_hash, dest_hash, batch)
+
+
+def _iter_diff(repo_dir: Path, src_hash: str, dest_hash: str, pathspec: list[str]) -> Iterator[dict]:
+    cmd = [
+        "git",
+        "-c",
+        "core.quotepath=off",
+        "diff",
+        "--no-color",
+        "--no-ext-diff",
+        "-M",
+        "-U0",
+        "--src-prefix=a/",
+        "--dst-prefix=b/",
+        src_hash,
+        dest_hash,
+    ]
+    if pathspec:
+        # パスをパターンとして解釈させない
+        cmd = [cmd[0], "--literal-pathspecs", *cmd[1:], "--", *pathspec]
+    process = subprocess.Popen(cmd, cwd=str(repo_dir), stdout=subprocess.PIPE)
+    current = None
+    in_header = False
+    try:
+        for line in process.stdout:
+            if line.startswith(b"diff --git "):
+                if current is not None and current["has_hunk"]:
+                    yield current["entry"]
+                current = {
+                    "has_hunk": False,
+                    "entry": {
+                        "child_path": None,
+                        "parent_path": None,
+                        "inserted": [],
+                        "deleted": [],
+                        "modified": [],
+                    },
+                }
+                in_header = True
+                continue
+            if current is None:
+                continue
+            if in_header:
+                if line.startswith(b"--- "):
+                    current["entry"]["parent_path"] = _header_path(line, b"a")
+                    continue
+                if line.startswith(b"+++ "):
+                    current["entry"]["child_path"] = _header_path(line, b"b")
+                    continue
+            match = HUNK_HEADER.match(line)
+            if match is None:
+                continue
+            in_header = False
+            current["has_hunk"] = True
+            old_start, old_count, new_start, new_count = match.groups()
+            inserted, deleted, modified = split_hunk(
+                int(old_start),
+                1 if old_count is None else int(old_count),
+                int(new_start),
+                1 if new_count is None else int(new_count),
+            )
+            current["entry"]["inserted"].extend(inserted)
+            current["entry"]["deleted"].extend(deleted)
+            current["entry"]["modified"].extend(modified)
+        if current is not None and current["has_hunk"]:
+            yield current["entry"]
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def write_moving_lines(repo_dir: Path, src_hash: str, dest_hash: str, dest_file: Path, paths: list[list[str]] | None = None) -> int:
+    """変更行をファイルごとに逐次 dest_file へ書き出し、書き出したファイル数を返す。
+
+    形式は modules.moving_lines のバージョン 2（区間形式）。変更行が 1 つもない場合はファイルを作らない。
+    paths は iter_moving_lines と同じ。
+    """
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = dest_file.with_name(dest_file.name + ".tmp")
+    count = 0
+    try:
+        with open(temp_file, "w") as f:
+            f.write(f'{{"version": {moving_lines.FORMAT_VERSION}, "files": [')
+            for entry in iter_moving_lines(repo_dir, src_hash, dest_hash, paths):
+                if count > 0:
+                    f.write(", ")
+                for category in moving_lines.CATEGORIES:
+                    entry[category] = moving_lines.normalize_ranges(entry[category])
+                json.dump(entry, f)
+                count += 1
+            f.write("]}")
+        if count > 0:
+            artifact_store.discard(dest_file, keep_plain=True)
+            os.replace(temp_file, dest_file)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+    return count
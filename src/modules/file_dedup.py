@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from modules.ccfindersw import CCFINDERSW_MIN_TOKENS
+from modules.incremental_detector import load_rules, tokenize
+
+
+def group_identical_files(files: list[tuple[str, str]]) -> tuple[list[tuple[str, str]], dict[str, list[str]]]:
+    """(パス, blob SHA) の一覧を内容が同一のファイルごとにまとめる。
+
+    拡張子が異なると検出対象の言語が変わりうるので、(blob SHA, 拡張子) が同じものを同一とみなす。
+    戻り値は (代表ファイルの一覧, 代表ファイルのパス -> 重複ファイルのパス一覧)。代表はパス順で最初のファイル。
+    """
+    groups: dict[tuple[str, str], list[tuple[str, str]]] = {}
+    for path, blob_hash in sorted(files):
+        groups.setdefault((blob_hash, os.path.splitext(path)[1]), []).append((path, blob_hash))
+    representatives = []
+    duplicates = {}
+    for group in groups.values():
+        representatives.append(group[0])
+        if len(group) > 1:
+            duplicates[group[0][0]] = [path for path, _blob_hash in group[1:]]
+    return representatives, duplicates
+
+
+def _whole_file_fragment(content: bytes, language: str) -> tuple[dict, int] | None:
+    """ファイル全体（先頭のトークンから末尾のトークンまで）のクローン片の位置とトークン数。トークンがなければ None。"""
+    _tokens, positions = tokenize(content.decode("utf-8", errors="replace"), load_rules(language))
+    if not positions:
+        return None
+    fragment = {
+        "start_line": positions[0][0],
+        "start_col": positions[0][1],
+        "end_line": positions[-1][2],
+        "end_col": positions[-1][3],
+    }
+    return fragment, len(positions)
+
+
+def expand_clones_json(
+    json_file: Path,
+    duplicates: dict[str, list[str]],
+    snapshot_dir: Path,
+    path_base: Path,
+    language: str,
+) -> tuple[int, int]:
+    """代表ファイルだけで検出した結果に、重複ファイルの分のクローン片とクローンセットを書き戻す。
+
+    代表ファイルの各クローン片と同じ位置のクローン片を、同じクローンセットの重複ファイルにも追加する。
+    さらに、重複ファイルのグループ（代表ファイルと重複ファイル）ごとに、ファイル全体をクローン片とするクローンセットを追加する。
+    ファイル全体の範囲は incremental 検出器の字句解析で求め、トークン数が CCFINDERSW_MIN_TOKENS に満たないグループは追加しない。
+    代表ファイルのファイル全体のクローン片が既にあるクローンセットでは、上の書き戻しで重複ファイルも含まれるので追加しない。
+    json_file はハードリンクで他のコミットと共有されている場合があるので、一時ファイルに書いてから置き換える。
+    戻り値は (書き戻した重複ファイル数, 検出を省略したトークン数)。
+    """
+    with open(json_file, "r") as f:
+        clones = json.load(f)
+    path_prefix = str(path_base) + "/"
+    file_ids = {}
+    for file_data in clones["file_data"]:
+        file_path = str(file_data["file_path"])
+        if file_path.startswith(path_prefix):
+            file_ids[file_path[len(path_prefix):]] = file_data["file_id"]
+    locs = {file_data["file_id"]: file_data["loc"] for file_data in clones["file_data"]}
+
+    next_file_id = max((file_data["file_id"] for file_data in clones["file_data"]), default=-1) + 1
+    duplicate_ids: dict[int, list[int]] = {}
+    whole_files: dict[int, dict] = {}
+    duplicate_files = 0
+    skipped_tokens = 0
+    for representative, duplicate_paths in duplicates.items():
+        if representative not in file_ids:
+            # この言語の検出対象ではない
+            continue
+        representative_id = file_ids[representative]
+        ids = []
+        for duplicate_path in duplicate_paths:
+            clones["file_data"].append({"file_id": next_file_id, "file_path": path_prefix + duplicate_path, "loc": locs[representative_id]})
+            ids.append(next_file_id)
+            next_file_id += 1
+        duplicate_ids[representative_id] = ids
+        duplicate_files += len(ids)
+        whole_file = _whole_file_fragment((snapshot_dir / representative).read_bytes(), language)
+        if whole_file is None:
+            continue
+        fragment, token_count = whole_file
+        skipped_tokens += token_count * len(ids)
+        if token_count >= CCFINDERSW_MIN_TOKENS:
+            whole_files[representative_id] = fragment
+
+    for clone_set in clones["clone_sets"]:
+        expanded = []
+        for fragment in clone_set["fragments"]:
+            for file_id in duplicate_ids.get(fragment["file_id"], ()):
+                expanded.append({**fragment, "file_id": file_id})
+            whole_file = whole_files.get(fragment["file_id"])
+            if whole_file is not None and all(fragment[key] == value for key, value in whole_file.items()):
+                del whole_files[fragment["file_id"]]
+        clone_set["fragments"].extend(expanded)
+
+    next_clone_id = max((clone_set["clone_id"] for clone_set in clones["clone_sets"]), default=-1) + 1
+    for representative_id, fragment in whole_files.items():
+        clones["clone_sets"].append({
+            "clone_id": next_clone_id,
+            "fragments": [{"file_id": file_id, **fragment} for file_id in (representative_id, *duplicate_ids[representative_id])],
+        })
+        next_clone_id += 1
+
+    temp_file = json_file.with_name(json_file.name + ".tmp")
+    try:
+        with open(temp_file, "w") as f:
+            json.dump(clones, f)
+        os.replace(temp_file, json_file)
+    finally:
+        temp_file.unlink(missing_ok=True)
+    return duplicate_files, skipped_tokens
@@ -0,0 +1,95 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+
+def list_blobs(repo_dir: Path, commit_hash: str, skip_symlinks: bool = False) -> list[tuple[str, str]]:
+    """コミットのツリーに含まれる (パス, blob SHA) の一覧を返す。
+
+    skip_symlinks を指定した場合、シンボリックリンク（mode 120000）は含めない。
+    """
+    output = subprocess.run(
+        ["git", "ls-tree", "-r", "-z", "--full-tree", commit_hash],
+        cwd=str(repo_dir),
+        capture_output=True,
+        check=True,
+    ).stdout
+    blobs = []
+    for entry in output.split(b"\0"):
+        if not entry:
+            continue
+        meta, path = entry.split(b"\t", 1)
+        mode, object_type, object_hash = meta.split(b" ")
+        if object_type != b"blob":
+            continue
+        if skip_symlinks and mode == b"120000":
+            continue
+        blobs.append((path.decode("utf-8", errors="surrogateescape"), object_hash.decode()))
+    return blobs
+
+
+def object_sizes(repo_dir: Path, object_hashes) -> dict[str, int]:
+    """git cat-file --batch-check でオブジェクトのサイズ（バイト）をまとめて取得する。"""
+    object_hashes = sorted(set(object_hashes))
+    if not object_hashes:
+        return {}
+    output = subprocess.run(
+        ["git", "cat-file", "--batch-check=%(objectname) %(objectsize)"],
+        cwd=str(repo_dir),
+        input="\n".join(object_hashes).encode() + b"\n",
+        capture_output=True,
+        check=True,
+    ).stdout
+    sizes = {}
+    for line in output.decode().splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[1].isdigit():
+            sizes[fields[0]] = int(fields[1])
+    return sizes
+
+
+class BlobReader:
+    """git cat-file --batch を 1 プロセスだけ起動し、blob の内容を順に読み出す。"""
+
+    def __init__(self, repo_dir: Path) -> None:
+        self.repo_dir = Path(repo_dir)
+        self.process: subprocess.Popen | None = None
+
+    def __enter__(self) -> "BlobReader":
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=str(self.repo_dir),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process.wait()
+        self.process = None
+
+    def read(self, blob_hash: str) -> bytes:
+        self.process.stdin.write(blob_hash.encode() + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise KeyError(f"blob not found: {blob_hash}")
+        content = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)
+        return content
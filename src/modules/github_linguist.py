@@ -1,7 +1,10 @@
 import subprocess
+import hashlib
 import json
 import os
 import sys
+import tempfile
+import threading
 from pathlib import Path
 
 def _find_repo_root(start: Path) -> Path:
@@ -14,23 +17,146 @@ def _find_repo_root(start: Path) -> Path:
 project_root = _find_repo_root(Path(__file__).resolve())
 sys.path.append(str(project_root))
 sys.path.append(str(project_root / "src"))
-from config import TARGET_PROGRAMING_LANGUAGES
+from config import LANGUAGE_CLASSIFIER, LINGUIST_CACHE, TARGET_PROGRAMING_LANGUAGES
+from modules.git_objects import BlobReader, list_blobs, object_sizes
+import modules.language_classifier as language_classifier
+
+# 結果のキャッシュ
+#   trees/<ルートツリーの SHA>.json: そのツリーに対する github-linguist の結果
+#   files/<リポジトリ名>.json: "<.gitattributes のハッシュ>:<blob SHA>:<パス>" -> 言語（対象外のファイルは null）
+# LANGUAGE_CLASSIFIER = "builtin" の結果は builtin/ 配下に分けて保存する
+LINGUIST_CACHE_DIR = project_root / "dest/linguist_cache"
+_cache_lock = threading.Lock()
+
+
+def _run_linguist_command(target: str) -> dict:
+    # コマンドは環境によって書き換えてください．
+    cmd = ["github-linguist", target, "--json", "--breakdown"]
+    output = str(subprocess.run(cmd, capture_output=True, text=True).stdout).replace("\\n", "")
+    return json.loads(output)
+
+
+def _write_json(path: Path, data) -> None:
+    temp_file = path.with_name(path.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_file, path)
+
+
+def _head_tree(target: Path) -> str | None:
+    completed = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel", "HEAD^{tree}"],
+        cwd=str(target),
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        return None
+    toplevel, tree = completed.stdout.split()
+    # サブディレクトリを対象にした場合はキャッシュしない
+    if Path(toplevel).resolve() != target.resolve():
+        return None
+    return tree
+
+
+def _cache_dir() -> Path:
+    if LANGUAGE_CLASSIFIER == "builtin":
+        return LINGUIST_CACHE_DIR / "builtin"
+    return LINGUIST_CACHE_DIR
+
+
+def _classify_files(target: Path, files: list[tuple[str, str]], attributes: list[tuple[str, str]]) -> dict[str, str | None]:
+    """files だけ（と .gitattributes）を含む一時リポジトリで github-linguist を実行し、パス -> 言語を返す。
+
+    github-linguist はファイルのパスと内容（と .gitattributes）で言語を判定するので、
+    変更のないファイルを除いても各ファイルの判定は変わらない。
+    LANGUAGE_CLASSIFIER = "builtin" の場合は modules.language_classifier で HEAD のツリーから直接判定する。
+    """
+    if LANGUAGE_CLASSIFIER == "builtin":
+        return language_classifier.classify_files(target, files, "HEAD")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(temp_dir)
+        with BlobReader(target) as reader:
+            for path, blob_hash in [*files, *attributes]:
+                dest_file = work_dir / path
+                dest_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(dest_file, "wb") as f:
+                    f.write(reader.read(blob_hash))
+        git_cmd = ["git", "-c", "user.name=linguist-cache", "-c", "user.email=linguist-cache@localhost", "-c", "commit.gpgsign=false"]
+        subprocess.run(["git", "init", "-q"], cwd=temp_dir, check=True)
+        subprocess.run(["git", "add", "-A", "-f"], cwd=temp_dir, check=True)
+        subprocess.run([*git_cmd, "commit", "-q", "--no-verify", "-m", "linguist"], cwd=temp_dir, check=True)
+        output = _run_linguist_command(temp_dir)
+    languages: dict[str, str | None] = {path: None for path, _blob_hash in files}
+    for language, breakdown in output.items():
+        for path in breakdown.get("files", []):
+            if path in languages:
+                languages[path] = language
+    return languages
+
+
+def _build_result(target: Path, files: list[tuple[str, str]], languages: dict[str, str | None]) -> dict:
+    """github-linguist --json --breakdown と同じ形式の結果を組み立てる。"""
+    blob_sizes = object_sizes(target, [blob_hash for path, blob_hash in files if languages.get(path) is not None])
+    return language_classifier.build_breakdown(files, languages, blob_sizes)
 
 
 def run_github_linguist(target: str) -> dict:
     """
     GitHub Linguistを使用して指定されたディレクトリの言語構成を分析します．
 
+    config.LINGUIST_CACHE が有効な場合，github-linguist は HEAD のコミットを解析するので，
+    結果を HEAD のルートツリーの SHA をキーにキャッシュします．
+    キャッシュにないツリーでは，以前に判定したことのない (パス, blob) のファイルだけを github-linguist で判定し直します．
+    config.LANGUAGE_CLASSIFIER = "builtin" の場合は github-linguist の代わりに modules.language_classifier で判定します．
+    git リポジトリのルート以外を指定した場合は毎回 github-linguist を実行します．
+
     Args:
         target (str): 分析対象のディレクトリパス
 
     Returns:
         dict: 言語ごとの使用量を含むJSONデータ
     """
-    # コマンドは環境によって書き換えてください．
-    cmd = ["github-linguist", target, "--json", "--breakdown"]
-    output = str(subprocess.run(cmd, capture_output=True, text=True).stdout).replace("\\n", "")
-    return json.loads(output)
+    if not LINGUIST_CACHE and LANGUAGE_CLASSIFIER != "builtin":
+        return _run_linguist_command(str(target))
+    target_dir = Path(target)
+    tree = _head_tree(target_dir)
+    if tree is None:
+        return _run_linguist_command(str(target))
+    if not LINGUIST_CACHE:
+        files = list_blobs(target_dir, "HEAD", skip_symlinks=True)
+        return _build_result(target_dir, files, _classify_files(target_dir, files, []))
+    tree_file = _cache_dir() / "trees" / f"{tree}.json"
+    if tree_file.exists():
+        with open(tree_file, "r") as f:
+            return json.load(f)
+
+    with _cache_lock:
+        files = list_blobs(target_dir, "HEAD", skip_symlinks=True)
+        attributes = sorted((path, blob_hash) for path, blob_hash in files if os.path.basename(path) == ".gitattributes")
+        attributes_hash = hashlib.sha256(repr(attributes).encode("utf-8", errors="surrogateescape")).hexdigest()[:16]
+        index_file = _cache_dir() / "files" / f"{target_dir.resolve().name}.json"
+        index = {}
+        if index_file.exists():
+            with open(index_file, "r") as f:
+                index = json.load(f)
+
+        def key(path: str, blob_hash: str) -> str:
+            return f"{attributes_hash}:{blob_hash}:{path}"
+
+        unknown = [(path, blob_hash) for path, blob_hash in files if key(path, blob_hash) not in index]
+        print(f"{LANGUAGE_CLASSIFIER}: {len(files) - len(unknown)} cached, {len(unknown)} to classify")
+        if unknown:
+            unknown_blobs = dict(unknown)
+            for path, language in _classify_files(target_dir, unknown, attributes).items():
+                index[key(path, unknown_blobs[path])] = language
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            _write_json(index_file, index)
+        languages = {path: index[key(path, blob_hash)] for path, blob_hash in files}
+        result = _build_result(target_dir, files, languages)
+        tree_file.parent.mkdir(parents=True, exist_ok=True)
+        _write_json(tree_file, result)
+    return result
 
 
 def get_exts(workdir: Path) -> dict:
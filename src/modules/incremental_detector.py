@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from config import INCREMENTAL_DETECTOR_MIN_TOKENS
+from modules.ccfindersw import convert_language_for_ccfindersw
+from modules.detection_scope import in_scope
+from modules.git_objects import BlobReader, list_blobs
+
+CCFINDERSW_HOME = project_root / "lib/CCFinderSW-1.0"
+TOKEN_CACHE_DIR = project_root / "dest/token_cache"
+# キャッシュの形式やトークン化の規則を変えた場合は上げる
+CACHE_VERSION = 1
+# マニフェストに記録する検出器（検出結果は CCFinderSW とは一致しないので、最小トークン数も含めて区別する）
+DETECTOR_ID = f"incremental-t{INCREMENTAL_DETECTOR_MIN_TOKENS}"
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_HASH_BASE = 1_000_003
+
+# CCFinderSW に規則ファイルが無い（ANTLR で検出している）言語の予約語
+_BUILTIN_RESERVED = {
+    "javascript": (
+        "async await break case catch class const continue debugger default delete do else export extends "
+        "false finally for function if import in instanceof let new null of return super switch this throw "
+        "true try typeof undefined var void while with yield"
+    ),
+    "typescript": (
+        "abstract any as async await boolean break case catch class const constructor continue declare default "
+        "delete do else enum export extends false finally for from function get if implements import in "
+        "instanceof interface let module namespace never new null number of private protected public readonly "
+        "return set static string super switch this throw true try type typeof undefined var void while yield"
+    ),
+    "rust": (
+        "as async await break const continue crate dyn else enum extern false fn for if impl in let loop match "
+        "mod move mut pub ref return self Self static struct super trait true type unsafe use where while"
+    ),
+}
+
+
+class LanguageRules:
+    """CCFinderSW のコメント規則・予約語ファイルから作るトークン化規則。"""
+
+    def __init__(self, language_arg: str) -> None:
+        self.line_comments: list[str] = []
+        self.block_comments: list[tuple[str, str]] = []
+        self.literals: list[tuple[str, str, bool]] = []
+        self.line_starts: list[str] = []
+        self.line_start_ends: list[tuple[str, str]] = []
+        self.line_continue: str | None = None
+        comment_file = CCFINDERSW_HOME / "comment" / f"{language_arg}_comment.txt"
+        if comment_file.exists():
+            self._load_comment_file(comment_file)
+        else:
+            # C 系の既定規則
+            self.line_comments = ["//"]
+            self.block_comments = [("/*", "*/")]
+            self.literals = [("'", "'", False), ('"', '"', False), ("`", "`", False)]
+        reserved_file = CCFINDERSW_HOME / "reserved" / f"{language_arg}_reserved.txt"
+        if reserved_file.exists():
+            with open(reserved_file, "r") as f:
+                self.reserved = frozenset(line.strip() for line in f if line.strip())
+        else:
+            self.reserved = frozenset(_BUILTIN_RESERVED.get(language_arg, "").split())
+        self.pattern = self._build_pattern()
+
+    def _load_comment_file(self, comment_file: Path) -> None:
+        with open(comment_file, "r") as f:
+            lines = [line.rstrip("\n") for line in f]
+        index = 0
+        while index < len(lines):
+            directive = lines[index]
+            index += 1
+            if directive in ("#start",):
+                self.line_comments.append(lines[index])
+                index += 1
+            elif directive in ("#startend", "#startendnest"):
+                self.block_comments.append((lines[index], lines[index + 1]))
+                index += 2
+            elif directive in ("#prior", "#literal", "#literalverbatim"):
+                self.literals.append((lines[index], lines[index + 1], directive == "#literalverbatim"))
+                index += 2
+            elif directive == "#linestart":
+                self.line_starts.append(lines[index])
+                index += 1
+            elif directive == "#linestartend":
+                self.line_start_ends.append((lines[index], lines[index + 1]))
+                index += 2
+            elif directive == "#linecontinue":
+                self.line_continue = lines[index]
+                index += 1
+            elif directive.startswith("#"):
+                # #extension / #variableregex などトークン化に使わない指定
+                index += 1
+
+    def _build_pattern(self) -> re.Pattern:
+        alternatives = []
+        for start, end in self.line_start_ends:
+            alternatives.append(rf"(?P<skip{len(alternatives)}>^{re.escape(start)}.*?^{re.escape(end)}[^\n]*)")
+        for start in self.line_starts:
+            continuation = rf"(?:[^\n]*{re.escape(self.line_continue)}\n)*" if self.line_continue else ""
+            boundary = r"\b" if start[-1].isalnum() else ""
+            alternatives.append(rf"(?P<skip{len(alternatives)}>^[ \t]*{re.escape(start)}{boundary}{continuation}[^\n]*)")
+        for start, end in self.block_comments:
+            alternatives.append(rf"(?P<skip{len(alternatives)}>{re.escape(start)}.*?{re.escape(end)})")
+        for start in self.line_comments:
+            alternatives.append(rf"(?P<skip{len(alternatives)}>{re.escape(start)}[^\n]*)")
+        literal_alternatives = []
+        for start, end, verbatim in self.literals:
+            if verbatim:
+                body = rf"[^{re.escape(end)}]*"
+            else:
+                body = rf"(?:\\.|[^\\{re.escape(end)}\n])*"
+            literal_alternatives.append(rf"{re.escape(start)}{body}{re.escape(end)}")
+        if literal_alternatives:
+            alternatives.append(rf"(?P<literal>{'|'.join(literal_alternatives)})")
+        # 改行は単独で消費し、次の行頭で行頭規則（#linestart など）が効くようにする
+        alternatives.append(r"(?P<space>[^\S\n]+|\n)")
+        alternatives.append(r"(?P<identifier>\$?[^\W\d][\w$]*)")
+        alternatives.append(r"(?P<number>\d[\w.]*)")
+        alternatives.append(r"(?P<symbol>.)")
+        return re.compile("|".join(alternatives), re.MULTILINE | re.DOTALL)
+
+
+@lru_cache(maxsize=None)
+def load_rules(language: str) -> LanguageRules:
+    return LanguageRules(convert_language_for_ccfindersw(language))
+
+
+def tokenize(source: str, rules: LanguageRules) -> tuple[list[str], list[list[int]]]:
+    """ソースを正規化済みトークン列と各トークンの位置 [開始行, 開始列, 終了行, 終了列] に分割する。
+
+    予約語以外の識別子とリテラルは "$" に正規化する（Type-2 クローンを検出するため）。
+    """
+    line_starts = [0]
+    for match in re.finditer("\n", source):
+        line_starts.append(match.end())
+
+    def position(offset: int) -> tuple[int, int]:
+        # 行番号・列番号はどちらも 1 始まり
+        line_index = bisect_right(line_starts, offset) - 1
+        return line_index + 1, offset - line_starts[line_index] + 1
+
+    tokens: list[str] = []
+    positions: list[list[int]] = []
+    for match in rules.pattern.finditer(source):
+        kind = match.lastgroup
+        if kind == "space" or kind.startswith("skip"):
+            continue
+        text = match.group()
+        if kind == "identifier":
+            token = text if text in rules.reserved else "$"
+        elif kind in ("literal", "number"):
+            token = "$"
+        else:
+            token = text
+        start_line, start_col = position(match.start())
+        end_line, end_col = position(match.end() - 1)
+        tokens.append(token)
+        positions.append([start_line, start_col, end_line, end_col + 1])
+    return tokens, positions
+
+
+def _token_id(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big") % _MERSENNE_PRIME
+
+
+def fingerprint_windows(token_ids: list[int], window: int) -> list[int]:
+    """window トークンごとのローリングハッシュを返す。"""
+    if len(token_ids) < window:
+        return []
+    top = pow(_HASH_BASE, window - 1, _MERSENNE_PRIME)
+    value = 0
+    for token_id in token_ids[:window]:
+        value = (value * _HASH_BASE + token_id) % _MERSENNE_PRIME
+    fingerprints = [value]
+    for index in range(window, len(token_ids)):
+        value = ((value - token_ids[index - window] * top) * _HASH_BASE + token_ids[index]) % _MERSENNE_PRIME
+        fingerprints.append(value)
+    return fingerprints
+
+
+def analyze_blob(content: bytes, language: str, window: int = INCREMENTAL_DETECTOR_MIN_TOKENS) -> dict:
+    """1 ファイル分のトークン・フィンガープリント情報を作る（キャッシュの単位）。"""
+    source = content.decode("utf-8", errors="replace")
+    tokens, positions = tokenize(source, load_rules(language))
+    token_ids = [_token_id(token) for token in tokens]
+    return {
+        "loc": len(source.splitlines()),
+        "token_ids": token_ids,
+        "positions": positions,
+        "fingerprints": fingerprint_windows(token_ids, window),
+    }
+
+
+class TokenCache:
+    """blob SHA をキーにしたトークン・フィンガープリントのキャッシュ。"""
+
+    def __init__(self, language: str, window: int = INCREMENTAL_DETECTOR_MIN_TOKENS, enabled: bool = True) -> None:
+        self.language = language
+        self.window = window
+        self.enabled = enabled
+        self.root = TOKEN_CACHE_DIR / f"v{CACHE_VERSION}-t{window}" / convert_language_for_ccfindersw(language)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, blob_hash: str) -> Path:
+        return self.root / blob_hash[:2] / f"{blob_hash}.json"
+
+    def get(self, blob_hash: str, reader: BlobReader) -> dict:
+        cache_file = self._path(blob_hash)
+        if self.enabled and cache_file.exists():
+            self.hits += 1
+            with open(cache_file, "r") as f:
+                return json.load(f)
+        self.misses += 1
+        entry = analyze_blob(reader.read(blob_hash), self.language, self.window)
+        if self.enabled:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_file, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_file, cache_file)
+        return entry
+
+
+def _continues_previous(group: list[tuple[int, int]], fingerprints: list[list[int]], occurrences: dict) -> bool:
+    """group が 1 トークン前の同じ出現集合の続きであれば True（その場合は前のクローンに含まれる）。"""
+    first_file, first_pos = group[0]
+    if first_pos == 0:
+        return False
+    previous = fingerprints[first_file][first_pos - 1]
+    shifted = []
+    for file_index, pos in group:
+        if pos == 0 or fingerprints[file_index][pos - 1] != previous:
+            return False
+        shifted.append((file_index, pos - 1))
+    return occurrences.get(previous) == shifted
+
+
+def _drop_overlapping(group: list[tuple[int, int]], span: int) -> list[tuple[int, int]]:
+    """同じファイルで前の出現と重なる（トークン列が span 未満しか離れていない）出現を除く。
+
+    繰り返しの多いコードでは 1 つのファイル内で自分自身とずれて一致する区間ができるが、
+    CCFinderSW と同じく、重なり合うクローン片は報告しない。
+    """
+    kept = []
+    last_end: dict[int, int] = {}
+    for file_index, pos in group:
+        if file_index in last_end and pos < last_end[file_index]:
+            continue
+        kept.append((file_index, pos))
+        last_end[file_index] = pos + span
+    return kept
+
+
+def find_clone_sets(entries: list[dict], window: int = INCREMENTAL_DETECTOR_MIN_TOKENS) -> list[dict]:
+    """全ファイルのフィンガープリントから、同じ出現集合で一致し続ける区間をクローンセットとして求める。
+
+    同じファイル内で重なり合う出現は除き、クローン片が 2 つ未満になった区間は報告しない。
+    """
+    fingerprints = [entry["fingerprints"] for entry in entries]
+    counts = Counter(value for file_fingerprints in fingerprints for value in file_fingerprints)
+    occurrences: dict[int, list[tuple[int, int]]] = {}
+    for file_index, file_fingerprints in enumerate(fingerprints):
+        for pos, value in enumerate(file_fingerprints):
+            if counts[value] >= 2:
+                occurrences.setdefault(value, []).append((file_index, pos))
+
+    clone_sets = []
+    for group in occurrences.values():
+        if _continues_previous(group, fingerprints, occurrences):
+            continue
+        length = 1
+        while True:
+            following = [(file_index, pos + length) for file_index, pos in group]
+            if any(pos >= len(fingerprints[file_index]) for file_index, pos in following):
+                break
+            value = fingerprints[following[0][0]][following[0][1]]
+            if occurrences.get(value) != following:
+                break
+            length += 1
+        group = _drop_overlapping(group, length + window - 1)
+        if len(group) < 2:
+            continue
+        fragments = []
+        for file_index, pos in group:
+            positions = entries[file_index]["positions"]
+            start = positions[pos]
+            end = positions[pos + length - 1 + window - 1]
+            fragments.append({
+                "file_id": file_index,
+                "start_line": start[0],
+                "start_col": start[1],
+                "end_line": end[2],
+                "end_col": end[3],
+            })
+        clone_sets.append({"clone_id": len(clone_sets), "fragments": fragments})
+    return clone_sets
+
+
+def detect(
+    repo_dir: Path,
+    commit_hash: str,
+    language: str,
+    exts: tuple[str],
+    path_base: Path | None = None,
+    use_cache: bool = True,
+    prefixes: tuple[str] | None = None,
+) -> dict:
+    """git のオブジェクトから直接コミットを読み、変更された blob だけを再トークン化してクローンを検出する。
+
+    prefixes を指定した場合はその接頭辞で始まるパスのファイルだけを対象にする。
+    戻り値は ccfindersw-parser と同じ {"file_data": [...], "clone_sets": [...]} 形式。
+    """
+    path_base = Path(path_base or repo_dir)
+    files = sorted(
+        (path, blob_hash)
+        for path, blob_hash in list_blobs(repo_dir, commit_hash)
+        if os.path.splitext(path)[1].replace(".", "") in exts and in_scope(path, prefixes)
+    )
+    cache = TokenCache(language, enabled=use_cache)
+    entries = []
+    with BlobReader(repo_dir) as reader:
+        for _path, blob_hash in files:
+            entries.append(cache.get(blob_hash, reader))
+    file_data = [
+        {"file_id": file_id, "file_path": str(path_base / path), "loc": entry["loc"]}
+        for file_id, ((path, _blob_hash), entry) in enumerate(zip(files, entries))
+    ]
+    print(f"token cache ({language}): hit={cache.hits} miss={cache.misses}")
+    return {"file_data": file_data, "clone_sets": find_clone_sets(entries, cache.window)}
+
+
+def detect_to_file(
+    repo_dir: Path,
+    commit_hash: str,
+    language: str,
+    exts: tuple[str],
+    dest_file: Path,
+    path_base: Path | None = None,
+    prefixes: tuple[str] | None = None,
+) -> None:
+    result = detect(repo_dir, commit_hash, language, exts, path_base, prefixes=prefixes)
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(dest_file, "w") as f:
+        json.dump(result, f)
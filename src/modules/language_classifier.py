@@ -0,0 +1,372 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from modules.git_objects import BlobReader, list_blobs, object_sizes
+
+# github-linguist から抜き出したデータ（lib/linguist/README.md を参照）
+LINGUIST_DATA_DIR = project_root / "lib/linguist"
+# 言語統計に含める言語の種類（linguist の DETECTABLE_TYPES）
+DETECTABLE_TYPES = ("programming", "markup")
+# ヒューリスティクスで参照する先頭のバイト数（linguist の HEURISTICS_CONSIDER_BYTES）
+HEURISTICS_CONSIDER_BYTES = 50 * 1024
+# バイナリとみなすかを判定する先頭のバイト数
+BINARY_CHECK_BYTES = 8000
+# モードラインを探す先頭・末尾の行数
+MODELINE_SEARCH_LINES = 5
+ATTRIBUTES = (
+    "linguist-vendored",
+    "linguist-generated",
+    "linguist-documentation",
+    "linguist-language",
+    "linguist-detectable",
+)
+
+_VIM_MODELINE = re.compile(
+    r"(?:^|[ \t])(?:vi|vim|Vim|ex)(?:[<=>]?\d+)?:.*?[ \t:](?:filetype|ft|syntax)[ \t]*=(\w+)(?=$|\s|:)",
+    re.MULTILINE,
+)
+_EMACS_MODELINE = re.compile(r"-\*-(?:.*?[ \t;])?[ \t]*mode[ \t]*:[ \t]*([^:;\s]+).*?-\*-", re.IGNORECASE)
+_EMACS_SHORT_MODELINE = re.compile(r"-\*-[ \t]*([^:;\s]+)[ \t]*-\*-")
+_SH_EXEC = re.compile(r"exec (\w+)[\s'\"]+\$0[\s'\"]+\$@")
+
+# linguist の generated.rb のうち，対象言語に関係する判定
+_GENERATED_PATH = re.compile(
+    r"(^|/)(node_modules|Godeps|__generated__|\.idea|Carthage/Build)/"
+    r"|\.(designer|feature)\.cs$"
+    r"|(^|/)(package-lock\.json|npm-shrinkwrap\.json|pnpm-lock\.yaml|composer\.lock|Cargo\.lock|Gopkg\.lock|glide\.lock|poetry\.lock|Pipfile\.lock)$"
+    r"|\.(nib|xcworkspacedata|xcuserstate)$"
+)
+_GO_VENDOR = re.compile(r"vendor/((?!-)[-0-9A-Za-z]+(?<!-)\.)+(com|edu|gov|in|me|net|org|fm|io)")
+_GO_GENERATED = re.compile(r"^// Code generated .* DO NOT EDIT\.$")
+_PROTOBUF_EXTS = (".py", ".java", ".h", ".cc", ".cpp", ".m", ".rb", ".php")
+_THRIFT_EXTS = (".rb", ".py", ".go", ".js", ".m", ".java", ".h", ".cc", ".cpp", ".php")
+_HAXE_EXTS = (".js", ".py", ".lua", ".cpp", ".h", ".java", ".cs", ".php")
+
+
+class _Rule:
+    def __init__(self, rule: dict, named_patterns: dict) -> None:
+        self.language = rule["language"]
+        self.patterns = []
+        self.negative_patterns = []
+        self.and_rules = [_Rule({"language": None, **sub_rule}, named_patterns) for sub_rule in rule.get("and", [])]
+        if "pattern" in rule:
+            self.patterns.append(_compile(rule["pattern"]))
+        if "named_pattern" in rule:
+            self.patterns.append(_compile(named_patterns[rule["named_pattern"]]))
+        if "negative_pattern" in rule:
+            self.negative_patterns.append(_compile(rule["negative_pattern"]))
+
+    def match(self, data: str) -> bool:
+        if any(pattern.search(data) is None for pattern in self.patterns):
+            return False
+        if any(pattern.search(data) is not None for pattern in self.negative_patterns):
+            return False
+        return all(rule.match(data) for rule in self.and_rules)
+
+
+def _compile(pattern) -> re.Pattern:
+    # linguist（Ruby）の正規表現では ^ と $ は常に行頭・行末にマッチする
+    if isinstance(pattern, list):
+        pattern = "|".join(f"(?:{p})" for p in pattern)
+    return re.compile(pattern, re.MULTILINE)
+
+
+class _LinguistData:
+    def __init__(self, data_dir: Path) -> None:
+        with open(data_dir / "languages.yml", "r") as f:
+            languages = yaml.safe_load(f)
+        with open(data_dir / "heuristics.yml", "r") as f:
+            heuristics = yaml.safe_load(f)
+        with open(data_dir / "vendor.yml", "r") as f:
+            self.vendor = re.compile("|".join(f"(?:{p})" for p in yaml.safe_load(f)))
+        with open(data_dir / "documentation.yml", "r") as f:
+            self.documentation = re.compile("|".join(f"(?:{p})" for p in yaml.safe_load(f)))
+
+        self.types: dict[str, str] = {}
+        self.extensions: dict[str, list[str]] = {}
+        self.filenames: dict[str, list[str]] = {}
+        self.interpreters: dict[str, list[str]] = {}
+        self.aliases: dict[str, str] = {}
+        for name, language in languages.items():
+            self.types[name] = language.get("type")
+            self.aliases.setdefault(name.lower().replace(" ", "-"), name)
+            for alias in language.get("aliases", []):
+                self.aliases.setdefault(alias.lower(), name)
+            for ext in language.get("extensions", []):
+                self.extensions.setdefault(ext.lower(), []).append(name)
+            for filename in language.get("filenames", []):
+                self.filenames.setdefault(filename, []).append(name)
+            for interpreter in language.get("interpreters", []):
+                self.interpreters.setdefault(interpreter, []).append(name)
+
+        named_patterns = heuristics.get("named_patterns", {})
+        self.heuristics = [
+            (
+                tuple(ext.lower() for ext in disambiguation["extensions"]),
+                [_Rule(rule, named_patterns) for rule in disambiguation["rules"]],
+            )
+            for disambiguation in heuristics["disambiguations"]
+        ]
+
+    def find_by_alias(self, name: str) -> str | None:
+        name = name.strip().lower()
+        return self.aliases.get(name) or self.aliases.get(name.replace(" ", "-"))
+
+
+@lru_cache(maxsize=1)
+def _data() -> _LinguistData:
+    return _LinguistData(LINGUIST_DATA_DIR)
+
+
+def _extnames(path: str) -> list[str]:
+    """"a.rs.in" -> [".rs.in", ".in"]（linguist の FileBlob.extensions と同じ）。"""
+    segments = os.path.basename(path).lower().split(".")[1:]
+    return ["." + ".".join(segments[index:]) for index in range(len(segments))]
+
+
+def _lines(text: str) -> list[str]:
+    return re.split(r"\r\n|\r|\n", text)
+
+
+def _modeline(data: _LinguistData, _path: str, text: str, _candidates: list[str]) -> list[str]:
+    lines = _lines(text)
+    search = "\n".join(lines[:MODELINE_SEARCH_LINES] + lines[-MODELINE_SEARCH_LINES:])
+    for pattern in (_EMACS_MODELINE, _EMACS_SHORT_MODELINE, _VIM_MODELINE):
+        match = pattern.search(search)
+        if match is not None:
+            language = data.find_by_alias(match.group(1))
+            return [language] if language else []
+    return []
+
+
+def _filename(data: _LinguistData, path: str, _text: str, _candidates: list[str]) -> list[str]:
+    return list(data.filenames.get(os.path.basename(path), []))
+
+
+def interpreter(text: str) -> str | None:
+    """シェバン行からインタプリタ名を取り出す（"#!/usr/bin/env python3.11" -> "python3"）。"""
+    first_line = _lines(text[:1024])[0]
+    if not first_line.startswith("#!"):
+        return None
+    tokens = first_line[2:].split()
+    if not tokens:
+        return None
+    script = tokens[0].split("/")[-1]
+    if script == "env":
+        rest = [token for token in tokens[1:] if not token.startswith("-") and "=" not in token]
+        if not rest:
+            return None
+        script = rest[0].split("/")[-1]
+    script = re.sub(r"(\.\d+)+$", "", script)
+    if script == "sh":
+        match = _SH_EXEC.search("\n".join(_lines(text)[:5]))
+        if match is not None:
+            script = match.group(1)
+    return script
+
+
+def _shebang(data: _LinguistData, _path: str, text: str, candidates: list[str]) -> list[str]:
+    script = interpreter(text)
+    if script is None:
+        return []
+    languages = data.interpreters.get(script) or data.interpreters.get(re.sub(r"\d+$", "", script), [])
+    return [language for language in candidates if language in languages] if candidates else list(languages)
+
+
+def _extension(data: _LinguistData, path: str, _text: str, candidates: list[str]) -> list[str]:
+    languages = next((data.extensions[ext] for ext in _extnames(path) if ext in data.extensions), [])
+    return [language for language in candidates if language in languages] if candidates else list(languages)
+
+
+def _heuristics(data: _LinguistData, path: str, text: str, _candidates: list[str]) -> list[str]:
+    lower_path = path.lower()
+    for exts, rules in data.heuristics:
+        if not lower_path.endswith(exts):
+            continue
+        head = text[:HEURISTICS_CONSIDER_BYTES]
+        for rule in rules:
+            if rule.match(head):
+                languages = rule.language if isinstance(rule.language, list) else [rule.language]
+                return [language for language in languages if language in data.types]
+        return []
+    return []
+
+
+_STRATEGIES = (_modeline, _filename, _shebang, _extension, _heuristics)
+
+
+def detect_language(path: str, content: bytes) -> str | None:
+    """パスと内容から言語を判定する（linguist の Linguist.detect と同じ順に戦略を適用する）。
+
+    戦略で候補が 1 つに絞れたらその言語を返し，複数残った場合は次の戦略に候補として渡す。
+    linguist の最後の戦略（ベイズ分類器）は持たないので，最後まで複数の候補が残った場合は
+    languages.yml の順で最初の候補を返す。空のファイルとバイナリは判定しない。
+    """
+    if not content or b"\0" in content[:BINARY_CHECK_BYTES]:
+        return None
+    data = _data()
+    text = content.decode("utf-8", errors="replace")
+    candidates: list[str] = []
+    for strategy in _STRATEGIES:
+        languages = strategy(data, path, text, candidates)
+        if len(languages) == 1:
+            return languages[0]
+        if languages:
+            candidates = languages
+    return candidates[0] if candidates else None
+
+
+def is_generated(path: str, content: bytes) -> bool:
+    """linguist の generated.rb のうち，対象言語のファイルに関係する判定。"""
+    if _GENERATED_PATH.search(path) or _GO_VENDOR.search(path):
+        return True
+    ext = os.path.splitext(path)[1].lower()
+    lines = _lines(content[:HEURISTICS_CONSIDER_BYTES].decode("utf-8", errors="replace"))
+    head = "\n".join(lines[:6])
+    if ext in (".js", ".css"):
+        all_lines = _lines(content.decode("utf-8", errors="replace"))
+        if all_lines and sum(len(line) for line in all_lines) // len(all_lines) > 110:
+            return True
+        if any(line.startswith(("//# sourceMappingURL", "//@ sourceMappingURL")) for line in all_lines[-2:]):
+            return True
+    if ext == ".js":
+        if lines[0].startswith("// Generated by ") or "GENERATED CODE -- DO NOT EDIT!" in head:
+            return True
+        if lines[0].startswith(("/* parser generated by jison", "/* generated by jison-lex")):
+            return True
+    if ext in _PROTOBUF_EXTS and "Generated by the protocol buffer compiler.  DO NOT EDIT!" in "\n".join(lines[:3]):
+        return True
+    if ext in _THRIFT_EXTS and "Autogenerated by Thrift Compiler" in head:
+        return True
+    if ext in _HAXE_EXTS and "Generated by Haxe" in "\n".join(lines[:3]):
+        return True
+    if ext == ".go" and any(_GO_GENERATED.match(line) for line in lines[:40]):
+        return True
+    if ext == ".h" and lines[0] == "/* DO NOT EDIT THIS FILE - it is machine generated */" and lines[1:2] == ["#include <jni.h>"]:
+        return True
+    if ext in (".c", ".cpp") and lines[0].startswith("/* Generated by Cython"):
+        return True
+    if ext in (".cpp", ".hpp", ".h", ".cc") and lines[0].startswith("// Generated by the gRPC"):
+        return True
+    if ext == ".rb" and lines[2:3] and lines[2].startswith("# This file is automatically generated by Racc"):
+        return True
+    return False
+
+
+def _boolean(value) -> bool:
+    return value is not False and value != "false"
+
+
+def git_attributes(repo_dir: Path, commit_hash: str, paths: list[str]) -> dict[str, dict]:
+    """commit_hash のツリーの .gitattributes で，各パスの linguist-* 属性を求める。
+
+    一時的なインデックスにツリーを読み込み，git check-attr --cached で判定する（作業ツリーは参照しない）。
+    戻り値はパス -> {属性名: True / False / 値}。指定されていない属性は含めない。
+    """
+    if not paths:
+        return {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = {**os.environ, "GIT_INDEX_FILE": str(Path(temp_dir) / "index")}
+        subprocess.run(["git", "read-tree", commit_hash], cwd=str(repo_dir), env=env, check=True)
+        output = subprocess.run(
+            ["git", "check-attr", "--cached", "-z", "--stdin", *ATTRIBUTES],
+            cwd=str(repo_dir),
+            env=env,
+            input=b"\0".join(path.encode("utf-8", errors="surrogateescape") for path in paths) + b"\0",
+            capture_output=True,
+            check=True,
+        ).stdout
+    fields = output.split(b"\0")
+    attributes: dict[str, dict] = {}
+    for index in range(0, len(fields) - 2, 3):
+        path = fields[index].decode("utf-8", errors="surrogateescape")
+        name = fields[index + 1].decode()
+        value = fields[index + 2].decode("utf-8", errors="replace")
+        if value == "unspecified":
+            continue
+        attributes.setdefault(path, {})[name] = {"set": True, "unset": False}.get(value, value)
+    return attributes
+
+
+def classify_files(repo_dir: Path, files: list[tuple[str, str]], commit_hash: str = "HEAD") -> dict[str, str | None]:
+    """commit_hash のツリーの (パス, blob SHA) を分類し，パス -> 言語を返す。
+
+    github-linguist が言語統計に含めないファイル（ベンダリング・ドキュメント・生成ファイル，
+    programming / markup 以外の言語，判定できないファイル）は None になる。
+    .gitattributes の linguist-* 属性による上書きにも対応する。
+    """
+    data = _data()
+    attributes = git_attributes(repo_dir, commit_hash, [path for path, _blob_hash in files])
+    languages: dict[str, str | None] = {}
+    with BlobReader(repo_dir) as reader:
+        for path, blob_hash in files:
+            attrs = attributes.get(path, {})
+            vendored = attrs.get("linguist-vendored")
+            documentation = attrs.get("linguist-documentation")
+            if (data.vendor.search(path) is not None) if vendored is None else _boolean(vendored):
+                languages[path] = None
+                continue
+            if (data.documentation.search(path) is not None) if documentation is None else _boolean(documentation):
+                languages[path] = None
+                continue
+            content = reader.read(blob_hash)
+            override = attrs.get("linguist-language")
+            if isinstance(override, str):
+                language = data.find_by_alias(override)
+            else:
+                language = detect_language(path, content)
+            generated = attrs.get("linguist-generated")
+            if language is not None and ((is_generated(path, content)) if generated is None else _boolean(generated)):
+                language = None
+            detectable = attrs.get("linguist-detectable")
+            if language is not None and not (data.types[language] in DETECTABLE_TYPES if detectable is None else _boolean(detectable)):
+                language = None
+            languages[path] = language
+    return languages
+
+
+def build_breakdown(files: list[tuple[str, str]], languages: dict[str, str | None], blob_sizes: dict[str, int]) -> dict:
+    """github-linguist --json --breakdown と同じ形式の結果を組み立てる。"""
+    sizes: dict[str, int] = {}
+    breakdown: dict[str, list[str]] = {}
+    for path, blob_hash in files:
+        language = languages.get(path)
+        if language is None:
+            continue
+        sizes[language] = sizes.get(language, 0) + blob_sizes.get(blob_hash, 0)
+        breakdown.setdefault(language, []).append(path)
+    total = sum(sizes.values())
+    result = {}
+    for language in sorted(sizes, key=lambda language: -sizes[language]):
+        result[language] = {
+            "size": sizes[language],
+            "percentage": f"{sizes[language] / total * 100:.2f}" if total else "0.00",
+            "files": sorted(breakdown[language]),
+        }
+    return result
+
+
+def classify_repository(repo_dir: Path, commit_hash: str = "HEAD") -> dict:
+    """commit_hash のツリー全体を分類し，github-linguist --json --breakdown と同じ形式で返す。"""
+    files = list_blobs(repo_dir, commit_hash, skip_symlinks=True)
+    languages = classify_files(repo_dir, files, commit_hash)
+    blob_sizes = object_sizes(repo_dir, [blob_hash for path, blob_hash in files if languages[path] is not None])
+    return build_breakdown(files, languages, blob_sizes)
@@ -0,0 +1,47 @@
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from modules.detection_scope import in_scope
+from modules.git_objects import list_blobs
+
+
+def compute_language_fingerprints(
+    repo_dir: Path,
+    commit_hash: str,
+    exts: dict[str, tuple[str]],
+    prefixes: dict[str, tuple[str] | None] | None = None,
+) -> dict[str, str]:
+    """言語ごとに、対象拡張子のファイルの (パス, blob SHA) を整列してハッシュ化する。
+
+    prefixes を指定した場合、言語ごとにその接頭辞で始まるパス（検出範囲）のファイルだけを含める。
+    スナップショットの展開（snapshot.materialize）と同じく、シンボリックリンクは含めない。
+    """
+    prefixes = prefixes or {}
+    entries: dict[str, list[tuple[str, str]]] = {language: [] for language in exts}
+    for path, blob_hash in list_blobs(repo_dir, commit_hash, skip_symlinks=True):
+        ext = os.path.splitext(path)[1].replace(".", "")
+        if ext == "":
+            continue
+        for language, language_exts in exts.items():
+            if ext in language_exts and in_scope(path, prefixes.get(language)):
+                entries[language].append((path, blob_hash))
+    fingerprints = {}
+    for language, language_entries in entries.items():
+        digest = hashlib.sha256()
+        for path, blob_hash in sorted(language_entries):
+            digest.update(f"{path}\0{blob_hash}\n".encode("utf-8", errors="surrogateescape"))
+        fingerprints[language] = digest.hexdigest()
+    return fingerprints
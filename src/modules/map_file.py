@@ -3,7 +3,6 @@ import ast
 import csv
 import json
 import sys
-import os
 
 import git
 
@@ -92,7 +91,6 @@ def map_files(url: str, target_commit: str | None = None) -> dict:
         target = project_root / "dest/github_linguist" / f"{name}.json"
         with open(target, "r") as f:
             linguist_result = json.load(f)
-        os.remove(target)
 
         result = {}
         # マイクロサービスの情報を処理
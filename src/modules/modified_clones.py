@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Iterator
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+import modules.artifact_store as artifact_store
+
+# dest/modified_clones の形式のバージョン
+#   1: 子クローンセットごとの dict のリスト。フラグメントごとに type と親・子のフラグメント（パスと行）を全て持つ
+#   2: {"version": 2, ...}。子クローンセットの clone_id とフラグメント数、フラグメントごとの親の clone_id と
+#      index（added は -1）、modified のフラグメントの位置（子のフラグメントを順に並べた通し番号）を整数の配列で持つ
+FORMAT_VERSION = 2
+NO_PARENT = -1
+
+# (type, 子の (clone_id, index), 親の (clone_id, index)。added は None)
+FragmentEvent = tuple[str, tuple[int, int], tuple[int, int] | None]
+
+
+def encode(modified_clones: list[dict]) -> dict:
+    """correspond_clonesets の結果をバージョン 2 の形式にする。"""
+    clone_ids = []
+    sizes = []
+    parent_clone_ids = []
+    parent_indexes = []
+    modified = []
+    for modified_clone in modified_clones:
+        clone_ids.append(modified_clone["clone_id"])
+        sizes.append(len(modified_clone["fragments"]))
+        for fragment in modified_clone["fragments"]:
+            if fragment["type"] == "added":
+                parent_clone_ids.append(NO_PARENT)
+                parent_indexes.append(NO_PARENT)
+                continue
+            if fragment["type"] == "modified":
+                modified.append(len(parent_clone_ids))
+            parent_clone_ids.append(fragment["parent"]["clone_id"])
+            parent_indexes.append(fragment["parent"]["index"])
+    return {
+        "version": FORMAT_VERSION,
+        "clone_ids": clone_ids,
+        "sizes": sizes,
+        "parent_clone_ids": parent_clone_ids,
+        "parent_indexes": parent_indexes,
+        "modified": modified,
+    }
+
+
+def iter_events(data) -> Iterator[FragmentEvent]:
+    """読み込んだ JSON から、子のフラグメントごとの対応を出力順に返す（バージョン 1 も読む）。"""
+    if isinstance(data, list):
+        for modified_clone in data:
+            for fragment in modified_clone["fragments"]:
+                child_key = (int(fragment["child"]["clone_id"]), int(fragment["child"]["index"]))
+                parent = fragment["parent"]
+                parent_key = None if fragment["type"] == "added" else (int(parent["clone_id"]), int(parent["index"]))
+                yield fragment["type"], child_key, parent_key
+        return
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported modified_clones version: {data.get('version')}")
+    modified = set(data["modified"])
+    parent_clone_ids = data["parent_clone_ids"]
+    parent_indexes = data["parent_indexes"]
+    position = 0
+    for clone_id, size in zip(data["clone_ids"], data["sizes"]):
+        for index in range(size):
+            if parent_clone_ids[position] == NO_PARENT:
+                yield "added", (clone_id, index), None
+            else:
+                fragment_type = "modified" if position in modified else "stable"
+                yield fragment_type, (clone_id, index), (parent_clone_ids[position], parent_indexes[position])
+            position += 1
+
+
+def load(path: Path) -> Iterator[FragmentEvent]:
+    """path（圧縮されている場合はその圧縮版）を読み込む。"""
+    return iter_events(artifact_store.load_json(path))
+
+
+def write(modified_clones: list[dict], path: Path, compact: bool = True) -> None:
+    """modified_clones を書き出す。compact ならバージョン 2 の形式（インデントなし）、そうでなければバージョン 1（indent=4）。
+
+    途中で止まった場合に書きかけのファイルが残らないよう、一時ファイルに書いてから置き換える。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = path.with_name(path.name + ".tmp")
+    try:
+        with open(temp_file, "w") as f:
+            if compact:
+                json.dump(encode(modified_clones), f, separators=(",", ":"))
+            else:
+                json.dump(modified_clones, f, indent=4)
+        artifact_store.discard(path, keep_plain=True)
+        os.replace(temp_file, path)
+    finally:
+        temp_file.unlink(missing_ok=True)
+
+
+def convert_file(path: Path) -> bool:
+    """バージョン 1 のファイルをバージョン 2 に書き換える。変換した場合は True を返す。"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and data.get("version") == FORMAT_VERSION:
+        return False
+    temp_file = path.with_name(path.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(encode(data), f, separators=(",", ":"))
+    os.replace(temp_file, path)
+    return True
@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+from bisect import bisect_right
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+import modules.artifact_store as artifact_store
+
+# dest/moving_lines の形式のバージョン
+#   1: ファイルごとの dict のリスト。inserted_lines / deleted_lines / modified_lines に行番号を全て列挙する
+#   2: {"version": 2, "files": [...]}。inserted / deleted / modified に [開始行, 行数] の区間を並べる
+FORMAT_VERSION = 2
+CATEGORIES = ("inserted", "deleted", "modified")
+
+
+def normalize_ranges(ranges) -> list[list[int]]:
+    """[開始行, 行数] の区間を開始行順に並べ、重なる・隣接する区間を併合する。"""
+    merged: list[list[int]] = []
+    for start, length in sorted((int(start), int(length)) for start, length in ranges if int(length) > 0):
+        if merged and start <= merged[-1][0] + merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], start + length - merged[-1][0])
+        else:
+            merged.append([start, length])
+    return merged
+
+
+def encode_lines(lines) -> list[list[int]]:
+    """行番号のリストを区間のリストに変換する。"""
+    return normalize_ranges([int(line), 1] for line in lines)
+
+
+def contains(ranges: list[list[int]], line: int) -> bool:
+    """正規化済みの区間のリストに行が含まれるかどうか。"""
+    index = bisect_right(ranges, [line, float("inf")]) - 1
+    return index >= 0 and line < ranges[index][0] + ranges[index][1]
+
+
+def clip(ranges: list[list[int]], first: int, last: int) -> list[list[int]]:
+    """区間を [first, last] の範囲に切り詰める。"""
+    clipped = []
+    for start, length in ranges:
+        clipped_start = max(start, first)
+        clipped_end = min(start + length - 1, last)
+        if clipped_start <= clipped_end:
+            clipped.append([clipped_start, clipped_end - clipped_start + 1])
+    return clipped
+
+
+def complement(ranges: list[list[int]], first: int, last: int) -> list[list[int]]:
+    """[first, last] のうち、正規化済みの区間のどれにも含まれない部分を区間で返す。"""
+    result = []
+    current = first
+    for start, length in ranges:
+        if start > current:
+            result.append([current, min(start - 1, last) - current + 1])
+        current = max(current, start + length)
+        if current > last:
+            break
+    if current <= last:
+        result.append([current, last - current + 1])
+    return [r for r in result if r[1] > 0]
+
+
+def _from_legacy(entry: dict) -> dict:
+    return {
+        "child_path": entry.get("child_path"),
+        "parent_path": entry.get("parent_path"),
+        **{
+            category: encode_lines(x for x in entry.get(f"{category}_lines", []) if isinstance(x, int) or str(x).isdigit())
+            for category in CATEGORIES
+        },
+    }
+
+
+def parse(data) -> list[dict]:
+    """読み込んだ JSON を区間形式のファイルごとのエントリのリストにする（バージョン 1 も変換する）。"""
+    if isinstance(data, list):
+        return [_from_legacy(entry) for entry in data]
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported moving_lines version: {data.get('version')}")
+    return [
+        {
+            "child_path": entry.get("child_path"),
+            "parent_path": entry.get("parent_path"),
+            **{category: normalize_ranges(entry.get(category, [])) for category in CATEGORIES},
+        }
+        for entry in data["files"]
+    ]
+
+
+def load(path: Path) -> list[dict]:
+    """path（圧縮されている場合はその圧縮版）を読み込む。"""
+    return parse(artifact_store.load_json(path))
+
+
+def convert_file(path: Path) -> bool:
+    """バージョン 1 のファイルを区間形式に書き換える。変換した場合は True を返す。"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and data.get("version") == FORMAT_VERSION:
+        return False
+    temp_file = path.with_name(path.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump({"version": FORMAT_VERSION, "files": parse(data)}, f)
+    os.replace(temp_file, path)
+    return True
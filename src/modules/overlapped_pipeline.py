@@ -0,0 +1,121 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+
+class StageTimes:
+    """ステージごとの処理時間（スレッド上で実際に処理していた時間の合計）と待ち時間を集計する。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.busy: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.diff_waited = 0.0
+        self.detect_blocked = 0.0
+        self.wall = 0.0
+
+    def run(self, stage: str, func: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.busy[stage] = self.busy.get(stage, 0.0) + elapsed
+                self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def report(self) -> str:
+        stages = ", ".join(f"{stage} {self.busy[stage]:.1f}s (n={self.counts[stage]})" for stage in self.busy)
+        overlapped = max(0.0, sum(self.busy.values()) - self.wall)
+        return (
+            f"pipeline: wall {self.wall:.1f}s, {stages}, overlapped {overlapped:.1f}s, "
+            f"diff waited {self.diff_waited:.1f}s for detection, detection blocked {self.detect_blocked:.1f}s on the queue"
+        )
+
+
+async def _produce(loop, executor, queue, commits, detect, after_detect, detect_jobs, times):
+    """commits の順に検出を開始し（同時に detect_jobs 個まで）、終わったものから順に after_detect を実行してキューに入れる。"""
+    pending = deque()
+
+    async def emit():
+        commit_hash, future = pending.popleft()
+        await future
+        await loop.run_in_executor(executor, times.run, "reuse", after_detect, commit_hash)
+        started = time.perf_counter()
+        await queue.put(commit_hash)
+        times.detect_blocked += time.perf_counter() - started
+
+    for commit_hash in commits:
+        pending.append((commit_hash, loop.run_in_executor(executor, times.run, "detect", detect, commit_hash)))
+        if len(pending) >= detect_jobs:
+            await emit()
+    while pending:
+        await emit()
+    await queue.put(None)
+
+
+async def _consume(loop, executor, queue, diff, times):
+    """キューから検出済みのコミットを順に取り出し、直前のコミットとの差分を取る。"""
+    prev_hash = None
+    while True:
+        started = time.perf_counter()
+        commit_hash = await queue.get()
+        times.diff_waited += time.perf_counter() - started
+        if commit_hash is None:
+            return
+        if prev_hash is not None:
+            await loop.run_in_executor(executor, times.run, "diff", diff, commit_hash, prev_hash)
+        prev_hash = commit_hash
+
+
+async def _run(commits, detect, after_detect, diff, detect_jobs, queue_size, times):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    with ThreadPoolExecutor(max_workers=detect_jobs + 1) as executor:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(_produce(loop, executor, queue, commits, detect, after_detect, detect_jobs, times))
+            group.create_task(_consume(loop, executor, queue, diff, times))
+
+
+def run(
+    commits: list[str],
+    detect: Callable[[str], None],
+    after_detect: Callable[[str], None],
+    diff: Callable[[str, str], None],
+    detect_jobs: int = 1,
+    queue_size: int = 2,
+) -> StageTimes:
+    """コミットごとのクローン検出と、隣り合うコミット間の差分を重ねて実行する。
+
+    detect(コミット) は commits の順に開始し、同時に detect_jobs 個まで実行する。終わったコミットは commits の順に
+    after_detect(コミット) を実行してから差分のキューに入れる。diff(コミット, 直前のコミット) はキューから取り出した順に
+    1 つずつ実行するので、コミット N とその直前のコミットの差分を取っている間にコミット N+1 の検出が進む。
+    キューの長さは queue_size までで、差分が追いつかない場合は次の検出を始めない。
+    どれかのステージで例外が発生した場合は、残りのステージを止めてその例外を送出する。
+    """
+    times = StageTimes()
+    started = time.perf_counter()
+    try:
+        asyncio.run(_run(commits, detect, after_detect, diff, max(1, detect_jobs), max(1, queue_size), times))
+    except ExceptionGroup as group:
+        raise group.exceptions[0]
+    finally:
+        times.wall = time.perf_counter() - started
+    return times
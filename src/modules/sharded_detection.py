@@ -0,0 +1,202 @@
+import json
+import os
+import shutil
+import sys
+from itertools import combinations
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from config import CCFINDERSW_SHARD_JAVA_XMX, SNAPSHOT_ROOT
+from modules.ccfindersw import detect_to_json
+from modules.detection_scope import in_scope
+
+# どのコードベースにも含まれないファイルをまとめたシャードの名前（パスとは一致しない）
+REMAINDER_SHARD = "<outside codebases>"
+
+
+def _list_codebase_files(source_dir: Path, exts: tuple[str], codebases: tuple[str, ...]) -> dict[str, list[str]]:
+    """source_dir を 1 度だけ走査し、コードベース -> 配下の対象拡張子のファイル（リポジトリ相対パス）の一覧を返す。
+
+    入れ子のコードベースでは、ファイルは前方一致する全てのコードベースに含まれる。
+    どのコードベースにも含まれないファイルは REMAINDER_SHARD の一覧に入れる。
+    """
+    codebase_files: dict[str, list[str]] = {codebase: [] for codebase in (*codebases, REMAINDER_SHARD)}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for file_name in files:
+            ext = os.path.splitext(file_name)[1].replace(".", "")
+            if ext == "" or ext not in exts:
+                continue
+            rel_path = (Path(root) / file_name).relative_to(source_dir).as_posix()
+            matched = False
+            for codebase in codebases:
+                if in_scope(rel_path, (codebase,)):
+                    codebase_files[codebase].append(rel_path)
+                    matched = True
+            if not matched:
+                codebase_files[REMAINDER_SHARD].append(rel_path)
+    return codebase_files
+
+
+def _stage_shard(source_dir: Path, rel_paths: list[str], shard_dir: Path) -> int:
+    """source_dir の rel_paths のファイルを shard_dir に配置し、ファイル数を返す。"""
+    for rel_path in rel_paths:
+        dest_file = shard_dir / rel_path
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source_dir / rel_path, dest_file)
+        except OSError:
+            shutil.copy2(source_dir / rel_path, dest_file)
+    return len(rel_paths)
+
+
+def _codebase_of(path: str, codebases: tuple[str, ...]) -> str | None:
+    # get_codeclones_classified_by_type と同じく、最初に前方一致したコードベースに属するとみなす
+    for codebase in codebases:
+        if path.startswith(codebase):
+            return codebase
+    return None
+
+
+def _load_shard(json_file: Path, shard_dir: Path) -> tuple[list[tuple[str, int]], list[list[tuple]]]:
+    """シャードの検出結果を読み込み、(ファイルの (パス, LOC) 一覧, クローン片のリストの一覧) を返す。
+
+    パスはリポジトリ相対に直す。
+    """
+    with open(json_file, "r") as f:
+        clones = json.load(f)
+    prefix = str(shard_dir) + "/"
+    files = {}
+    for file_data in clones["file_data"]:
+        file_path = str(file_data["file_path"])
+        if file_path.startswith(prefix):
+            file_path = file_path[len(prefix):]
+        files[file_data["file_id"]] = (file_path, file_data["loc"])
+    clone_sets = []
+    for clone_set in clones["clone_sets"]:
+        fragments = []
+        for fragment in clone_set["fragments"]:
+            file_path, _loc = files[fragment["file_id"]]
+            fragments.append((file_path, fragment["start_line"], fragment["start_col"], fragment["end_line"], fragment["end_col"]))
+        clone_sets.append(fragments)
+    return list(files.values()), clone_sets
+
+
+def merge_clone_sets(files: list[tuple[str, int]], shard_clone_sets: list[list[tuple]], path_base: Path) -> dict:
+    """シャードごとの検出結果を 1 つの clones_json にまとめる。
+
+    同じクローン片（パスと位置が一致するもの）を含むクローンセットは 1 つに併合し、
+    file_id と clone_id は全体で一意になるよう振り直す。
+    """
+    parent = list(range(len(shard_clone_sets)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owner: dict[tuple, int] = {}
+    for index, fragments in enumerate(shard_clone_sets):
+        for fragment in fragments:
+            if fragment in owner:
+                parent[find(index)] = find(owner[fragment])
+            else:
+                owner[fragment] = index
+
+    file_ids: dict[str, int] = {}
+    file_data = []
+    for file_path, loc in files:
+        if file_path not in file_ids:
+            file_ids[file_path] = len(file_data)
+            file_data.append({"file_id": file_ids[file_path], "file_path": str(Path(path_base) / file_path), "loc": loc})
+    merged: dict[int, list[dict]] = {}
+    seen: set[tuple] = set()
+    for index, fragments in enumerate(shard_clone_sets):
+        root = find(index)
+        merged_fragments = merged.setdefault(root, [])
+        for file_path, start_line, start_col, end_line, end_col in fragments:
+            key = (root, file_path, start_line, start_col, end_line, end_col)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged_fragments.append({
+                "file_id": file_ids[file_path],
+                "start_line": start_line,
+                "start_col": start_col,
+                "end_line": end_line,
+                "end_col": end_col,
+            })
+    clone_sets = [
+        {"clone_id": clone_id, "fragments": fragments}
+        for clone_id, fragments in enumerate(fragments for fragments in merged.values() if len(fragments) >= 2)
+    ]
+    return {"file_data": file_data, "clone_sets": clone_sets}
+
+
+def detect_sharded(
+    source_dir: Path,
+    name: str,
+    language: str,
+    commit_hash: str,
+    exts: tuple[str],
+    codebases: tuple[str, ...],
+    json_dest_file: Path,
+    path_base: Path,
+    xmx: str = CCFINDERSW_SHARD_JAVA_XMX,
+) -> None:
+    """サービスのコードベースごと、およびコードベースの組ごとに CCFinderSW を実行し、結果を 1 つにまとめる。
+
+    コードベース単体のシャードからは全てのクローンセットを、組のシャードからは両方のコードベースに
+    クローン片を持つクローンセット（サービス間クローン）だけを採用する。
+    どのコードベースにも含まれないファイル（DETECTION_SCOPE が "repository" の場合）は REMAINDER_SHARD を
+    もう 1 つのコードベースとして扱うので、結果はリポジトリ全体を検出したものと同じ範囲になる。
+    """
+    work_dir = Path(SNAPSHOT_ROOT) / name / f"{commit_hash}-shards" / language
+    shutil.rmtree(work_dir, ignore_errors=True)
+    codebase_files = _list_codebase_files(source_dir, exts, codebases)
+    if codebase_files[REMAINDER_SHARD]:
+        codebases = (*codebases, REMAINDER_SHARD)
+    shards = [(codebase,) for codebase in codebases] + list(combinations(codebases, 2))
+    files: list[tuple[str, int]] = []
+    shard_clone_sets: list[list[tuple]] = []
+    try:
+        for index, shard in enumerate(shards):
+            shard_dir = work_dir / str(index)
+            # 入れ子のコードベースの組では同じファイルが両方に含まれるので、重複を除く
+            rel_paths = sorted({rel_path for codebase in shard for rel_path in codebase_files[codebase]})
+            if _stage_shard(source_dir, rel_paths, shard_dir) == 0:
+                continue
+            print(f"shard {index + 1}/{len(shards)} ({language}): {', '.join(shard)}")
+            shard_json = work_dir / f"{index}.json"
+            detect_to_json(shard_dir, language, exts, work_dir / f"{index}-ccfsw", shard_json, xmx=xmx)
+            shard_files, clone_sets = _load_shard(shard_json, shard_dir)
+            files.extend(shard_files)
+            for fragments in clone_sets:
+                if len(shard) == 2:
+                    spanned = {_codebase_of(fragment[0], codebases) or REMAINDER_SHARD for fragment in fragments}
+                    if not set(shard) <= spanned:
+                        continue
+                shard_clone_sets.append(fragments)
+            shutil.rmtree(shard_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    json_dest_file.parent.mkdir(parents=True, exist_ok=True)
+    # 既存の結果がハードリンクで他のコミットと共有されている場合があるので、一時ファイルに書いてから置き換える
+    temp_file = json_dest_file.with_name(json_dest_file.name + ".tmp")
+    try:
+        with open(temp_file, "w") as f:
+            json.dump(merge_clone_sets(files, shard_clone_sets, path_base), f)
+        os.replace(temp_file, json_dest_file)
+    finally:
+        temp_file.unlink(missing_ok=True)
@@ -0,0 +1,84 @@
+import os
+import shutil
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+from config import SNAPSHOT_ROOT
+from modules.detection_scope import in_scope
+from modules.file_dedup import group_identical_files
+from modules.git_objects import BlobReader, list_blobs
+
+
+def _is_target(path: str, exts: dict[str, tuple[str]], prefixes: dict[str, tuple[str] | None]) -> bool:
+    ext = os.path.splitext(path)[1].replace(".", "")
+    if ext == "":
+        return False
+    return any(ext in language_exts and in_scope(path, prefixes.get(language)) for language, language_exts in exts.items())
+
+
+def write_snapshot(
+    repo_dir: Path,
+    commit_hash: str,
+    exts: dict[str, tuple[str]],
+    dest_dir: Path,
+    prefixes: dict[str, tuple[str] | None] | None = None,
+    deduplicate: bool = False,
+) -> dict[str, list[str]]:
+    """コミットのツリーから対象言語のファイルだけを dest_dir に書き出す。
+
+    exts は言語ごとの拡張子、prefixes は言語ごとの対象パスの接頭辞（None ならリポジトリ全体）。
+    deduplicate を指定した場合、内容が同一のファイルは代表の 1 つだけを書き出し、
+    代表ファイルのパス -> 書き出さなかった重複ファイルのパス一覧を返す。
+    """
+    prefixes = prefixes or {}
+    files = [(path, blob_hash) for path, blob_hash in list_blobs(repo_dir, commit_hash, skip_symlinks=True) if _is_target(path, exts, prefixes)]
+    duplicates = {}
+    if deduplicate:
+        files, duplicates = group_identical_files(files)
+    with BlobReader(repo_dir) as reader:
+        for path, blob_hash in files:
+            dest_file = dest_dir / path
+            dest_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(dest_file, "wb") as f:
+                f.write(reader.read(blob_hash))
+    duplicate_count = sum(len(paths) for paths in duplicates.values())
+    print(f"snapshot of {commit_hash}: {len(files)} files" + (f" ({duplicate_count} duplicates skipped)" if deduplicate else ""))
+    return duplicates
+
+
+@contextmanager
+def materialize(
+    repo_dir: Path,
+    name: str,
+    commit_hash: str,
+    exts: dict[str, tuple[str]],
+    prefixes: dict[str, tuple[str] | None] | None = None,
+    deduplicate: bool = False,
+) -> Iterator[tuple[Path, dict[str, list[str]]]]:
+    """コミットの対象言語のファイルを SNAPSHOT_ROOT 配下に展開し、(ディレクトリ, 重複ファイルの対応) を返す。
+
+    git のオブジェクトから直接読み出すので、repo_dir の作業ツリーや HEAD は変更しない。
+    ブロックを抜けるとスナップショットは削除される。
+    """
+    snapshot_dir = Path(SNAPSHOT_ROOT) / name / commit_hash
+    if snapshot_dir.exists():
+        shutil.rmtree(snapshot_dir)
+    snapshot_dir.mkdir(parents=True)
+    try:
+        duplicates = write_snapshot(repo_dir, commit_hash, exts, snapshot_dir, prefixes, deduplicate)
+        yield snapshot_dir, duplicates
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
@@ -0,0 +1,64 @@
+import queue
+import shutil
+import subprocess
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _find_repo_root(start: Path) -> Path:
+    for parent in [start] + list(start.parents):
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return start
+
+
+project_root = _find_repo_root(Path(__file__).resolve())
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+
+class WorktreePool:
+    """1 つのリポジトリに対して複数の git worktree を用意し、並列に貸し出す。"""
+
+    def __init__(self, repo_dir: Path, name: str, size: int) -> None:
+        self.repo_dir = Path(repo_dir)
+        self.root = project_root / "dest/worktrees" / name
+        self.size = size
+        self.worktrees: list[Path] = []
+        self._free: queue.Queue[Path] = queue.Queue()
+
+    def _git(self, *args: str, cwd: Path | None = None) -> None:
+        subprocess.run(["git", *args], cwd=str(cwd or self.repo_dir), check=True, capture_output=True)
+
+    def __enter__(self) -> "WorktreePool":
+        # 前回の異常終了で残った worktree を片付けてから作成する
+        self._git("worktree", "prune")
+        if self.root.exists():
+            shutil.rmtree(self.root, ignore_errors=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+        for index in range(self.size):
+            worktree = self.root / str(index)
+            self._git("worktree", "add", "--detach", "--force", str(worktree), "HEAD")
+            self.worktrees.append(worktree)
+            self._free.put(worktree)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        for worktree in self.worktrees:
+            try:
+                self._git("worktree", "remove", "--force", str(worktree))
+            except subprocess.CalledProcessError:
+                shutil.rmtree(worktree, ignore_errors=True)
+        self._git("worktree", "prune")
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @contextmanager
+    def checkout(self, commit_hash: str):
+        """空いている worktree を指定コミットにして貸し出す。"""
+        worktree = self._free.get()
+        try:
+            self._git("checkout", "--force", "--detach", commit_hash, cwd=worktree)
+            yield worktree
+        finally:
+            self._free.put(worktree)
@@ -0,0 +1,201 @@
+import importlib.util
+import random
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import modules.analyze_cc as analyze_cc
+import modules.moving_lines as moving_lines
+from modules.clone_columns import CloneColumns
+from modules.util import FileMapper
+
+project_root = Path(__file__).resolve().parents[1]
+PROJECT_DIR = "/project"
+
+
+def _filemap(locs: dict[str, int]) -> FileMapper:
+    files = [{"file_id": file_id, "file_path": f"{PROJECT_DIR}/{path}", "loc": loc} for file_id, (path, loc) in enumerate(locs.items())]
+    return FileMapper(files, PROJECT_DIR)
+
+
+def _clone_sets(sets: dict[int, list[tuple[int, int, int]]]) -> list[dict]:
+    return [
+        {
+            "clone_id": clone_id,
+            "fragments": [
+                {"file_id": file_id, "start_line": start, "start_col": 1, "end_line": end, "end_col": 1}
+                for file_id, start, end in fragments
+            ],
+        }
+        for clone_id, fragments in sets.items()
+    ]
+
+
+# A.java: parent の 3 行目を削除し、child の 5〜6 行目を挿入、child の 8 行目を変更（B.java は変更なし）
+# child 1-2 -> parent 1-2, child 3-4 -> parent 4-5, child 5-6 -> なし, child 7-11 -> parent 6-10
+HUNKS = moving_lines.parse({
+    "version": moving_lines.FORMAT_VERSION,
+    "files": [{"child_path": "A.java", "parent_path": "A.java", "inserted": [[5, 2]], "deleted": [[3, 1]], "modified": [[8, 1]]}],
+})
+CHILD_FILEMAP = _filemap({"A.java": 11, "B.java": 30})
+PARENT_FILEMAP = _filemap({"A.java": 10, "B.java": 30})
+# file_id は A.java が 0、B.java が 1
+CHILD_FRAGMENTS = CloneColumns.from_clone_sets(_clone_sets({
+    0: [(0, 7, 11), (1, 1, 5)],
+    1: [(0, 5, 6), (1, 20, 21)],
+    2: [(0, 1, 7), (1, 1, 5)],
+}))
+PARENT_FRAGMENTS = CloneColumns.from_clone_sets(_clone_sets({
+    10: [(0, 6, 10), (1, 1, 5)],
+    11: [(0, 1, 6), (1, 10, 14)],
+}))
+
+
+def test_corresponded_lines_queries():
+    corresponded_lines = analyze_cc.CorrespondedLines(HUNKS, CHILD_FILEMAP, PARENT_FILEMAP)
+
+    assert [corresponded_lines.get_parent_line("A.java", line) for line in range(1, 12)] == [1, 2, 4, 5, None, None, 6, 7, 8, 9, 10]
+    assert corresponded_lines.get_parent_lines("A.java", 4, 7).tolist() == [5, analyze_cc.NO_PARENT, analyze_cc.NO_PARENT, 6]
+    # 差分に現れないファイルは同じ行に対応する
+    assert corresponded_lines.get_parent_line("B.java", 5) == 5
+    assert corresponded_lines.get_fragment_loc_of_parent("A.java", 1, 11) == 9
+    assert corresponded_lines.get_fragment_loc_of_parent("A.java", 4, 7) == 2
+    assert corresponded_lines.get_fragment_loc_of_parent("A.java", 5, 6) == 0
+    assert corresponded_lines.get_fragment_loc_of_parent("B.java", 1, 5) == 5
+
+    assert corresponded_lines.is_line_deleted("A.java", 3)
+    assert not corresponded_lines.is_line_deleted("A.java", 4)
+    assert corresponded_lines.is_line_added("A.java", 6)
+    assert not corresponded_lines.any_added("A.java", 7, 11)
+    assert corresponded_lines.is_line_modified("A.java", 8)
+    assert corresponded_lines.is_path_touched("A.java")
+    assert not corresponded_lines.is_path_touched("B.java")
+
+
+@pytest.mark.parametrize("match_untouched", [False, True])
+def test_correspond_code_fragments(match_untouched):
+    corresponded_lines = analyze_cc.CorrespondedLines(HUNKS, CHILD_FILEMAP, PARENT_FILEMAP)
+
+    fragments = analyze_cc.correspond_code_fragments(
+        corresponded_lines, CHILD_FRAGMENTS, PARENT_FRAGMENTS, CHILD_FILEMAP, PARENT_FILEMAP, match_untouched=match_untouched
+    )
+
+    assert fragments == {
+        0: {0: (10, 0), 1: (10, 1)},
+        # 挿入行だけのフラグメントと、親に重なるフラグメントのないものは新規
+        1: {0: None, 1: None},
+        2: {0: (11, 0), 1: (10, 1)},
+    }
+
+
+@pytest.mark.parametrize("match_untouched", [False, True])
+def test_correspond_clonesets(match_untouched):
+    corresponded_lines = analyze_cc.CorrespondedLines(HUNKS, CHILD_FILEMAP, PARENT_FILEMAP)
+    fragments = analyze_cc.correspond_code_fragments(
+        corresponded_lines, CHILD_FRAGMENTS, PARENT_FRAGMENTS, CHILD_FILEMAP, PARENT_FILEMAP, match_untouched=match_untouched
+    )
+
+    modified_clones = analyze_cc.correspond_clonesets(
+        fragments, corresponded_lines, CHILD_FRAGMENTS, PARENT_FRAGMENTS, CHILD_FILEMAP, PARENT_FILEMAP, match_untouched=match_untouched
+    )
+
+    summary = [
+        [
+            (fragment["type"], fragment["child"]["file_path"], None if fragment["parent"] is None else (fragment["parent"]["clone_id"], fragment["parent"]["index"]))
+            for fragment in modified_clone["fragments"]
+        ]
+        for modified_clone in modified_clones
+    ]
+    assert [modified_clone["clone_id"] for modified_clone in modified_clones] == [0, 1, 2]
+    assert summary == [
+        [("modified", "A.java", (10, 0)), ("stable", "B.java", (10, 1))],
+        [("added", "A.java", None), ("added", "B.java", None)],
+        [("modified", "A.java", (11, 0)), ("stable", "B.java", (10, 1))],
+    ]
+    assert modified_clones[0]["fragments"][0]["parent"] == {
+        "clone_id": 10, "index": 0, "file_id": 0, "file_path": "A.java", "start_line": 6, "end_line": 10,
+    }
+
+
+def _load_verifier():
+    path = project_root / "src/commands/misc/verify_corresponded_lines.py"
+    spec = importlib.util.spec_from_file_location("verify_corresponded_lines", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def verifier():
+    return _load_verifier()
+
+
+@pytest.fixture(scope="module")
+def baseline(verifier):
+    """git の履歴にある以前の実装。履歴がない（アーカイブから展開した）場合はスキップする。"""
+    try:
+        return verifier.load_baseline(None)
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("以前の analyze_cc を git の履歴から読み込めません")
+
+
+def _random_pair(seed: int):
+    """乱数で作った差分と、child / parent のクローンセット。"""
+    rng = random.Random(seed)
+    paths = [f"F{i}.java" for i in range(4)]
+    parent_locs = {path: rng.randint(5, 60) for path in paths}
+    child_locs = {}
+    files = []
+    for path in paths:
+        if rng.random() < 0.2:
+            child_locs[path] = parent_locs[path]
+            continue
+        child_locs[path] = max(parent_locs[path] + rng.randint(-5, 8), 1)
+        files.append({
+            # リネーム（child と parent でパスが異なる hunk）は行対応に使われない
+            "child_path": path if rng.random() < 0.9 else path + ".renamed",
+            "parent_path": path,
+            "inserted": [[rng.randint(1, child_locs[path]), rng.randint(1, 4)] for _ in range(rng.randint(0, 3))],
+            "deleted": [[rng.randint(1, parent_locs[path]), rng.randint(1, 4)] for _ in range(rng.randint(0, 3))],
+            "modified": [[rng.randint(1, child_locs[path]), rng.randint(1, 3)] for _ in range(rng.randint(0, 2))],
+        })
+    hunks = moving_lines.parse({"version": moving_lines.FORMAT_VERSION, "files": files})
+
+    def clone_sets(locs: dict[str, int]) -> list[dict]:
+        sets = {}
+        for clone_id in range(rng.randint(1, 8)):
+            fragments = []
+            for _ in range(rng.randint(2, 4)):
+                file_id = rng.randrange(len(paths))
+                start = rng.randint(1, locs[paths[file_id]])
+                fragments.append((file_id, start, rng.randint(start, min(locs[paths[file_id]], start + 15))))
+            sets[clone_id] = fragments
+        return _clone_sets(sets)
+
+    return hunks, _filemap(child_locs), _filemap(parent_locs), clone_sets(child_locs), clone_sets(parent_locs)
+
+
+@pytest.mark.parametrize("match_untouched", [False, True])
+def test_matches_baseline_on_random_pairs(verifier, baseline, match_untouched):
+    for seed in range(300):
+        hunks, child_filemap, parent_filemap, child_sets, parent_sets = _random_pair(seed)
+        expected_lines = baseline.CorrespondedLines(verifier.to_legacy_hunks(hunks), child_filemap, parent_filemap)
+        expected_fragments = baseline.correspond_code_fragments(expected_lines, child_sets, parent_sets, child_filemap, parent_filemap)
+        expected_clones = baseline.correspond_clonesets(
+            expected_fragments, expected_lines, child_sets, parent_sets, child_filemap, parent_filemap
+        )
+
+        child_fragments = CloneColumns.from_clone_sets(child_sets)
+        parent_fragments = CloneColumns.from_clone_sets(parent_sets)
+        actual_lines = analyze_cc.CorrespondedLines(hunks, child_filemap, parent_filemap)
+        actual_fragments = analyze_cc.correspond_code_fragments(
+            actual_lines, child_fragments, parent_fragments, child_filemap, parent_filemap, match_untouched=match_untouched
+        )
+        actual_clones = analyze_cc.correspond_clonesets(
+            actual_fragments, actual_lines, child_fragments, parent_fragments, child_filemap, parent_filemap, match_untouched=match_untouched
+        )
+
+        assert verifier._query_mismatches(expected_lines, actual_lines, hunks) == [], seed
+        assert actual_fragments == expected_fragments, seed
+        assert actual_clones == expected_clones, seed
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import modules.modified_clones as modified_clones
+
+
+def _fragment(fragment_type: str, child: tuple[int, int], parent: tuple[int, int] | None) -> dict:
+    return {
+        "type": fragment_type,
+        "parent": None if parent is None else {"clone_id": parent[0], "index": parent[1], "file_id": 0, "file_path": "A.java", "start_line": 1, "end_line": 5},
+        "child": {"clone_id": child[0], "index": child[1], "file_id": 0, "file_path": "A.java", "start_line": 1, "end_line": 5},
+    }
+
+
+# correspond_clonesets の結果（バージョン 1 の形式）
+MODIFIED_CLONES = [
+    {"clone_id": 3, "fragments": [_fragment("modified", (3, 0), (10, 0)), _fragment("stable", (3, 1), (10, 1))]},
+    {"clone_id": 4, "fragments": [_fragment("added", (4, 0), None), _fragment("added", (4, 1), None)]},
+    {"clone_id": 7, "fragments": [_fragment("stable", (7, 0), (11, 2)), _fragment("added", (7, 1), None), _fragment("modified", (7, 2), (11, 0))]},
+]
+EVENTS = [
+    ("modified", (3, 0), (10, 0)),
+    ("stable", (3, 1), (10, 1)),
+    ("added", (4, 0), None),
+    ("added", (4, 1), None),
+    ("stable", (7, 0), (11, 2)),
+    ("added", (7, 1), None),
+    ("modified", (7, 2), (11, 0)),
+]
+
+
+def test_encode_keeps_events():
+    data = modified_clones.encode(MODIFIED_CLONES)
+
+    assert data["version"] == modified_clones.FORMAT_VERSION
+    assert data["sizes"] == [2, 2, 3]
+    assert data["modified"] == [0, 6]
+    assert list(modified_clones.iter_events(data)) == EVENTS
+    assert list(modified_clones.iter_events(MODIFIED_CLONES)) == EVENTS
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_write_and_load_round_trip(tmp_path, compact):
+    path = tmp_path / "modified_clones" / "Java.json"
+
+    modified_clones.write(MODIFIED_CLONES, path, compact=compact)
+
+    assert list(modified_clones.load(path)) == EVENTS
+    assert [p.name for p in path.parent.iterdir()] == ["Java.json"]
+
+
+def test_convert_file_round_trip(tmp_path):
+    path = tmp_path / "Java.json"
+    modified_clones.write(MODIFIED_CLONES, path, compact=False)
+
+    assert modified_clones.convert_file(path)
+    assert json.loads(path.read_text())["version"] == modified_clones.FORMAT_VERSION
+    assert list(modified_clones.load(path)) == EVENTS
+    assert not modified_clones.convert_file(path)
+
+
+def test_iter_events_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        list(modified_clones.iter_events({"version": 99}))
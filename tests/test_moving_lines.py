@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import modules.moving_lines as moving_lines
+
+LEGACY = [
+    {
+        "child_path": "A.java",
+        "parent_path": "A.java",
+        "inserted_lines": [5, 6, 7, 12],
+        "deleted_lines": [3],
+        "modified_lines": [9, 8],
+    },
+    {"child_path": "B.java", "parent_path": "B.java", "inserted_lines": [], "deleted_lines": [1, 2], "modified_lines": []},
+]
+EXPECTED = [
+    {"child_path": "A.java", "parent_path": "A.java", "inserted": [[5, 3], [12, 1]], "deleted": [[3, 1]], "modified": [[8, 2]]},
+    {"child_path": "B.java", "parent_path": "B.java", "inserted": [], "deleted": [[1, 2]], "modified": []},
+]
+
+
+def test_normalize_ranges_merges_overlapping_and_adjacent():
+    assert moving_lines.normalize_ranges([[10, 2], [1, 3], [4, 1], [2, 1], [20, 0]]) == [[1, 4], [10, 2]]
+
+
+def test_clip_and_complement():
+    ranges = [[2, 3], [8, 5]]
+    assert moving_lines.clip(ranges, 3, 9) == [[3, 2], [8, 2]]
+    assert moving_lines.complement(ranges, 1, 10) == [[1, 1], [5, 3]]
+    assert moving_lines.contains(ranges, 4)
+    assert not moving_lines.contains(ranges, 5)
+
+
+def test_parse_converts_legacy_format():
+    assert moving_lines.parse(LEGACY) == EXPECTED
+
+
+def test_parse_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        moving_lines.parse({"version": 99, "files": []})
+
+
+def test_convert_file_round_trip(tmp_path):
+    path = tmp_path / "moving_lines.json"
+    path.write_text(json.dumps(LEGACY))
+
+    assert moving_lines.convert_file(path)
+    assert json.loads(path.read_text())["version"] == moving_lines.FORMAT_VERSION
+    assert moving_lines.load(path) == EXPECTED
+    # 変換済みのファイルはそのまま
+    assert not moving_lines.convert_file(path)
+    assert moving_lines.load(path) == EXPECTED
+    assert [p.name for p in tmp_path.iterdir()] == ["moving_lines.json"]